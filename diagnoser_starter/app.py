@@ -1,10 +1,26 @@
 from __future__ import annotations
 
 import os
-from flask import Flask
+import threading
+import time
+import click
+from flask import Flask, g
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from app_migrate import run_auto_migrations
+import assets
+import catalog
+import form_fragments
+import http_cache
+import query_budget
+import quiz_cache
+import ratelimit
+import score_distribution
+import sqlite_profile
+import submission_log
+import uploads
+from app_migrate import LATEST_VERSION, current_version, pending_migrations, run_auto_migrations
 from blueprints.admin.routes import bp as admin_bp
 from blueprints.public.routes import bp as public_bp
 from config import Config
@@ -12,32 +28,99 @@ from extensions import db
 from models import User
 from datetime import datetime
 
+def _sync_admin_password() -> None:
+    """ADMIN_PASSWORD があれば admin のハッシュを合わせる（すでに一致していれば何もしない）。"""
+    password = os.getenv("ADMIN_PASSWORD")
+    if not password:
+        return
+    admin = User.query.filter_by(username="admin").first()
+    if admin is None:
+        return
+
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    if admin.password_hash and check_password_hash(admin.password_hash, password):
+        return
+    admin.password_hash = generate_password_hash(password)
+    db.session.commit()
+
+
+def prepare_database(app: Flask) -> None:
+    """スキーマの確認（未適用分の適用）と admin パスワードの同期。"""
+    with app.app_context():
+        # 最新の DB なら schema_version を1回読むだけ（未適用分があれば適用）
+        if app.config["AUTO_MIGRATE"]:
+            run_auto_migrations()
+        elif pending_migrations():
+            app.logger.warning("未適用のマイグレーションがあります（flask db-upgrade で適用）")
+        _sync_admin_password()
+
+
+def _prepare_on_first_request(app: Flask) -> None:
+    lock = threading.Lock()
+    done = False
+
+    @app.before_request
+    def prepare_once():
+        nonlocal done
+        if done:
+            return
+        with lock:
+            if not done:
+                prepare_database(app)
+                done = True
+        # 準備に使った SQL はこのリクエストの query_budget に数えない
+        g.pop("sql_query_count", None)
+
+
 def create_app() -> Flask:
     load_dotenv()
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # ---- リバースプロキシ ----
+    # 信頼するプロキシの段数だけ X-Forwarded-For / -Proto を読み、request.remote_addr を
+    # クライアントのアドレスにする（レート制限のキーに使う。ratelimit.py）
+    if app.config["PROXY_FIX_X_FOR"]:
+        hops = app.config["PROXY_FIX_X_FOR"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
     # ---- ファイルアップロード設定 ----
-    # /static/uploads に保存（存在しなければ作成）
+    # static/uploads に内容ハッシュの名前で保存し、/media/ で配信（uploads.py）
     app.config["UPLOAD_FOLDER"] = os.path.join("static", "uploads")
     app.config["ALLOWED_EXTENSIONS"] = {"png", "jpg", "jpeg", "gif", "webp"}
     app.config["MAX_CONTENT_LENGTH"] = 2 * 1024 * 1024  # 2MB
-    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    uploads.init_app(app)
 
-    # ---- DB 初期化＆簡易マイグレーション ----
-    db.init_app(app)
-    with app.app_context():
-        db.create_all()
-        run_auto_migrations()
+    # ---- 静的ファイル（ハッシュ付きの名前・事前圧縮。assets.py） ----
+    assets.init_app(app)
 
-        admin = User.query.filter_by(username="admin").first()
-        if admin and os.getenv("ADMIN_PASSWORD"):
-            from werkzeug.security import generate_password_hash
+    # ---- テンプレートのバイトコードキャッシュ（再起動後のコンパイルを省く） ----
+    if app.config["JINJA_BYTECODE_CACHE"]:
+        cache_dir = os.path.join(app.instance_path, "jinja_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_options = {
+            **app.jinja_options,
+            "bytecode_cache": FileSystemBytecodeCache(cache_dir),
+        }
 
-            admin.password_hash = generate_password_hash(
-                os.getenv("ADMIN_PASSWORD")
-            )
-            db.session.commit()
+    # ---- DB 初期化＆簡易マイグレーション ----
+    sqlite_profile.configure_engine(app)  # エンジン設定は db.init_app より前
+    db.init_app(app)
+    sqlite_profile.init_app(app)
+    quiz_cache.init_app(app)
+    catalog.init_app(app)
+    form_fragments.init_app(app)
+    score_distribution.init_app(app)
+    http_cache.init_app(app)
+    query_budget.init_app(app)
+    submission_log.init_app(app)
+    ratelimit.init_app(app)
+    if app.config["LAZY_STARTUP"]:
+        # 起動（import）時には DB に触れず、最初のリクエストで1回だけ行う
+        _prepare_on_first_request(app)
+    else:
+        prepare_database(app)
 
     @app.context_processor
     def inject_current_year():
@@ -53,8 +136,119 @@ def create_app() -> Flask:
         """ライトS/M傾向診断のデモデータ投入"""
         from seed import seed  # 遅延 import で循環回避
 
+        prepare_database(app)
         seed()
 
+    @app.cli.command("seed-synthetic")
+    @click.option("--count", default=100, show_default=True, help="作成する診断の数")
+    @click.option("--questions", default=15, show_default=True, help="1診断あたりの質問数")
+    @click.option("--choices", default=4, show_default=True, help="1質問あたりの選択肢数")
+    @click.option("--results", default=4, show_default=True, help="1診断あたりの結果数")
+    @click.option("--batch", default=100, show_default=True, help="1トランザクションの診断数")
+    @click.option("--seed", "rnd_seed", default=1, show_default=True, help="乱数シード")
+    def seed_synthetic_command(count, questions, choices, results, batch, rnd_seed) -> None:
+        """指定した形の合成診断を一括投入（負荷試験・動作確認用）"""
+        from bulk_load import load_synthetic
+
+        prepare_database(app)
+        started = time.perf_counter()
+        ids = load_synthetic(
+            count,
+            batch=batch,
+            questions=questions,
+            choices=choices,
+            results=results,
+            seed=rnd_seed,
+        )
+        elapsed = time.perf_counter() - started
+        print(f"[seed-synthetic] {len(ids)} quizzes in {elapsed:.2f}s")
+
+    @app.cli.command("export-quizzes")
+    @click.option("--quiz-id", "quiz_ids", type=int, multiple=True, help="対象（省略時は全件）")
+    @click.option("--format", "fmt", type=click.Choice(["ndjson", "json"]), default="ndjson")
+    @click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-")
+    def export_quizzes_command(quiz_ids, fmt, output) -> None:
+        """診断を JSON / NDJSON で書き出す（1件ずつ読みながら書く）"""
+        import quiz_io
+
+        prepare_database(app)
+        export = quiz_io.export_json if fmt == "json" else quiz_io.export_ndjson
+        with app.app_context():
+            for chunk in export(list(quiz_ids) or None):
+                output.write(chunk)
+
+    @app.cli.command("import-quizzes")
+    @click.argument("source", type=click.File("r", encoding="utf-8-sig"))
+    @click.option("--format", "fmt", type=click.Choice(["ndjson", "json"]), default=None)
+    @click.option("--dry-run", is_flag=True, help="検査だけして書き込まない")
+    def import_quizzes_command(source, fmt, dry_run) -> None:
+        """JSON / NDJSON の診断を取り込む（全体で1トランザクション）"""
+        import quiz_io
+
+        prepare_database(app)
+        with app.app_context():
+            report = quiz_io.import_specs(quiz_io.read_specs(source, fmt), dry_run=dry_run)
+        for message in report.errors:
+            click.echo(f"error: {message}", err=True)
+        if report.errors:
+            raise SystemExit(1)
+        if dry_run:
+            print(f"[import] {report.count} quizzes OK (dry run)")
+        else:
+            print(f"[import] {len(report.quiz_ids)} quizzes imported: {report.quiz_ids[:10]}")
+
+    @app.cli.command("uploads-backfill")
+    def uploads_backfill_command() -> None:
+        """既存の診断画像を内容ハッシュの名前に移し、縮小版を作る"""
+        prepare_database(app)
+        if uploads.Image is None:
+            print("[uploads] Pillow が無いので縮小版は作りません（名前の移行のみ）")
+        with app.app_context():
+            stats = uploads.backfill()
+        print("[uploads] " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+    @app.cli.command("assets-build")
+    @click.option("--clean", is_flag=True, help="使われなくなった古いファイルを消す")
+    def assets_build_command(clean) -> None:
+        """static/ のハッシュ付きコピーと .gz / .br を static/dist/ に作る"""
+        manifest = assets.build(app)
+        print(f"[assets] {len(manifest)} files")
+        if clean:
+            print(f"[assets] removed {assets.clean(app, manifest)} stale files")
+
+    @app.cli.command("export-static")
+    @click.option("--output", "-o", default="site", show_default=True, help="書き出し先")
+    @click.option("--full", is_flag=True, help="変更の無い診断も描画し直す")
+    def export_static_command(output, full) -> None:
+        """公開ページ（トップ・各診断）と採点表を静的ファイルとして書き出す"""
+        import static_export
+
+        prepare_database(app)
+        started = time.perf_counter()
+        with app.app_context():
+            report = static_export.export_site(app, output, full=full)
+        elapsed = time.perf_counter() - started
+        print(
+            f"[export-static] rendered={report.rendered} skipped={report.skipped} "
+            f"removed={report.removed} files={report.written} in {elapsed:.2f}s -> {output}"
+        )
+
+    @app.cli.command("db-status")
+    def db_status_command() -> None:
+        """スキーマのバージョンと未適用のマイグレーションを表示"""
+        print(f"schema version: {current_version()} / {LATEST_VERSION}")
+        pending = pending_migrations()
+        for m in pending:
+            print(f"  pending {m.version}: {m.description}")
+        if not pending:
+            print("  up to date")
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade_command() -> None:
+        """未適用のマイグレーションを適用（AUTO_MIGRATE=0 の運用向け）"""
+        for m in run_auto_migrations():
+            print(f"applied {m.version}: {m.description}")
+
     return app
 
 
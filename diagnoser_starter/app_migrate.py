@@ -1,128 +1,235 @@
-# --- app_migrate.py: 以下の4関数をまとめて置き換え/追記してください ---
 from __future__ import annotations
 
+from typing import Callable, NamedTuple
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    false,
+    inspect,
+    text,
+)
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+
 from extensions import db
+from models import summarize
 
+# ============================================================
+# バージョン付きの軽量マイグレーション
+#   - schema_version テーブル（1行）に適用済みのバージョンを記録
+#   - 起動時はそれを1回読むだけ。最新なら何もしない
+#   - 古い DB（このテーブルが無い）では、各ステップが列の有無を見て
+#     必要な分だけ適用する（冪等）。1ステップ = 1トランザクション
+#   - 列の有無は SQLAlchemy の inspector で調べ、DDL は接続先の方言で組み立てる
+#     （SQLite / PostgreSQL のどちらでも動く）
+#   - 新しい列・テーブルを足したら MIGRATIONS の末尾にステップを追加する
+# ============================================================
 
-def _has_column(table: str, column: str) -> bool:
-    engine = db.engine
-    with engine.connect() as conn:
-        rows = conn.exec_driver_sql(f"PRAGMA table_info({table});")
-        cols = [row[1] for row in rows]  # row[1] = column name
-    return column in cols
+# 行コピー（テーブル作り直し・値の埋め戻し）の1回あたりの件数
+COPY_BATCH_SIZE = 1000
 
 
-def _col_meta(table: str):
-    engine = db.engine
-    with engine.connect() as conn:
-        return list(conn.exec_driver_sql(f"PRAGMA table_info({table});"))
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable
 
 
-def _table_exists(name: str) -> bool:
-    engine = db.engine
-    with engine.connect() as conn:
-        rows = conn.exec_driver_sql(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?;",
-            (name,),
-        )
-        return bool(list(rows))
-
-
-def _is_winning_trait_notnull() -> bool:
-    # result.winning_trait_id が NOT NULL かどうか
-    for row in _col_meta("result"):
-        # row: (cid, name, type, notnull, dflt_value, pk)
-        if row[1] == "winning_trait_id":
-            return bool(row[3])  # 1 = NOT NULL
-    return False
-
-
-def run_auto_migrations() -> None:
-    """SQLite向けの軽量マイグレーション（冪等）
-    - choice.sum_points の追加
-    - result.min_total / result.max_total の追加
-    - quiz.display_mode の追加
-    - quiz.choice_mode の追加  ← 追加
-    - quiz.image_url の追加
-    - quiz.choice_style の追加
-    - question.multiple の追加
-    - result.winning_trait_id の NULL 許容化
+# ---------- 列情報と DDL（方言まかせ） ----------
+
+def _columns(conn, table: str) -> dict[str, dict]:
+    """列名 -> inspector の列情報（name, type, nullable, default ...）。"""
+    return {col["name"]: col for col in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table: str, column: Column) -> None:
+    """列が無ければ ALTER TABLE ... ADD COLUMN（型・既定値は方言に合わせて出力）。
+
+    既存行がある表に NOT NULL 列を足すので、NOT NULL の列には server_default を付けること。
     """
-    engine = db.engine
-    with engine.begin() as conn:
-        # --- 必要な列を追加（存在しなければ） ---
-        if _table_exists("choice") and not _has_column("choice", "sum_points"):
-            conn.exec_driver_sql(
-                "ALTER TABLE choice ADD COLUMN sum_points INTEGER NOT NULL DEFAULT 0;"
-            )
-
-        if _table_exists("result") and not _has_column("result", "min_total"):
-            conn.exec_driver_sql(
-                "ALTER TABLE result ADD COLUMN min_total INTEGER NULL;"
-            )
-        if _table_exists("result") and not _has_column("result", "max_total"):
-            conn.exec_driver_sql(
-                "ALTER TABLE result ADD COLUMN max_total INTEGER NULL;"
-            )
-
-        if _table_exists("quiz") and not _has_column("quiz", "display_mode"):
-            conn.exec_driver_sql(
-                "ALTER TABLE quiz ADD COLUMN display_mode VARCHAR(20) NOT NULL DEFAULT 'ordered';"
-            )
-
-        # ★ 抜けていた：選択肢の並びモード
-        if _table_exists("quiz") and not _has_column("quiz", "choice_mode"):
-            conn.exec_driver_sql(
-                "ALTER TABLE quiz ADD COLUMN choice_mode VARCHAR(20) NOT NULL DEFAULT 'ordered';"
-            )
-
-        if _table_exists("quiz") and not _has_column("quiz", "image_url"):
-            conn.exec_driver_sql(
-                "ALTER TABLE quiz ADD COLUMN image_url VARCHAR(500) NULL;"
-            )
-
-        if _table_exists("quiz") and not _has_column("quiz", "choice_style"):
-            conn.exec_driver_sql(
-                "ALTER TABLE quiz ADD COLUMN choice_style VARCHAR(20) NOT NULL DEFAULT 'normal';"
-            )
-
-        # ★ 複数選択フラグ（重複を1箇所に集約）
-        if _table_exists("question") and not _has_column("question", "multiple"):
-            # SQLiteのBOOLEANは整数（0/1）
-            conn.exec_driver_sql(
-                "ALTER TABLE question ADD COLUMN multiple INTEGER NOT NULL DEFAULT 0;"
-            )
-
-        # --- result.winning_trait_id を NULL 許容に修正（必要な場合のみ） ---
-        if _table_exists("result") and _is_winning_trait_notnull():
-            conn.exec_driver_sql("DROP TABLE IF EXISTS result_new;")
-            conn.exec_driver_sql(
-                "CREATE TABLE result_new ("
-                "  id INTEGER PRIMARY KEY,"
-                "  quiz_id INTEGER NOT NULL,"
-                "  title VARCHAR(200) NOT NULL,"
-                "  description TEXT,"
-                "  min_total INTEGER NULL,"
-                "  max_total INTEGER NULL,"
-                "  winning_trait_id INTEGER NULL,"
-                "  FOREIGN KEY(quiz_id) REFERENCES quiz (id),"
-                "  FOREIGN KEY(winning_trait_id) REFERENCES trait (id)"
-                ");"
-            )
-
-            cols = [c[1] for c in _col_meta("result")]
-            has_min = "min_total" in cols
-            has_max = "max_total" in cols
-            select_min = "min_total" if has_min else "NULL"
-            select_max = "max_total" if has_max else "NULL"
-
-            conn.exec_driver_sql(
-                "INSERT INTO result_new "
-                "(id, quiz_id, title, description, min_total, max_total, winning_trait_id) "
-                f"SELECT id, quiz_id, title, description, {select_min}, {select_max}, NULL "
-                "FROM result;"
-            )
-
-            conn.exec_driver_sql("DROP TABLE result;")
-            conn.exec_driver_sql("ALTER TABLE result_new RENAME TO result;")
+    if column.name in _columns(conn, table):
+        return
+    preparer = conn.dialect.identifier_preparer
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {ddl}"))
+
+
+# ---------- 各ステップ ----------
+
+def _choice_sum_points(conn) -> None:
+    _add_column(conn, "choice", Column("sum_points", Integer, nullable=False, server_default="0"))
+
+
+def _result_totals(conn) -> None:
+    _add_column(conn, "result", Column("min_total", Integer, nullable=True))
+    _add_column(conn, "result", Column("max_total", Integer, nullable=True))
+
+
+def _quiz_display_modes(conn) -> None:
+    for name, default in (("display_mode", "ordered"), ("choice_mode", "ordered")):
+        _add_column(conn, "quiz", Column(name, String(20), nullable=False, server_default=default))
+    _add_column(conn, "quiz", Column("image_url", String(500), nullable=True))
+    _add_column(
+        conn, "quiz", Column("choice_style", String(20), nullable=False, server_default="normal")
+    )
+
+
+def _question_multiple(conn) -> None:
+    # SQLite では 0/1 の整数、PostgreSQL では BOOLEAN
+    _add_column(
+        conn, "question", Column("multiple", Boolean, nullable=False, server_default=false())
+    )
+
+
+def _result_winning_trait_nullable(conn) -> None:
+    """result.winning_trait_id を NULL 許容に。"""
+    col = _columns(conn, "result").get("winning_trait_id")
+    if col is None or col["nullable"]:
+        return  # 列が無い / すでに NULL 許容
+
+    if conn.dialect.name != "sqlite":
+        conn.execute(text("ALTER TABLE result ALTER COLUMN winning_trait_id DROP NOT NULL"))
+        return
+    _rebuild_result_sqlite(conn)
+
+
+def _rebuild_result_sqlite(conn) -> None:
+    """SQLite は列の制約を変えられないので、テーブルを作り直して行を移す。"""
+    cols = _columns(conn, "result")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS result_new;")
+    conn.exec_driver_sql(
+        "CREATE TABLE result_new ("
+        "  id INTEGER PRIMARY KEY,"
+        "  quiz_id INTEGER NOT NULL,"
+        "  title VARCHAR(200) NOT NULL,"
+        "  description TEXT,"
+        "  min_total INTEGER NULL,"
+        "  max_total INTEGER NULL,"
+        "  winning_trait_id INTEGER NULL,"
+        "  FOREIGN KEY(quiz_id) REFERENCES quiz (id),"
+        "  FOREIGN KEY(winning_trait_id) REFERENCES trait (id)"
+        ");"
+    )
+    select_min = "min_total" if "min_total" in cols else "NULL"
+    select_max = "max_total" if "max_total" in cols else "NULL"
+
+    # id 順に COPY_BATCH_SIZE 件ずつ移す（巨大なテーブルでも1文の仕事量を抑える）
+    last_id = -1
+    while True:
+        conn.exec_driver_sql(
+            "INSERT INTO result_new "
+            "(id, quiz_id, title, description, min_total, max_total, winning_trait_id) "
+            f"SELECT id, quiz_id, title, description, {select_min}, {select_max}, NULL "
+            "FROM result WHERE id > ? ORDER BY id LIMIT ?;",
+            (last_id, COPY_BATCH_SIZE),
+        )
+        copied_to = conn.exec_driver_sql("SELECT MAX(id) FROM result_new;").scalar()
+        if copied_to is None or copied_to == last_id:
+            break
+        last_id = copied_to
+
+    conn.exec_driver_sql("DROP TABLE result;")
+    conn.exec_driver_sql("ALTER TABLE result_new RENAME TO result;")
+
+
+def _quiz_scoring_mode(conn) -> None:
+    _add_column(
+        conn, "quiz", Column("scoring_mode", String(20), nullable=False, server_default="sum")
+    )
+
+
+def _quiz_summary(conn) -> None:
+    """quiz.summary を追加し、既存行は description から埋める。"""
+    if "summary" in _columns(conn, "quiz"):
+        return
+    _add_column(conn, "quiz", Column("summary", String(200), nullable=True))
+    select_page = text(
+        "SELECT id, description FROM quiz WHERE id > :after ORDER BY id LIMIT :limit"
+    )
+    update = text("UPDATE quiz SET summary = :summary WHERE id = :qid")
+    last_id = -1
+    while True:
+        rows = conn.execute(select_page, {"after": last_id, "limit": COPY_BATCH_SIZE}).all()
+        if not rows:
+            break
+        conn.execute(update, [{"summary": summarize(desc), "qid": qid} for qid, desc in rows])
+        last_id = rows[-1][0]
+
+
+def _quiz_revision(conn) -> None:
+    _add_column(conn, "quiz", Column("revision", Integer, nullable=False, server_default="0"))
+    _add_column(conn, "quiz", Column("updated_at", DateTime, nullable=True))
+
+
+def _quiz_page_size(conn) -> None:
+    _add_column(conn, "quiz", Column("page_size", Integer, nullable=False, server_default="0"))
 
+
+def _create_missing_tables(conn) -> None:
+    # 新しいテーブルは create_all に任せる（既存テーブルには触れない）
+    db.metadata.create_all(bind=conn)
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "choice.sum_points の追加", _choice_sum_points),
+    Migration(2, "result.min_total / result.max_total の追加", _result_totals),
+    Migration(
+        3,
+        "quiz.display_mode / choice_mode / image_url / choice_style の追加",
+        _quiz_display_modes,
+    ),
+    Migration(4, "question.multiple の追加", _question_multiple),
+    Migration(5, "result.winning_trait_id の NULL 許容化", _result_winning_trait_nullable),
+    Migration(6, "quiz.scoring_mode の追加", _quiz_scoring_mode),
+    Migration(7, "quiz.summary の追加（既存行は description から埋める）", _quiz_summary),
+    Migration(8, "quiz.revision / quiz.updated_at の追加", _quiz_revision),
+    Migration(9, "回答ログ（submission / quiz_stat / result_stat）の作成", _create_missing_tables),
+    Migration(10, "quiz.page_size の追加", _quiz_page_size),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ---------- バージョン管理 ----------
+
+def current_version() -> int:
+    """適用済みのバージョン（schema_version が無い古い DB / 空の DB は 0）。"""
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+    except DBAPIError:
+        return 0
+
+
+def pending_migrations() -> list[Migration]:
+    version = current_version()
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def _set_version(conn, version: int) -> None:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+
+
+def run_auto_migrations() -> list[Migration]:
+    """未適用のステップを順に適用し、適用したステップを返す。
+
+    最新の DB では schema_version を1回読むだけで戻る。そうでなければ
+    まず不足テーブルを create_all で作り（空の DB はこれで最新の形になる）、
+    続けて各ステップを1つずつ、バージョン更新と同じトランザクションで適用する。
+    """
+    pending = pending_migrations()
+    if not pending:
+        return []
+
+    db.create_all()
+    for migration in pending:
+        with db.engine.begin() as conn:
+            migration.apply(conn)
+            _set_version(conn, migration.version)
+    return pending
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+
+from flask import Flask, Response, abort, current_app, request, send_file, url_for
+
+from query_budget import query_budget
+
+try:  # brotli は任意（無ければ .gz のみ）
+    import brotli
+except ImportError:  # pragma: no cover - 環境依存
+    brotli = None
+
+# ============================================================
+# 静的ファイルのフィンガープリントと事前圧縮
+#   - static/ 以下（uploads/ と dist/ を除く）を内容ハッシュ付きの名前で
+#     static/dist/ にコピーし、.gz / .br も並べて置く（変わったファイルだけ作る）
+#       css/main.css -> dist/css/main.<hash>.css (+ .gz / .br)
+#   - 対応表は dist/manifest.json。テンプレートは asset_url('css/main.css') で参照する
+#   - /assets/<name> は Accept-Encoding に合わせて圧縮済みのファイルを返し、
+#     1年 + immutable でキャッシュさせる。ASSET_OFFLOAD でフロントのプロキシに任せられる
+#       x-accel    : X-Accel-Redirect（nginx。ASSET_X_ACCEL_PREFIX を internal の location に）
+#       x-sendfile : X-Sendfile（Apache / lighttpd）
+#   - debug 中は static/ をそのまま参照する（CSS を編集してすぐ確認できるように）
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+SKIP_DIRS = {"uploads", DIST_DIR}
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".map", ".html"}
+HASH_LENGTH = 12
+
+
+def _static_root(app: Flask) -> str:
+    return app.static_folder
+
+
+def _dist_root(app: Flask) -> str:
+    return os.path.join(app.static_folder, DIST_DIR)
+
+
+def iter_sources(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root:
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, path)
+
+
+def _compress(path: str, data: bytes) -> None:
+    """.gz / .br を作る（元より小さくならなければ作らない）。"""
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        _write_atomic(path + ".gz", gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            _write_atomic(path + ".br", br)
+
+
+def build(app: Flask) -> dict[str, str]:
+    """static/ の各ファイルのハッシュ付きコピーと圧縮版を作り、対応表を書いて返す。
+
+    すでにある（内容が同じ）ファイルは作り直さないので、起動のたびに呼んでも軽い。
+    """
+    root, dist = _static_root(app), _dist_root(app)
+    manifest: dict[str, str] = {}
+    for logical, path in iter_sources(root):
+        with open(path, "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(logical)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        manifest[logical] = hashed
+        target = os.path.join(dist, hashed)
+        if os.path.exists(target):
+            continue
+        _write_atomic(target, data)
+        if ext.lower() in COMPRESSIBLE:
+            _compress(target, data)
+
+    body = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    manifest_path = os.path.join(dist, MANIFEST)
+    try:
+        with open(manifest_path, "rb") as f:
+            unchanged = f.read() == body
+    except FileNotFoundError:
+        unchanged = False
+    if not unchanged:
+        _write_atomic(manifest_path, body)
+    return manifest
+
+
+def clean(app: Flask, manifest: dict[str, str]) -> int:
+    """対応表に無い古いハッシュ付きファイルを消し、消した数を返す。"""
+    dist = _dist_root(app)
+    keep = {MANIFEST}
+    for hashed in manifest.values():
+        keep.update({hashed, hashed + ".gz", hashed + ".br"})
+    removed = 0
+    for name, path in list(iter_sources(dist)):
+        if name not in keep:
+            os.unlink(path)
+            removed += 1
+    return removed
+
+
+def _load(app: Flask) -> None:
+    # 既定では static/ に書き込まない（dist/ は flask assets-build で作る）
+    manifest = build(app) if app.config.get("ASSET_BUILD_ON_STARTUP", False) else None
+    if manifest is None:
+        try:
+            with open(os.path.join(_dist_root(app), MANIFEST), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            log.warning(
+                "%s がありません（flask assets-build で作成。それまでは /static/ を参照）", MANIFEST
+            )
+            manifest = {}
+    app.extensions["assets"] = manifest
+    # ページの ETag に含める版（アセットが変わればページも別物として扱う）
+    app.extensions["assets_version"] = hashlib.sha1(
+        json.dumps(manifest, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+
+
+# ---------- テンプレート ----------
+
+def asset_url(filename: str, **values) -> str:
+    """url_for('static', filename=...) の代わり。ハッシュ付きの /assets/ の URL を返す。
+
+    対応表に無いファイルと debug 中は /static/ の URL（debug は更新時刻を ?v= に付ける）。
+    """
+    app = current_app
+    manifest = app.extensions.get("assets") or {}
+    if app.debug or filename not in manifest:
+        if app.debug and "v" not in values:
+            try:
+                values["v"] = int(os.path.getmtime(os.path.join(app.static_folder, filename)))
+            except OSError:
+                pass
+        return url_for("static", filename=filename, **values)
+    return url_for("assets", filename=manifest[filename], **values)
+
+
+# ---------- 配信 ----------
+
+def _choose(path: str) -> tuple[str, str | None]:
+    accept = request.accept_encodings
+    if accept["br"] and os.path.exists(path + ".br"):
+        return path + ".br", "br"
+    if accept["gzip"] and os.path.exists(path + ".gz"):
+        return path + ".gz", "gzip"
+    return path, None
+
+
+@query_budget(0)
+def serve_asset(filename: str):
+    dist = _dist_root(current_app)
+    path = os.path.realpath(os.path.join(dist, filename))
+    if not path.startswith(os.path.realpath(dist) + os.sep) or not os.path.isfile(path):
+        abort(404)
+    if filename == MANIFEST or filename.endswith((".gz", ".br")):
+        abort(404)
+    served, encoding = _choose(path)
+    mimetype = _mimetype(filename)
+    max_age = int(current_app.config.get("ASSET_MAX_AGE", 31536000))
+    offload = current_app.config.get("ASSET_OFFLOAD", "")
+
+    if offload == "x-accel":
+        prefix = current_app.config.get("ASSET_X_ACCEL_PREFIX", "/_assets/")
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = prefix + os.path.relpath(served, dist).replace(
+            os.sep, "/"
+        )
+    elif offload == "x-sendfile":
+        response = Response(mimetype=mimetype)
+        response.headers["X-Sendfile"] = served
+    else:
+        response = send_file(served, mimetype=mimetype, conditional=True, max_age=max_age)
+
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    return response
+
+
+def _mimetype(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def init_app(app: Flask) -> None:
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.add_template_global(asset_url, "asset_url")
+    if app.config.get("ASSET_PIPELINE", True):
+        _load(app)
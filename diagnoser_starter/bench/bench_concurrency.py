@@ -0,0 +1,206 @@
+"""書き込み中の読み取りスループットのベンチマーク（SQLITE_PROFILE の比較用）。
+
+プロファイルごとに新しいプロセスを起動し、同じ条件で次を同時に走らせます。
+
+  readers          : 管理画面の質問一覧（毎回 DB を読む）を GET し続けるスレッド
+  writers          : 管理画面から診断の基本設定を POST し続けるスレッド（@serialized_write 経由）
+  external writers : 別プロセスから sqlite3 で直接書き込む（他のワーカープロセスの代わり）
+
+結果として、読み取り回数/秒・レイテンシ（p50/p95）・書き込み回数・"database is locked" などの
+エラー数をプロファイルごとに表示します。
+
+使い方（diagnoser_starter/ で実行）:
+
+  python bench/bench_concurrency.py                       # default と production を比較
+  python bench/bench_concurrency.py --seconds 10 --readers 8 --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+
+def _external_writer(path: str, stop_at: float, hold: float) -> None:
+    """別プロセス：短いトランザクションで question を更新し続ける。"""
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    writes = errors = 0
+    while time.time() < stop_at:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute(
+                "UPDATE question SET text = text WHERE id = (SELECT MIN(id) FROM question);"
+            )
+            time.sleep(hold)  # ロックを持ったままの時間（重い書き込みの代わり）
+            conn.execute("COMMIT;")
+            writes += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+        time.sleep(0.005)
+    print(json.dumps({"writes": writes, "errors": errors}))
+
+
+def _child(args) -> None:
+    """1つのプロファイルで計測して、結果を JSON 1行で出力する。"""
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+    import app as app_module
+    from models import Quiz
+    from seed import seed
+
+    flask_app = app_module.app
+    app_module.prepare_database(flask_app)
+    with flask_app.app_context():
+        seed()
+        quiz_id = Quiz.query.first().id
+
+    def login():
+        client = flask_app.test_client()
+        client.post("/admin/login", data={"username": "admin", "password": "admin123"})
+        return client
+
+    stop_at = time.time() + args.seconds
+    latencies: list[float] = []
+    counters = {"reads": 0, "read_errors": 0, "writes": 0, "write_errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        client = login()
+        local: list[float] = []
+        ok = err = 0
+        while time.time() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                r = client.get(f"/admin/quiz/{quiz_id}/questions")
+                if r.status_code == 200:
+                    ok += 1
+                    local.append(time.perf_counter() - t0)
+                else:
+                    err += 1
+            except Exception:
+                err += 1
+        with lock:
+            latencies.extend(local)
+            counters["reads"] += ok
+            counters["read_errors"] += err
+
+    def writer():
+        client = login()
+        ok = err = n = 0
+        while time.time() < stop_at:
+            n += 1
+            try:
+                r = client.post(
+                    f"/admin/quiz/{quiz_id}/edit",
+                    data={"title": f"bench {n}", "description": "bench"},
+                )
+                if r.status_code in (200, 302):
+                    ok += 1
+                else:
+                    err += 1
+            except Exception:
+                err += 1
+        with lock:
+            counters["writes"] += ok
+            counters["write_errors"] += err
+
+    db_path = os.environ["DATABASE_URL"].removeprefix("sqlite:///")
+    externals = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--external", db_path, str(stop_at), str(args.hold)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(args.external_writers)
+    ]
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ext = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in externals]
+
+    latencies.sort()
+    print(
+        json.dumps(
+            {
+                **counters,
+                "reads_per_sec": round(counters["reads"] / args.seconds, 1),
+                "read_p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+                "read_p95_ms": (
+                    round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2)
+                    if latencies
+                    else None
+                ),
+                "external_writes": sum(e["writes"] for e in ext),
+                "external_errors": sum(e["errors"] for e in ext),
+            }
+        )
+    )
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--external":
+        _external_writer(sys.argv[2], float(sys.argv[3]), float(sys.argv[4]))
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", default="default,production")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--external-writers", type=int, default=1)
+    parser.add_argument("--hold", type=float, default=0.02, help="外部書き込みのロック保持秒数")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return 0
+
+    results = {}
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.pop("ADMIN_PASSWORD", None)
+            env.update(
+                DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench.db"),
+                SQLITE_PROFILE=profile,
+                SUBMISSION_LOG_ENABLED="0",
+            )
+            cmd = [sys.executable, __file__, "--child"] + [
+                a for a in sys.argv[1:] if a != "--json"
+            ]
+            out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+            results[profile] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for profile, r in results.items():
+        print(
+            f"{profile:<11} reads/s {r['reads_per_sec']:>8.1f}"
+            f"  p50 {r['read_p50_ms']} ms  p95 {r['read_p95_ms']} ms"
+            f"  read errors {r['read_errors']}"
+            f"  writes {r['writes']} (errors {r['write_errors']})"
+            f"  external writes {r['external_writes']} (errors {r['external_errors']})"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""公開ページ・管理画面の負荷／レイテンシのベンチマーク。
+
+一時 DB に合成データ（診断数 × 質問数 × 選択肢数 × 結果数）を作り、本物の Flask アプリを
+次の2通りで叩いて、エンドポイントごとのスループットと p50/p95/p99 レイテンシ、
+1リクエストあたりの SQL 発行数（X-SQL-Queries ヘッダ）を JSON で出力します。
+
+  client : Flask の test client（1スレッド。アプリ本体の処理時間）
+  server : werkzeug のマルチスレッド WSGI サーバー + 複数スレッドの HTTP クライアント
+
+対象エンドポイント:
+  index               GET  /
+  quiz_start          GET  /quiz/<id>
+  quiz_result         POST /quiz/<id>/result
+  admin_questions     GET  /admin/quiz/<id>/questions
+  admin_question_edit GET  /admin/question/<id>/edit
+
+使い方（diagnoser_starter/ で実行）:
+
+  python bench/bench_load.py
+  python bench/bench_load.py --quizzes 200 --questions 30 --choices 5 --results 6 \\
+      --requests 500 --threads 16 --mode server --output bench-load.json
+
+JSON を保存しておけば、別の実行結果と並べて比較できます。
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+ADMIN_USER = "admin"
+ADMIN_PASSWORD = "bench-admin"
+
+ENDPOINTS = ("index", "quiz_start", "quiz_result", "admin_questions", "admin_question_edit")
+
+
+# ---------- 合成データ ----------
+
+def generate(quizzes: int, questions: int, choices: int, results: int, seed: int) -> dict:
+    """空の DB に合成データを一括投入し（bulk_load）、リクエスト作成用の id 一覧を返す。"""
+    from sqlalchemy import insert, select
+    from werkzeug.security import generate_password_hash
+
+    from bulk_load import load_synthetic
+    from extensions import db
+    from models import Choice, Question, User
+
+    db.session.execute(
+        insert(User.__table__),
+        [{"username": ADMIN_USER, "password_hash": generate_password_hash(ADMIN_PASSWORD)}],
+    )
+    quiz_ids = load_synthetic(
+        quizzes, questions=questions, choices=choices, results=results, seed=seed
+    )
+
+    layout: dict[int, list[tuple[int, list[int]]]] = {quiz_id: [] for quiz_id in quiz_ids}
+    choices_of: dict[int, list[int]] = {}
+    question_ids: list[int] = []
+    rows = db.session.execute(
+        select(Question.id, Question.quiz_id).order_by(Question.quiz_id, Question.order)
+    )
+    for question_id, quiz_id in rows:
+        choices_of[question_id] = []
+        layout[quiz_id].append((question_id, choices_of[question_id]))
+        question_ids.append(question_id)
+    for choice_id, question_id in db.session.execute(
+        select(Choice.id, Choice.question_id).order_by(Choice.id)
+    ):
+        choices_of[question_id].append(choice_id)
+    return {"layout": layout, "question_ids": question_ids}
+
+
+def make_requests(data: dict, endpoint: str, count: int, seed: int) -> list[tuple]:
+    """(method, path, form) の並びを作る。"""
+    rnd = random.Random(seed)
+    layout = data["layout"]
+    quiz_ids = list(layout)
+    reqs = []
+    for _ in range(count):
+        quiz_id = rnd.choice(quiz_ids)
+        if endpoint == "index":
+            reqs.append(("GET", "/", None))
+        elif endpoint == "quiz_start":
+            reqs.append(("GET", f"/quiz/{quiz_id}", None))
+        elif endpoint == "quiz_result":
+            form = {f"q-{qid}": str(rnd.choice(cids)) for qid, cids in layout[quiz_id]}
+            reqs.append(("POST", f"/quiz/{quiz_id}/result", form))
+        elif endpoint == "admin_questions":
+            reqs.append(("GET", f"/admin/quiz/{quiz_id}/questions", None))
+        elif endpoint == "admin_question_edit":
+            reqs.append(("GET", f"/admin/question/{rnd.choice(data['question_ids'])}/edit", None))
+    return reqs
+
+
+# ---------- 集計 ----------
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize_samples(samples: list[tuple[float, int, int]], wall: float) -> dict:
+    """samples は (秒, ステータス, SQL 数) の並び。"""
+    latencies = sorted(s[0] for s in samples)
+    sql = [s[2] for s in samples]
+    errors = sum(1 for s in samples if s[1] >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / wall, 1) if wall > 0 else None,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "sql_mean": round(statistics.fmean(sql), 2) if sql else 0.0,
+        "sql_max": max(sql) if sql else 0,
+    }
+
+
+# ---------- 実行（test client / サーバー） ----------
+
+def run_client(app, data: dict, args) -> dict:
+    client = app.test_client()
+    client.post("/admin/login", data={"username": ADMIN_USER, "password": ADMIN_PASSWORD})
+    out = {}
+    for endpoint in args.endpoints:
+        for method, path, form in make_requests(data, endpoint, args.warmup, args.seed + 1):
+            client.open(path, method=method, data=form)
+        samples = []
+        started = time.perf_counter()
+        for method, path, form in make_requests(data, endpoint, args.requests, args.seed):
+            t0 = time.perf_counter()
+            r = client.open(path, method=method, data=form)
+            samples.append(
+                (time.perf_counter() - t0, r.status_code, int(r.headers.get("X-SQL-Queries", 0)))
+            )
+        out[endpoint] = summarize_samples(samples, time.perf_counter() - started)
+    return out
+
+
+class _HttpWorker:
+    """スレッドごとの HTTP 接続（管理画面用のログイン Cookie 付き）。"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        self.cookie = ""
+        response, _ = self.request(
+            "POST", "/admin/login", {"username": ADMIN_USER, "password": ADMIN_PASSWORD}
+        )
+        self.cookie = (response.getheader("Set-Cookie") or "").split(";", 1)[0]
+
+    def request(self, method: str, path: str, form: dict | None):
+        body = urlencode(form) if form is not None else None
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        if body is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        t0 = time.perf_counter()
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - t0
+        if response.will_close:  # keep-alive でなければ次回は新しい接続
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        return response, elapsed
+
+
+def run_server(app, data: dict, args) -> dict:
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_port
+    local = threading.local()
+
+    def call(req):
+        worker = getattr(local, "worker", None)
+        if worker is None:
+            worker = local.worker = _HttpWorker(port)
+        method, path, form = req
+        response, elapsed = worker.request(method, path, form)
+        return elapsed, response.status, int(response.getheader("X-SQL-Queries", "0"))
+
+    out = {}
+    try:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            for endpoint in args.endpoints:
+                list(pool.map(call, make_requests(data, endpoint, args.warmup, args.seed + 1)))
+                reqs = make_requests(data, endpoint, args.requests, args.seed)
+                started = time.perf_counter()
+                samples = list(pool.map(call, reqs))
+                out[endpoint] = summarize_samples(samples, time.perf_counter() - started)
+    finally:
+        server.shutdown()
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quizzes", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=15)
+    parser.add_argument("--choices", type=int, default=4)
+    parser.add_argument("--results", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="エンドポイントごとの計測回数")
+    parser.add_argument("--warmup", type=int, default=20, help="計測前に捨てるリクエスト数")
+    parser.add_argument("--threads", type=int, default=8, help="server モードのクライアント数")
+    parser.add_argument("--mode", choices=("client", "server", "both"), default="both")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON の保存先（省略時は標準出力のみ）")
+    args = parser.parse_args()
+    args.endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmpdir.name, "bench.db")
+    os.environ["SQL_QUERY_BUDGET"] = "warn"  # X-SQL-Queries ヘッダを付けるため
+    # 全リクエストが同じアドレスから来るので、採点のレート制限・負荷制御は切っておく
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    os.environ["LOAD_SHED_ENABLED"] = "0"
+    os.environ.pop("ADMIN_PASSWORD", None)
+    logging.getLogger("query_budget").setLevel(logging.ERROR)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # アクセスログを出さない
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+
+    import app as app_module
+    from submission_log import writer
+
+    flask_app = app_module.app
+    app_module.prepare_database(flask_app)
+    started = time.perf_counter()
+    with flask_app.app_context():
+        data = generate(args.quizzes, args.questions, args.choices, args.results, args.seed)
+    generate_sec = time.perf_counter() - started
+
+    report = {
+        "config": {
+            k: getattr(args, k)
+            for k in (
+                "quizzes", "questions", "choices", "results", "requests",
+                "warmup", "threads", "mode", "endpoints", "seed",
+            )
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sqlite_profile": flask_app.config.get("SQLITE_PROFILE"),
+        },
+        "generate_sec": round(generate_sec, 3),
+        "results": {},
+    }
+    if args.mode in ("client", "both"):
+        report["results"]["client"] = run_client(flask_app, data, args)
+    if args.mode in ("server", "both"):
+        report["results"]["server"] = run_server(flask_app, data, args)
+
+    writer.stop()
+    tmpdir.cleanup()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
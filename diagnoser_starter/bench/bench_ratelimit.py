@@ -0,0 +1,149 @@
+"""採点エンドポイントのレート制限（ratelimit.py）の並行実行チェックとベンチマーク。
+
+複数スレッドから同時に次を走らせ、約束が守られているかを確かめてスループットを表示します。
+
+  same key   : 1つのキーを全スレッドで取り合い、通った数が BURST + RATE × 経過秒 を超えないこと
+  many keys  : スレッドごとに別のキー。shard 1 本（＝1本のロック）と既定の shard 数で回数/秒を比較
+  bounded    : MAX_KEYS を超える数のキーを入れても、保持数が上限を超えないこと
+  shedding   : 処理中の上限（max_inflight）を超えて同時に受け付けないこと
+
+約束が破られたら終了コード 1 で終わります。
+
+使い方（diagnoser_starter/ で実行）:
+
+  python bench/bench_ratelimit.py
+  python bench/bench_ratelimit.py --threads 16 --seconds 3 --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ratelimit import LoadShedder, TokenBuckets  # noqa: E402
+
+
+def _run_threads(count: int, target) -> None:
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def same_key(threads: int, seconds: float, rate: float, burst: float) -> dict:
+    buckets = TokenBuckets(rate=rate, burst=burst)
+    allowed = [0] * threads
+    started = time.monotonic()
+    stop_at = started + seconds
+
+    def work(n: int) -> None:
+        while time.monotonic() < stop_at:
+            if not buckets.acquire(("127.0.0.1", 1)):
+                allowed[n] += 1
+
+    _run_threads(threads, work)
+    elapsed = time.monotonic() - started
+    limit = burst + rate * elapsed
+    return {"allowed": sum(allowed), "limit": round(limit, 1), "ok": sum(allowed) <= limit}
+
+
+def many_keys(threads: int, seconds: float, shards: int) -> dict:
+    buckets = TokenBuckets(rate=1000.0, burst=1000.0, shards=shards)
+    calls = [0] * threads
+    stop_at = time.monotonic() + seconds
+
+    def work(n: int) -> None:
+        key = 0
+        while time.monotonic() < stop_at:
+            for _ in range(200):
+                buckets.acquire((f"10.0.{n}.{key % 256}", key % 50))
+                key += 1
+            calls[n] += 200
+
+    _run_threads(threads, work)
+    return {"shards": shards, "calls_per_sec": round(sum(calls) / seconds)}
+
+
+def bounded(threads: int, max_keys: int) -> dict:
+    buckets = TokenBuckets(rate=1.0, burst=5.0, max_keys=max_keys, shards=16)
+
+    def work(n: int) -> None:
+        for key in range(max_keys):
+            buckets.acquire((n, key))
+
+    _run_threads(threads, work)
+    return {"inserted": threads * max_keys, "kept": len(buckets), "ok": len(buckets) <= max_keys}
+
+
+def shedding(threads: int, max_inflight: int) -> dict:
+    shedder = LoadShedder(max_inflight=max_inflight)
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0, "admitted": 0}
+
+    def work(_n: int) -> None:
+        for _ in range(200):
+            slots = shedder.enter()
+            if slots is None:
+                continue
+            with lock:
+                state["now"] += 1
+                state["admitted"] += 1
+                state["peak"] = max(state["peak"], state["now"])
+            time.sleep(0.0005)  # 採点の処理の代わり
+            with lock:
+                state["now"] -= 1
+            shedder.leave(slots, 0.0005)
+
+    _run_threads(threads, work)
+    return {
+        "admitted": state["admitted"],
+        "shed": shedder.shed,
+        "peak_inflight": state["peak"],
+        "ok": state["peak"] <= max_inflight,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--burst", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = {
+        "same_key": same_key(args.threads, args.seconds, args.rate, args.burst),
+        "many_keys": [many_keys(args.threads, args.seconds, s) for s in (1, 64)],
+        "bounded": bounded(args.threads, 2000),
+        "shedding": shedding(args.threads, max(1, args.threads // 2)),
+    }
+    ok = all(results[k]["ok"] for k in ("same_key", "bounded", "shedding"))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        r = results["same_key"]
+        verdict = "ok" if r["ok"] else "NG"
+        print(f"same key   allowed {r['allowed']} (limit {r['limit']})  {verdict}")
+        for r in results["many_keys"]:
+            print(f"many keys  shards {r['shards']:>3}  {r['calls_per_sec']:>10,} calls/s")
+        r = results["bounded"]
+        print(f"bounded    inserted {r['inserted']}  kept {r['kept']}  {'ok' if r['ok'] else 'NG'}")
+        r = results["shedding"]
+        print(
+            f"shedding   admitted {r['admitted']}  shed {r['shed']}"
+            f"  peak in-flight {r['peak_inflight']}  {'ok' if r['ok'] else 'NG'}"
+        )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
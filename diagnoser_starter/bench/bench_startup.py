@@ -0,0 +1,119 @@
+"""起動時間のベンチマーク（コールドスタートの回帰チェック用）。
+
+新しい Python プロセスを毎回起動し、次の3つを測ります。
+
+  import   : `import app`（create_app() を含む）にかかった時間
+  first    : 最初のリクエスト（GET /）の時間（遅延した DB 準備・テンプレートのコンパイルを含む）
+  second   : 2回目のリクエストの時間（ウォーム状態の参考値）
+
+使い方（diagnoser_starter/ で実行）:
+
+  python bench/bench_startup.py                 # 一時 DB にデモデータを入れて 5 回計測
+  python bench/bench_startup.py --runs 10 --json
+  python bench/bench_startup.py --budget-ms 800 # import + first の中央値が超えたら終了コード 1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+# 子プロセスで実行するコード（結果は JSON 1行で標準出力へ）
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+client = app_module.app.test_client()
+r1 = client.get("/")
+t2 = time.perf_counter()
+r2 = client.get("/")
+t3 = time.perf_counter()
+assert r1.status_code == 200 and r2.status_code == 200, (r1.status_code, r2.status_code)
+print(json.dumps({"import": t1 - t0, "first": t2 - t1, "second": t3 - t2}))
+"""
+
+SETUP = """
+import app as app_module
+from seed import seed
+app_module.prepare_database(app_module.app)
+with app_module.app.app_context():
+    seed()
+"""
+
+
+def _run(code: str, env: dict) -> str:
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=APP_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-url", help="既存の DB を使う（省略時は一時 DB を作る）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    parser.add_argument("--budget-ms", type=float, help="import + first の中央値の上限（ミリ秒）")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("ADMIN_PASSWORD", None)
+    tmpdir = None
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tmpdir.name, "bench.db")
+        _run(SETUP, env)
+
+    samples = [json.loads(_run(PROBE, env)) for _ in range(args.runs)]
+    summary = {
+        key: {
+            "median_ms": round(statistics.median(s[key] for s in samples) * 1000, 1),
+            "min_ms": round(min(s[key] for s in samples) * 1000, 1),
+            "max_ms": round(max(s[key] for s in samples) * 1000, 1),
+        }
+        for key in ("import", "first", "second")
+    }
+    cold_ms = round(
+        statistics.median((s["import"] + s["first"]) for s in samples) * 1000, 1
+    )
+    summary["cold_start_median_ms"] = cold_ms
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, **summary}, indent=2))
+    else:
+        for key in ("import", "first", "second"):
+            row = summary[key]
+            print(
+                f"{key:<7} median {row['median_ms']:>7.1f} ms"
+                f"  (min {row['min_ms']:.1f} / max {row['max_ms']:.1f})"
+            )
+        print(f"cold start (import + first) median: {cold_ms:.1f} ms")
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    if args.budget_ms is not None and cold_ms > args.budget_ms:
+        print(
+            f"cold start {cold_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
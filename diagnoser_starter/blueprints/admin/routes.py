@@ -1,25 +1,40 @@
 from __future__ import annotations
 
-import os
-import time
-import uuid
+import csv
+import io
+import json
 from functools import wraps
 from typing import Callable
 
 from flask import (
     Blueprint,
+    Response,
+    abort,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
-from werkzeug.utils import secure_filename
-
+from sqlalchemy import select
+
+import queries
+import question_order
+import quiz_changeset
+import quiz_io
+import score_distribution
+import submission_log
+import uploads
 from extensions import db
-from models import Choice, Question, Quiz, Result, Trait, User
+from models import Choice, ChoiceScore, Question, Quiz, Result, Trait, User
+from query_budget import check_stream, query_budget
+from quiz_cache import get_plan, get_plan_or_404
+from quiz_steps import MAX_PAGE_SIZE
+from sqlite_profile import serialized_write
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -52,29 +67,19 @@ def _allowed_file(filename: str) -> bool:
 
 
 def _save_upload(file_storage) -> str | None:
-    """ファイルを保存して /static/uploads/ 相対のURLを返す。失敗時 None。"""
+    """ファイルを内容ハッシュの名前で保存して /media/ の URL を返す。失敗時 None。"""
     if not file_storage or not file_storage.filename:
         return None
     if not _allowed_file(file_storage.filename):
         return None
-
-    upload_dir = current_app.config["UPLOAD_FOLDER"]
-    os.makedirs(upload_dir, exist_ok=True)
-
-    # 衝突回避のために uuid + 時刻 を付与
-    base = secure_filename(file_storage.filename)
-    name, ext = os.path.splitext(base)
-    unique = f"{name}_{int(time.time())}_{uuid.uuid4().hex[:8]}{ext}"
-    abs_path = os.path.join(upload_dir, unique)
-    file_storage.save(abs_path)
-
-    # URL は /static/... で参照できるようにスラッシュで統一
-    return f"/{abs_path.replace(os.sep, '/')}"
+    ext = file_storage.filename.rsplit(".", 1)[1]
+    return uploads.save_upload(file_storage, ext)
 
 
 # ------------ 認証 ------------
 
 @bp.route("/login", methods=["GET", "POST"])
+@query_budget(1)
 def login():
     if request.method == "POST":
         username = request.form.get("username", "")
@@ -88,6 +93,7 @@ def login():
 
 
 @bp.get("/logout")
+@query_budget(0)
 def logout():
     session.clear()
     return redirect(url_for("admin.login"))
@@ -96,23 +102,27 @@ def logout():
 # ------------ ダッシュボード ------------
 
 @bp.get("/")
+@query_budget(2)
 @login_required
 def dashboard():
-    quizzes = Quiz.query.all()
-    return render_template("admin/dashboard.html", quizzes=quizzes)
+    quizzes = queries.admin_quiz_list()
+    return render_template("admin/dashboard.html", quizzes=quizzes, stats=queries.quiz_stats())
 
 
 @bp.get("/", endpoint="index")
+@query_budget(2)
 @login_required
 def admin_index():
-    quizzes = Quiz.query.order_by(Quiz.id.asc()).all()
-    return render_template("admin/dashboard.html", quizzes=quizzes)
+    quizzes = queries.admin_quiz_list()
+    return render_template("admin/dashboard.html", quizzes=quizzes, stats=queries.quiz_stats())
 
 
 # ------------ 診断 CRUD ------------
 
 @bp.route("/quiz/new", methods=["GET", "POST"])
+@query_budget(3)
 @login_required
+@serialized_write
 def quiz_new():
     if request.method == "POST":
         title = request.form.get("title", "").strip()
@@ -128,21 +138,26 @@ def quiz_new():
 
 
 @bp.post("/quiz/<int:quiz_id>/delete")
+@query_budget(17)
 @login_required
+@serialized_write
 def quiz_delete(quiz_id: int):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = queries.quiz_tree_or_404(quiz_id)
     title = quiz.title
     db.session.delete(quiz)  # 子は cascade で削除
+    submission_log.forget_quiz(db.session, quiz_id)
     db.session.commit()
     flash(f"『{title}』を削除しました。", "success")
     return redirect(url_for("admin.index"))
 
 
 @bp.route("/quiz/<int:quiz_id>/edit", methods=["GET", "POST"])
+@query_budget(4)
 @login_required
+@serialized_write
 def quiz_edit(quiz_id: int):
     """※ この関数は1つだけにする（重複定義禁止）"""
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = queries.quiz_or_404(quiz_id)
 
     if request.method == "POST":
         # 基本情報
@@ -161,6 +176,14 @@ def quiz_edit(quiz_id: int):
             choice_mode if choice_mode in ("ordered", "random") else "ordered"
         )
 
+        # 採点方式（合計点 / Trait）
+        scoring_mode = request.form.get("scoring_mode", "sum")
+        quiz.scoring_mode = scoring_mode if scoring_mode in ("sum", "trait") else "sum"
+
+        # 1ページの質問数（0 = 全問を1ページ）
+        page_size = request.form.get("page_size", quiz.page_size or 0, type=int)
+        quiz.page_size = min(max(page_size, 0), MAX_PAGE_SIZE)
+
         # ラジオボタンのデザイン
         choice_style = request.form.get("choice_style", "normal")
         quiz.choice_style = (
@@ -186,45 +209,115 @@ def quiz_edit(quiz_id: int):
         flash("保存しました。", "success")
         return redirect(url_for("admin.quiz_edit", quiz_id=quiz.id))
 
-    return render_template("admin/quiz_edit.html", quiz=quiz)
+    return render_template("admin/quiz_edit.html", quiz=quiz, max_page_size=MAX_PAGE_SIZE)
+
+
+# ------------ Trait（性格軸） ------------
+
+@bp.route("/quiz/<int:quiz_id>/traits", methods=["GET", "POST"])
+@query_budget(6)
+@login_required
+@serialized_write
+def traits(quiz_id: int):
+    quiz = queries.quiz_traits_or_404(quiz_id)
+    if request.method == "POST":
+        key = request.form.get("key", "").strip()
+        name = request.form.get("name", "").strip()
+        if not key or not name:
+            flash("key と表示名は必須です。", "warning")
+        elif any(t.key == key for t in quiz.traits):
+            flash(f"key『{key}』は既に使われています。", "warning")
+        else:
+            db.session.add(Trait(quiz=quiz, key=key, name=name))
+            db.session.commit()
+            flash("Trait を追加しました。", "success")
+            quiz = queries.quiz_traits_or_404(quiz_id)
+    return render_template("admin/traits.html", quiz=quiz)
+
+
+@bp.post("/trait/<int:trait_id>/delete")
+@query_budget(6)
+@login_required
+@serialized_write
+def trait_delete(trait_id: int):
+    tr = queries.trait_or_404(trait_id)
+    quiz_id = tr.quiz_id
+    # この Trait への配点と、結果の紐づけを外してから削除
+    ChoiceScore.query.filter_by(trait_id=tr.id).delete(synchronize_session=False)
+    Result.query.filter_by(winning_trait_id=tr.id).update(
+        {Result.winning_trait_id: None}, synchronize_session=False
+    )
+    db.session.delete(tr)
+    db.session.commit()
+    flash("削除しました。", "success")
+    return redirect(url_for("admin.traits", quiz_id=quiz_id))
+
+
+def _apply_trait_scores(ch: Choice) -> None:
+    """フォームの trait-<id> 欄から、選択肢の Trait 配点を更新する（0 は削除）。"""
+    quiz_traits = {t.id for t in ch.question.quiz.traits}
+    current = {sc.trait_id: sc for sc in ch.scores}
+    for trait_id in quiz_traits:
+        raw = request.form.get(f"trait-{trait_id}")
+        if raw is None:
+            continue
+        try:
+            points = int(raw or 0)
+        except ValueError:
+            points = 0
+        sc = current.get(trait_id)
+        if points == 0:
+            if sc is not None:
+                ch.scores.remove(sc)
+        elif sc is None:
+            ch.scores.append(ChoiceScore(trait_id=trait_id, points=points))
+        else:
+            sc.points = points
 
 
 # ------------ 質問・選択肢 ------------
 
 @bp.route("/quiz/<int:quiz_id>/questions", methods=["GET", "POST"])
+@query_budget(6)
 @login_required
+@serialized_write
 def questions(quiz_id: int):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = queries.quiz_or_404(quiz_id)
     if request.method == "POST":
         text = request.form.get("text", "").strip()
         if text:
-            current = sorted(quiz.questions, key=lambda x: (x.order or 0, x.id))
-            max_order = current[-1].order if current else -1
-            q = Question(quiz=quiz, text=text, order=(max_order or 0) + 1)
+            q = Question(quiz_id=quiz.id, text=text, order=question_order.append_key(quiz.id))
             db.session.add(q)
             db.session.commit()
             flash("質問を追加しました（末尾）。", "success")
         else:
             flash("質問文は必須です。", "warning")
-    return render_template("admin/questions.html", quiz=quiz)
+    return render_template(
+        "admin/questions.html", quiz=quiz, questions=queries.ordered_questions(quiz.id)
+    )
 
 
 @bp.route("/question/<int:question_id>/edit", methods=["GET", "POST"])
+@query_budget(10)
 @login_required
+@serialized_write
 def question_edit(question_id: int):
-    q = Question.query.get_or_404(question_id)
+    q = queries.question_form_or_404(question_id)
     if request.method == "POST":
         q.text = request.form.get("text", q.text).strip()
         q.multiple = request.form.get("multiple") == "1"
         db.session.commit()
         flash("保存しました。", "success")
+        q = queries.question_form_or_404(question_id)
     return render_template("admin/question_form.html", q=q)
 
 
 @bp.post("/question/<int:question_id>/delete")
+@query_budget(8)
 @login_required
+@serialized_write
 def question_delete(question_id: int):
-    q = Question.query.get_or_404(question_id)
+    q = queries.question_tree_or_404(question_id)
     quiz_id = q.quiz_id
     db.session.delete(q)
     db.session.commit()
@@ -233,33 +326,57 @@ def question_delete(question_id: int):
 
 
 @bp.post("/question/<int:question_id>/move/<string:direction>")
+@query_budget(10)  # 通常は 4。隙間が尽きて振り直す回だけ +4
 @login_required
+@serialized_write
 def question_move(question_id: int, direction: str):
-    q = Question.query.get_or_404(question_id)
-    quiz = q.quiz
-    qs = sorted(quiz.questions, key=lambda x: (x.order or 0, x.id))
-    for idx, item in enumerate(qs):
-        item.order = idx
-    db.session.flush()
-
-    qs = sorted(quiz.questions, key=lambda x: x.order or 0)
-    idx = next((i for i, iq in enumerate(qs) if iq.id == q.id), None)
-    if idx is None:
-        flash("順番の取得に失敗しました。", "warning")
-        return redirect(url_for("admin.questions", quiz_id=quiz.id))
-    if direction == "up" and idx > 0:
-        qs[idx].order, qs[idx - 1].order = qs[idx - 1].order, qs[idx].order
-    elif direction == "down" and idx < len(qs) - 1:
-        qs[idx].order, qs[idx + 1].order = qs[idx + 1].order, qs[idx].order
+    q = queries.question_or_404(question_id)
+    # 隣との中間のキーを振るだけ（書き換えるのは q の1行。question_order）
+    if question_order.move(q, direction):
+        db.session.commit()
+    return redirect(url_for("admin.questions", quiz_id=q.quiz_id))
 
-    db.session.commit()
-    return redirect(url_for("admin.questions", quiz_id=quiz.id))
+
+@bp.post("/quiz/<int:quiz_id>/questions/order")
+@query_budget(7)
+@login_required
+@serialized_write
+def questions_reorder(quiz_id: int):
+    """質問の並びを一括で保存する（JSON {"order": [id, ...]} かフォームの order=id,id,...）。"""
+    queries.quiz_or_404(quiz_id)
+    data = request.get_json(silent=True)
+    if data is not None:
+        raw = data.get("order") if isinstance(data, dict) else None
+        # "12" のような文字列を1文字ずつ読まないよう、JSON は id の配列に限る
+        if not isinstance(raw, list) or not all(
+            isinstance(v, (int, str)) and not isinstance(v, bool) for v in raw
+        ):
+            return jsonify(ok=False, error="並びの形式が不正です。"), 400
+    else:
+        raw = request.form.get("order", "").split(",")
+    try:
+        ids = [int(v) for v in raw or () if str(v).strip()]
+        question_order.reorder(quiz_id, ids)
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        message = str(e) if isinstance(e, question_order.OrderError) else "並びの形式が不正です。"
+        if data is not None:
+            return jsonify(ok=False, error=message), 400
+        flash(message, "warning")
+    else:
+        db.session.commit()
+        if data is not None:
+            return jsonify(ok=True, count=len(ids))
+        flash("並び順を保存しました。", "success")
+    return redirect(url_for("admin.questions", quiz_id=quiz_id))
 
 
 @bp.post("/question/<int:question_id>/choice/new")
+@query_budget(8)
 @login_required
+@serialized_write
 def choice_new(question_id: int):
-    q = Question.query.get_or_404(question_id)
+    q = queries.question_form_or_404(question_id)
     text = request.form.get("text", "").strip()
     if text:
         ch = Choice(question=q, text=text)
@@ -268,6 +385,7 @@ def choice_new(question_id: int):
         except ValueError:
             ch.sum_points = 0
         db.session.add(ch)
+        _apply_trait_scores(ch)
         db.session.commit()
         flash("選択肢を追加しました。", "success")
     else:
@@ -276,9 +394,11 @@ def choice_new(question_id: int):
 
 
 @bp.post("/choice/<int:choice_id>/delete")
+@query_budget(5)
 @login_required
+@serialized_write
 def choice_delete(choice_id: int):
-    ch = Choice.query.get_or_404(choice_id)
+    ch = queries.choice_or_404(choice_id)
     qid = ch.question_id
     db.session.delete(ch)
     db.session.commit()
@@ -287,9 +407,11 @@ def choice_delete(choice_id: int):
 
 
 @bp.post("/choice/<int:choice_id>/score")
+@query_budget(10)
 @login_required
+@serialized_write
 def choice_score_update(choice_id: int):
-    ch = Choice.query.get_or_404(choice_id)
+    ch = queries.choice_or_404(choice_id)
     new_text = request.form.get("text")
     if new_text is not None and new_text.strip():
         ch.text = new_text.strip()
@@ -297,17 +419,71 @@ def choice_score_update(choice_id: int):
         ch.sum_points = int(request.form.get("sum_points") or 0)
     except ValueError:
         ch.sum_points = 0
+    _apply_trait_scores(ch)
     db.session.commit()
     flash("選択肢を保存しました。", "success")
     return redirect(url_for("admin.question_edit", question_id=ch.question_id))
 
 
+# ------------ まとめて編集（changeset） ------------
+
+@bp.route("/quiz/<int:quiz_id>/changeset", methods=["PATCH"])
+@query_budget(40)  # 通常は 15〜20。更新する列の組み合わせごとに +1
+@login_required
+@serialized_write
+def quiz_changeset_apply(quiz_id: int):
+    """質問・選択肢・結果の追加・更新・削除を JSON でまとめて適用する（quiz_changeset）。
+
+    成功すれば新しい revision、追加した行の id、更新・削除した id と判定設定の注意点を返す。
+    """
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify(ok=False, errors=["JSON の changeset を送ってください。"]), 400
+    limit = current_app.config.get("CHANGESET_MAX_ITEMS", 2000)
+    try:
+        outcome = quiz_changeset.apply_changeset(quiz_id, payload, max_items=limit)
+    except quiz_changeset.ChangesetConflict as e:
+        db.session.rollback()
+        return jsonify(ok=False, errors=[str(e)], revision=e.revision), 409
+    if outcome is None:
+        db.session.rollback()
+        abort(404)
+    if outcome.errors:
+        db.session.rollback()
+        return jsonify(ok=False, errors=outcome.errors), 400
+    plan = get_plan(quiz_id)
+    issues = [issue.message for issue in plan.band_issues()] if plan else []
+    return jsonify(ok=True, **outcome.diff, band_issues=issues)
+
+
 # ------------ 結果 ------------
 
+def _winning_trait_id(quiz: Quiz) -> int | None:
+    """フォームの winning_trait_id を、この診断の Trait に限って受け付ける。"""
+    try:
+        trait_id = int(request.form.get("winning_trait_id") or 0)
+    except ValueError:
+        return None
+    return trait_id if any(t.id == trait_id for t in quiz.traits) else None
+
+
+def _flash_band_issues(quiz_id: int) -> None:
+    """保存後の判定設定（レンジの重なり・すき間、結果の無い Trait）を警告する。"""
+    plan = get_plan(quiz_id)
+    issues = plan.band_issues() if plan else []
+    if issues:
+        flash(
+            f"結果の判定設定に {len(issues)} 件の注意点があります（一覧の上に表示しています）。",
+            "warning",
+        )
+
+
 @bp.route("/quiz/<int:quiz_id>/results", methods=["GET", "POST"])
+@query_budget(15)
 @login_required
+@serialized_write
 def results(quiz_id: int):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = queries.quiz_results_or_404(quiz_id)
     if request.method == "POST":
         title = request.form.get("title", "").strip()
         description = request.form.get("description", "").strip()
@@ -337,27 +513,204 @@ def results(quiz_id: int):
                 description=description,
                 min_total=min_total,
                 max_total=max_total,
+                winning_trait_id=_winning_trait_id(quiz),
             )
             db.session.add(r)
             db.session.commit()
             flash("結果を追加しました。", "success")
-    return render_template("admin/results.html", quiz=quiz)
+            _flash_band_issues(quiz_id)
+            quiz = queries.quiz_results_or_404(quiz_id)
+    plan = get_plan(quiz.id)
+    counts = queries.result_counts(quiz.id)
+    weights = request.args.get("weights", "uniform")
+    if weights not in score_distribution.WEIGHTS:
+        weights = "uniform"
+    # 大きい診断・observed はバックグラウンドで計算（できるまでは None）
+    distribution = (
+        score_distribution.distribution(plan, weights, samples=sum(counts.values()))
+        if plan
+        else None
+    )
+    return render_template(
+        "admin/results.html",
+        quiz=quiz,
+        band_issues=plan.band_issues() if plan else [],
+        total_range=plan.total_range if plan else None,
+        counts=counts,
+        weights=weights,
+        distribution=distribution,
+    )
+
+
+@bp.get("/quiz/<int:quiz_id>/distribution.json")
+@query_budget(7)  # プラン未キャッシュ時のコンパイル分 + 回答数
+@login_required
+def distribution_status(quiz_id: int):
+    """合計点の分布が計算済みか（結果編集画面が計算の完了を待つのに使う）。"""
+    plan = get_plan_or_404(quiz_id)
+    weights = request.args.get("weights", "uniform")
+    if weights not in score_distribution.WEIGHTS:
+        abort(404)
+    samples = sum(queries.result_counts(quiz_id).values())
+    return jsonify(ready=score_distribution.distribution(plan, weights, samples) is not None)
+
+
+@bp.get("/quiz/<int:quiz_id>/submissions.csv")
+@query_budget(2)
+@login_required
+def submissions_csv(quiz_id: int):
+    """回答ログの CSV（全件を溜めずに、読みながら流す）。"""
+    quiz = queries.quiz_or_404(quiz_id)
+    titles = dict(
+        db.session.execute(select(Result.id, Result.title).where(Result.quiz_id == quiz.id)).all()
+    )
+
+    def generate():
+        buf = io.StringIO()
+        out = csv.writer(buf)
+        # Excel で文字化けしないよう BOM 付き
+        buf.write("\ufeff")
+        out.writerow(["id", "created_at", "result_id", "result_title", "total", "choice_ids"])
+        for n, row in enumerate(queries.submission_rows(quiz.id), 1):
+            out.writerow([
+                row.id,
+                row.created_at.isoformat(sep=" ", timespec="seconds"),
+                row.result_id if row.result_id is not None else "",
+                titles.get(row.result_id, ""),
+                row.total,
+                row.choice_ids.replace(",", " "),
+            ])
+            if n % 500 == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    return Response(
+        stream_with_context(check_stream(generate(), 1)),  # 本文は回答ログの SELECT 1回
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f'attachment; filename="quiz-{quiz.id}-submissions.csv"'
+        },
+    )
+
+
+@bp.get("/export.<fmt>")
+@query_budget(0)  # ビュー本体は SQL を発行しない。本文の分は check_stream で数える
+@login_required
+def quiz_export(fmt: str):
+    """診断を JSON / NDJSON で書き出す（?quiz_id= を繰り返して指定。無ければ全件）。"""
+    if fmt not in ("json", "ndjson"):
+        abort(404)
+    quiz_ids = request.args.getlist("quiz_id", type=int) or None
+    body = quiz_io.export_json(quiz_ids) if fmt == "json" else quiz_io.export_ndjson(quiz_ids)
+    requested = len(set(quiz_ids or ()))
+    body = check_stream(body, lambda sent: quiz_io.export_query_budget(max(sent, requested)))
+    name = f"quiz-{quiz_ids[0]}" if quiz_ids and len(quiz_ids) == 1 else "quizzes"
+    return Response(
+        stream_with_context(body),
+        mimetype="application/json" if fmt == "json" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@bp.post("/import")
+@query_budget(40)  # 2MB までのファイルで数バッチ分（1バッチ = INSERT 数回）
+@login_required
+@serialized_write
+def quiz_import():
+    """JSON / NDJSON の診断を取り込む（dry_run=1 なら検査のみ）。"""
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("ファイルを選んでください。", "warning")
+        return redirect(url_for("admin.index"))
+    dry_run = request.form.get("dry_run") == "1"
+    fmt = "ndjson" if upload.filename.endswith(".ndjson") else None
+
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig")
+    try:
+        report = quiz_io.import_specs(quiz_io.read_specs(stream, fmt), dry_run=dry_run)
+    finally:
+        stream.detach()  # アップロードのストリームは閉じない（やり直しで読み直す）
+
+    if report.errors:
+        for message in report.errors[:10]:
+            flash(message, "danger")
+        if len(report.errors) > 10:
+            flash(f"ほか {len(report.errors) - 10} 件のエラーがあります。", "danger")
+        flash("取り込みを中止しました（何も書き込んでいません）。", "warning")
+    elif dry_run:
+        flash(f"{report.count} 件の診断を検査しました。問題はありません。", "success")
+    else:
+        flash(f"{len(report.quiz_ids)} 件の診断を取り込みました。", "success")
+    return redirect(url_for("admin.index"))
+
+
+@bp.post("/quiz/<int:quiz_id>/score-batch")
+@query_budget(6)  # プラン未キャッシュ時のコンパイル分
+@login_required
+def score_batch(quiz_id: int):
+    """オフラインで集めた回答をまとめて採点し、NDJSON で1件1行ずつ返す。
+
+    本文は {"answers": [回答, ...]}（または回答の配列そのもの）。回答は
+    {"q-<question id>": choice id（複数選択はリスト）} か choice id のリスト。
+    """
+    quiz = get_plan_or_404(quiz_id)
+    payload = request.get_json(silent=True)
+    answers = payload.get("answers") if isinstance(payload, dict) else payload
+    if not isinstance(answers, list):
+        return jsonify(error='JSON の "answers" に回答の配列を指定してください。'), 400
+    limit = current_app.config.get("SCORE_BATCH_MAX", 10000)
+    if len(answers) > limit:
+        return jsonify(error=f"1回に採点できるのは {limit} 件までです。"), 413
+
+    chunk = 1000
+
+    def generate():
+        for start in range(0, len(answers), chunk):
+            decoded = [quiz.decode_answer_set(a) for a in answers[start : start + chunk]]
+            scored = iter(quiz.evaluate_many([p for p in decoded if p is not None]))
+            lines = []
+            for n, picked in enumerate(decoded, start):
+                if picked is None:
+                    row = {"index": n, "error": "invalid answer"}
+                else:
+                    total, result, trait_scores = next(scored)
+                    row = {
+                        "index": n,
+                        "total": total,
+                        "result_id": result.id if result else None,
+                        "title": result.title if result else None,
+                    }
+                    if trait_scores is not None:
+                        row["trait_scores"] = dict(
+                            zip((t.key for t in quiz.traits), trait_scores)
+                        )
+                lines.append(json.dumps(row, ensure_ascii=False))
+            yield "\n".join(lines) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 
 @bp.post("/result/<int:result_id>/delete")
+@query_budget(5)
 @login_required
+@serialized_write
 def result_delete(result_id: int):
-    r = Result.query.get_or_404(result_id)
+    r = queries.result_row_or_404(result_id)
     qid = r.quiz_id
     db.session.delete(r)
+    submission_log.forget_results(db.session, qid, [result_id])
     db.session.commit()
     flash("削除しました。", "success")
     return redirect(url_for("admin.results", quiz_id=qid))
 
 @bp.post("/result/<int:result_id>/update")
+@query_budget(12)
 @login_required
+@serialized_write
 def result_update(result_id: int):
-    r = Result.query.get_or_404(result_id)
+    r = queries.result_or_404(result_id)
 
     title = (request.form.get("title") or "").strip()
     description = (request.form.get("description") or "").strip()
@@ -382,8 +735,10 @@ def result_update(result_id: int):
     r.description = description
     r.min_total = min_total
     r.max_total = max_total
+    r.winning_trait_id = _winning_trait_id(r.quiz)
 
     db.session.commit()
     flash("結果を更新しました。", "success")
+    _flash_band_issues(r.quiz_id)
     return redirect(url_for("admin.results", quiz_id=r.quiz_id))
 
@@ -1,66 +1,164 @@
 from __future__ import annotations
 import random
-from flask import Blueprint, render_template, redirect, url_for, request, flash
-from models import Quiz, sum_total, pick_result_by_total
+from flask import (
+    Blueprint,
+    Response,
+    flash,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_template,
+    url_for,
+)
+import catalog
+import quiz_steps
+import ratelimit
+import submission_log
+from form_fragments import render_questions
+from http_cache import conditional_page
+from query_budget import query_budget
+from quiz_cache import get_plan_or_404
 
 bp = Blueprint("public", __name__)
 
 @bp.get("/")
+@query_budget(1)
 def index():
-    quizzes = Quiz.query.all()
-    return render_template("public/index.html", quizzes=quizzes)
+    # ?after=<quiz id> のキーセットページング（描画済みページはキャッシュ）
+    after = max(request.args.get("after", 0, type=int), 0)
+    page = catalog.rendered_page(after)
+    return conditional_page(
+        ("public.index", after),
+        page.version,
+        page.last_modified,
+        lambda: render_template("public/index.html", catalog_html=page.html),
+    )
 
 @bp.get("/quiz/<int:quiz_id>")
+@query_budget(6)  # プラン未キャッシュ時のコンパイル分。ウォーム時は 0
 def quiz_start(quiz_id: int):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    # キャッシュ済みのプランを使う（ウォーム時は DB に触れない）
+    quiz = get_plan_or_404(quiz_id)
 
+    # ランダム表示はアクセス毎に並びが変わるので、条件付き GET・本文キャッシュの対象外。
+    # 見出しと進捗バーを先に送り、質問は1問ずつ流す（flash を出す回は消費を保存するため一括）
+    if quiz.shuffles:
+        if session.get("_flashes"):
+            return render_template("public/quiz_form.html", **_form_context(quiz))
+        return Response(stream_template("public/quiz_form.html", **_form_context(quiz)))
+    return conditional_page(
+        ("public.quiz_start", quiz.id),
+        str(quiz.revision),
+        quiz.updated_at,
+        lambda: render_template("public/quiz_form.html", **_form_context(quiz)),
+    )
+
+
+@bp.post("/quiz/<int:quiz_id>/step")
+@query_budget(6)
+def quiz_step(quiz_id: int):
+    """ページ分割した診断の「次へ」「戻る」。回答はトークンに足して次のページを返す。"""
+    quiz = get_plan_or_404(quiz_id)
+    if not quiz_steps.is_paged(quiz):
+        return redirect(url_for("public.quiz_start", quiz_id=quiz.id))
+    try:
+        state, page = _step_answers(quiz)
+    except quiz_steps.StepError:
+        return _restart(quiz)
+    page += -1 if request.form.get("nav") == "back" else 1
+    return render_template(
+        "public/quiz_form.html", **_form_context(quiz, state, quiz_steps.clamp_page(quiz, page))
+    )
+
+
+def _step_answers(quiz) -> tuple[quiz_steps.StepState, int]:
+    """トークンの回答に、いま送られてきたページの回答を反映する。"""
+    state = quiz_steps.loads(quiz, request.form.get("token", ""))
+    page = quiz_steps.clamp_page(quiz, request.form.get("page", 0, type=int))
+    questions = quiz_steps.page_questions(quiz, state, page)
+    return quiz_steps.record(quiz, state, questions, quiz.decode_answers(request.form)), page
+
+
+def _restart(quiz):
+    flash("診断が更新されたため、最初から回答してください。", "warning")
+    return redirect(url_for("public.quiz_start", quiz_id=quiz.id))
+
+
+def _form_context(quiz, state: quiz_steps.StepState | None = None, page: int = 0) -> dict:
+    """quiz_form.html に渡すもの。質問は描画済みの断片（form_fragments）を連結するだけ。"""
+    if not quiz_steps.is_paged(quiz):
+        items = _form_items(quiz)
+        return {"quiz": quiz, "total": len(items), "questions": render_questions(quiz, items)}
+
+    # ページ分割：このページの質問だけを描画し、ほかの回答はトークンで持ち回る
+    state = state or quiz_steps.new_state(quiz)
+    questions = quiz_steps.page_questions(quiz, state, page)
+    checked = set(quiz_steps.picked_ids(quiz, state, questions))
+    on_page = len({quiz.question_of[cid].id for cid in checked})
+    step = {
+        "page": page,
+        "pages": quiz_steps.page_count(quiz),
+        "token": quiz_steps.dumps(quiz, state),
+        # 進捗バーの初期値（このページの分は JS が数える）
+        "answered": quiz_steps.answered_count(state) - on_page,
+    }
+    return {
+        "quiz": quiz,
+        "total": len(quiz.questions),
+        "questions": render_questions(
+            quiz, _form_items(quiz, questions), page * quiz.page_size + 1, checked
+        ),
+        "step": step,
+    }
+
+
+def _form_items(quiz, questions=None) -> list[tuple]:
+    """(質問, 表示順の選択肢リスト) の並びを作る。questions を渡せばその順のまま使う。"""
     # --- 質問の並び ---
-    if getattr(quiz, "display_mode", "ordered") == "random":
-        questions = list(quiz.questions)
-        random.shuffle(questions)
-    else:
-        questions = sorted(quiz.questions, key=lambda q: (q.order or 0, q.id))
+    if questions is None:
+        questions = list(quiz.questions)  # プランは管理順（order, id）で並んでいる
+        if quiz.display_mode == "random":
+            random.shuffle(questions)
 
     # --- 選択肢の並び（★追加） ---
-    choice_mode = getattr(quiz, "choice_mode", "ordered")
+    # プランは不変なので、表示順は (質問, 選択肢リスト) の組で渡す
+    items = []
     for q in questions:
-        if choice_mode == "random":
-            shuffled = list(q.choices)
-            random.shuffle(shuffled)
-            q._shuffled_choices = shuffled        # ← テンプレが使う一時属性
-        else:
-            # “管理順どおり”を安定させたいので id で固定（必要なら別キーに変更）
-            q._shuffled_choices = sorted(q.choices, key=lambda c: c.id)
-
-    return render_template("public/quiz_form.html", quiz=quiz, questions=questions)
+        choices = list(q.choices)  # “管理順どおり”は id 順で固定
+        if quiz.choice_mode == "random":
+            random.shuffle(choices)
+        items.append((q, choices))
+    return items
 
 @bp.post("/quiz/<int:quiz_id>/result")
+@query_budget(6)
+@ratelimit.limited("result")  # 断るときは DB に触れる前に 429 / 503
 def quiz_result(quiz_id: int):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    picked: list[int] = []
-
-    # publicテンプレートでは questions を渡していても、ここでは quiz.questions を基準に集計してOK
-    for q in quiz.questions:
-        field = f"q-{q.id}"
-        if getattr(q, "multiple", False):
-            # 複数選択：同名フィールドをすべて取得
-            for v in request.form.getlist(field):
-                try:
-                    picked.append(int(v))
-                except (TypeError, ValueError):
-                    pass
-        else:
-            # 単一選択：1件だけ
-            v = request.form.get(field)
-            if v:
-                try:
-                    picked.append(int(v))
-                except (TypeError, ValueError):
-                    pass
-
-    total = sum_total(picked)
-    result = pick_result_by_total(quiz, total)
+    quiz = get_plan_or_404(quiz_id)
+
+    # フォームを1回なめるだけで、この診断の選択肢 id だけを拾う
+    # （他の診断の id・重複・単一選択への複数送信は捨てる）
+    if quiz_steps.is_paged(quiz) and "page" in request.form:
+        # ページ分割：前のページまでの回答はトークンから
+        try:
+            state, _page = _step_answers(quiz)
+        except quiz_steps.StepError:
+            return _restart(quiz)
+        picked = quiz_steps.picked_ids(quiz, state)
+    else:
+        picked = quiz.decode_answers(request.form)
+    # 採点方式（sum / trait）はプラン側で切り替える
+    total, result, trait_scores = quiz.evaluate(picked)
     if not result:
         flash("結果を判定できませんでした。レンジ設定を見直してください。", "warning")
         return redirect(url_for("public.quiz_start", quiz_id=quiz.id))
-    return render_template("public/result.html", quiz=quiz, result=result, total=total)
+    # 回答ログはキューに積むだけ（書き込みはバックグラウンドでまとめて）
+    submission_log.record(quiz.id, picked, total, result.id)
+    return render_template(
+        "public/result.html",
+        quiz=quiz,
+        result=result,
+        total=total,
+        trait_scores=trait_scores,
+    )
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import random
+from typing import Any, Iterable, Mapping, Sequence
+
+from sqlalchemy import func, insert, select, text
+
+from extensions import db
+from models import Choice, ChoiceScore, Question, Quiz, Result, Trait, summarize, utcnow
+from question_order import ORDER_GAP
+from quiz_events import mark_catalog_changed, mark_quiz_changed
+from quiz_steps import MAX_PAGE_SIZE
+
+# ============================================================
+# 診断データの一括投入（宣言的な spec -> 集合単位の INSERT）
+#   - 診断・Trait・質問・選択肢・配点・結果を、テーブルごとに1回の
+#     executemany で入れる。全体で1トランザクション
+#   - 親の id は RETURNING でまとめて受け取り（SQLite では書き込みロックを取ってから
+#     MAX(id) の続きを先取りし）、子テーブルの外部キーに使う
+#   - ORM を通らないので、最後に quiz_events へ変更を知らせてキャッシュを破棄する
+#
+# spec の形（dict。JSON でもそのまま書ける）:
+#   {
+#     "title": "...", "description": "...",
+#     "display_mode": "ordered", "choice_mode": "ordered", "choice_style": "normal",
+#     "scoring_mode": "sum", "page_size": 0, "image_url": None,
+#     "traits": [{"key": "e", "name": "外向性"}, ...],
+#     "questions": [
+#       {"text": "...", "multiple": False, "order": 1024,
+#        "choices": [{"text": "...", "points": 1, "scores": {"e": 2}}, ("短縮形", 0), ...]},
+#     ],
+#     "results": [{"title": "...", "description": "...", "min_total": 0, "max_total": 5,
+#                  "winning_trait": "e"}, ...],
+#   }
+# ============================================================
+
+QUIZ_FIELDS = (
+    "display_mode",
+    "choice_mode",
+    "choice_style",
+    "scoring_mode",
+    "page_size",
+    "image_url",
+)
+
+# 管理画面のフォームと同じ選択肢
+FIELD_CHOICES = {
+    "display_mode": ("ordered", "random"),
+    "choice_mode": ("ordered", "random"),
+    "choice_style": ("normal", "heart", "star", "diamond"),
+    "scoring_mode": ("sum", "trait"),
+}
+
+
+# 点数と区間の上限（絶対値）。合計や区間の計算が SQLite の INTEGER と
+# array("q")（scoring.BandIndex・quiz_cache）に収まるように抑える
+MAX_POINTS = 10**6  # 選択肢・Trait の点数
+MAX_TOTAL = 10**12  # 結果の min_total / max_total、質問の order
+
+
+class SpecError(ValueError):
+    pass
+
+
+def _choice(spec) -> dict[str, Any]:
+    """選択肢は dict か (text, points) の組。"""
+    if isinstance(spec, Mapping):
+        return spec
+    if isinstance(spec, (list, tuple)) and len(spec) == 2:
+        return {"text": spec[0], "points": spec[1]}
+    raise SpecError(f"choice must be a dict or (text, points): {spec!r}")
+
+
+def is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def check_text(errors: list[str], where: str, value, limit: int | None) -> None:
+    if not isinstance(value, str) or not value.strip():
+        errors.append(f"{where}: 文字列で指定してください")
+    elif limit is not None and len(value) > limit:
+        errors.append(f"{where}: {limit} 文字以内にしてください")
+
+
+def check_int(errors: list[str], where: str, value, limit: int) -> None:
+    """None 以外は -limit〜limit の整数であること。"""
+    if value is not None and (not is_int(value) or abs(value) > limit):
+        errors.append(f"{where}: -{limit}〜{limit} の整数で指定してください")
+
+
+def _items(errors: list[str], where: str, value) -> Sequence:
+    if value is None:
+        return ()
+    if not isinstance(value, (list, tuple)):
+        errors.append(f"{where}: 配列で指定してください")
+        return ()
+    return value
+
+
+def validate_spec(spec) -> list[str]:
+    """spec を DB に触れずに検査し、問題点のメッセージを返す（空なら投入できる）。"""
+    if not isinstance(spec, Mapping):
+        return ["診断は JSON オブジェクトで指定してください"]
+    errors: list[str] = []
+    check_text(errors, "title", spec.get("title"), 200)
+    if not isinstance(spec.get("description") or "", str):
+        errors.append("description: 文字列で指定してください")
+    for field, allowed in FIELD_CHOICES.items():
+        if spec.get(field) is not None and spec[field] not in allowed:
+            errors.append(f"{field}: {', '.join(allowed)} のいずれかを指定してください")
+    page_size = spec.get("page_size")
+    if page_size is not None and (
+        not is_int(page_size) or not 0 <= page_size <= MAX_PAGE_SIZE
+    ):
+        errors.append(f"page_size: 0〜{MAX_PAGE_SIZE} の整数で指定してください")
+
+    keys: set[str] = set()
+    for n, tr in enumerate(_items(errors, "traits", spec.get("traits")), 1):
+        if not isinstance(tr, Mapping):
+            errors.append(f"traits[{n}]: オブジェクトで指定してください")
+            continue
+        check_text(errors, f"traits[{n}].key", tr.get("key"), 50)
+        if tr.get("name") is not None:
+            check_text(errors, f"traits[{n}].name", tr.get("name"), 100)
+        key = tr.get("key")
+        if isinstance(key, str):
+            if key in keys:
+                errors.append(f"traits[{n}].key: 『{key}』が重複しています")
+            keys.add(key)
+
+    for n, q in enumerate(_items(errors, "questions", spec.get("questions")), 1):
+        if not isinstance(q, Mapping):
+            errors.append(f"questions[{n}]: オブジェクトで指定してください")
+            continue
+        check_text(errors, f"questions[{n}].text", q.get("text"), 300)
+        if q.get("multiple") is not None and not isinstance(q["multiple"], bool):
+            errors.append(f"questions[{n}].multiple: true / false で指定してください")
+        check_int(errors, f"questions[{n}].order", q.get("order"), MAX_TOTAL)
+        choices = _items(errors, f"questions[{n}].choices", q.get("choices"))
+        for m, c in enumerate(choices, 1):
+            where = f"questions[{n}].choices[{m}]"
+            try:
+                c = _choice(c)
+            except SpecError:
+                errors.append(f"{where}: オブジェクトか [text, points] で指定してください")
+                continue
+            check_text(errors, f"{where}.text", c.get("text"), 200)
+            check_int(errors, f"{where}.points", c.get("points"), MAX_POINTS)
+            scores = c.get("scores") or {}
+            if not isinstance(scores, Mapping):
+                errors.append(f"{where}.scores: {{trait key: 点数}} で指定してください")
+                continue
+            for key, points in scores.items():
+                if key not in keys:
+                    errors.append(f"{where}.scores: 未定義の trait key『{key}』")
+                elif points is None:
+                    errors.append(f"{where}.scores.{key}: 整数で指定してください")
+                else:
+                    check_int(errors, f"{where}.scores.{key}", points, MAX_POINTS)
+
+    for n, r in enumerate(_items(errors, "results", spec.get("results")), 1):
+        if not isinstance(r, Mapping):
+            errors.append(f"results[{n}]: オブジェクトで指定してください")
+            continue
+        check_text(errors, f"results[{n}].title", r.get("title"), 200)
+        lo, hi = r.get("min_total"), r.get("max_total")
+        for name, value in (("min_total", lo), ("max_total", hi)):
+            check_int(errors, f"results[{n}].{name}", value, MAX_TOTAL)
+        if is_int(lo) and is_int(hi) and lo > hi:
+            errors.append(f"results[{n}]: min_total が max_total より大きくなっています")
+        winner = r.get("winning_trait")
+        if winner is not None and (not isinstance(winner, str) or winner not in keys):
+            errors.append(f"results[{n}].winning_trait: 未定義の trait key『{winner}』")
+    return errors
+
+
+def lock_for_write(conn) -> None:
+    """SQLite では、id の先取りの前に書き込みロックを取っておく。
+
+    何も変えない UPDATE でもトランザクションは書き込みになり、commit まで
+    他の接続は書き込めない（MAX(id) を読んでから INSERT するまでの競合を防ぐ）。
+    """
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("UPDATE quiz SET id = id WHERE 0"))
+
+
+def insert_returning_ids(conn, table, rows: list[dict]) -> list[int]:
+    """rows をまとめて INSERT し、rows と同じ順に採番 id を返す。
+
+    SQLite は複数行の RETURNING の順序を保証できず、SQLAlchemy が1行ずつの INSERT に
+    落としてしまうので、MAX(id) の続きを先取りして id を明示した executemany にする
+    （lock_for_write の後で呼ぶこと）。
+    """
+    if not rows:
+        return []
+    if conn.dialect.name != "sqlite":
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return list(conn.execute(stmt, rows).scalars())
+
+    start = conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar() + 1
+    ids = list(range(start, start + len(rows)))
+    conn.execute(insert(table), [{**row, "id": id_} for row, id_ in zip(rows, ids)])
+    return ids
+
+
+def load_quizzes(
+    specs: Sequence[Mapping[str, Any]], session=None, commit: bool = True
+) -> list[int]:
+    """spec の並びを一括で投入し、作成した quiz id を spec と同じ順で返す。
+
+    session（既定は db.session）のトランザクションで実行し、最後に commit する。
+    commit=False なら commit は呼び出し側に任せる（複数回に分けて1トランザクションにする場合）。
+    spec は検査済みであること（validate_spec）。
+    """
+    session = session or db.session
+    conn = session.connection()
+    lock_for_write(conn)
+    now = utcnow()
+
+    # --- 1) quiz ---
+    quiz_rows = []
+    for spec in specs:
+        if not spec.get("title"):
+            raise SpecError("quiz title is required")
+        description = spec.get("description") or ""
+        row = {
+            "title": spec["title"],
+            "description": description,
+            "summary": summarize(description),
+            "updated_at": now,
+        }
+        row.update({k: spec[k] for k in QUIZ_FIELDS if spec.get(k) is not None})
+        quiz_rows.append(row)
+    quiz_ids = insert_returning_ids(conn, Quiz.__table__, quiz_rows)
+
+    # --- 2) trait（結果・配点から key で参照する） ---
+    trait_rows, trait_owner = [], []
+    for quiz_id, spec in zip(quiz_ids, specs):
+        for tr in spec.get("traits") or ():
+            name = tr.get("name") or tr["key"]
+            trait_rows.append({"quiz_id": quiz_id, "key": tr["key"], "name": name})
+            trait_owner.append((quiz_id, tr["key"]))
+    trait_id_of = dict(zip(trait_owner, insert_returning_ids(conn, Trait.__table__, trait_rows)))
+
+    def trait_id(quiz_id: int, key: str | None) -> int | None:
+        if key is None:
+            return None
+        try:
+            return trait_id_of[(quiz_id, key)]
+        except KeyError:
+            raise SpecError(f"unknown trait key {key!r}") from None
+
+    # --- 3) question ---
+    question_rows, question_specs = [], []
+    for quiz_id, spec in zip(quiz_ids, specs):
+        for n, q in enumerate(spec.get("questions") or ()):
+            question_rows.append(
+                {
+                    "quiz_id": quiz_id,
+                    "text": q["text"],
+                    "order": q["order"] if q.get("order") is not None else (n + 1) * ORDER_GAP,
+                    "multiple": q.get("multiple") is True,
+                }
+            )
+            question_specs.append((quiz_id, q))
+    question_ids = insert_returning_ids(conn, Question.__table__, question_rows)
+
+    # --- 4) choice ---
+    choice_rows, choice_scores = [], []
+    for question_id, (quiz_id, q) in zip(question_ids, question_specs):
+        for c in q.get("choices") or ():
+            c = _choice(c)
+            choice_rows.append(
+                {
+                    "question_id": question_id,
+                    "text": c["text"],
+                    "sum_points": int(c.get("points", 0) or 0),
+                }
+            )
+            choice_scores.append((quiz_id, c.get("scores") or {}))
+    choice_ids = insert_returning_ids(conn, Choice.__table__, choice_rows)
+
+    # --- 5) choice_score（id は使わないので RETURNING なし） ---
+    score_rows = [
+        {"choice_id": choice_id, "trait_id": trait_id(quiz_id, key), "points": int(points)}
+        for choice_id, (quiz_id, scores) in zip(choice_ids, choice_scores)
+        for key, points in scores.items()
+        if points
+    ]
+    if score_rows:
+        conn.execute(insert(ChoiceScore.__table__), score_rows)
+
+    # --- 6) result ---
+    result_rows = [
+        {
+            "quiz_id": quiz_id,
+            "title": r["title"],
+            "description": r.get("description") or "",
+            "min_total": r.get("min_total"),
+            "max_total": r.get("max_total"),
+            "winning_trait_id": trait_id(quiz_id, r.get("winning_trait")),
+        }
+        for quiz_id, spec in zip(quiz_ids, specs)
+        for r in spec.get("results") or ()
+    ]
+    if result_rows:
+        conn.execute(insert(Result.__table__), result_rows)
+
+    # ORM の flush を通らないので、キャッシュ破棄の通知は明示する
+    mark_quiz_changed(session, quiz_ids)
+    mark_catalog_changed(session)
+    if commit:
+        session.commit()
+    return quiz_ids
+
+
+# ---------- 合成データ（ベンチマーク・動作確認用） ----------
+
+def synthetic_specs(
+    count: int,
+    questions: int = 15,
+    choices: int = 4,
+    results: int = 4,
+    seed: int = 1,
+    start: int = 1,
+) -> Iterable[dict]:
+    """指定した形の合成 spec を count 件作る（結果レンジは到達範囲をすき間なく分割）。"""
+    rnd = random.Random(seed)
+    for n in range(start, start + count):
+        description = f"合成データの診断 {n}。" * 4
+        qs, max_total = [], 0
+        for i in range(questions):
+            points = [rnd.randint(0, 3) for _ in range(choices)]
+            max_total += max(points, default=0)
+            qs.append(
+                {
+                    "text": f"質問 {i + 1}",
+                    "choices": [(f"選択肢 {j + 1}", p) for j, p in enumerate(points)],
+                }
+            )
+        step = max(1, (max_total + 1) // max(results, 1))
+        bands = [
+            {
+                "title": f"結果 {i + 1}",
+                "min_total": i * step,
+                "max_total": max_total if i == results - 1 else (i + 1) * step - 1,
+            }
+            for i in range(results)
+        ]
+        yield {
+            "title": f"合成診断 {n}",
+            "description": description,
+            "questions": qs,
+            "results": bands,
+        }
+
+
+def load_synthetic(count: int, batch: int = 100, **shape) -> list[int]:
+    """合成診断を batch 件ずつ投入する（1バッチ = 1トランザクション）。"""
+    ids: list[int] = []
+    specs = synthetic_specs(count, **shape)
+    while True:
+        chunk = [spec for _, spec in zip(range(batch), specs)]
+        if not chunk:
+            return ids
+        ids.extend(load_quizzes(chunk))
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import NamedTuple
+
+from flask import current_app, g, render_template, url_for
+from markupsafe import Markup
+
+from lru import LRUCache
+from queries import catalog_page
+from quiz_events import on_catalog_change
+
+# ============================================================
+# トップページの診断一覧（カタログ）
+#   - id カーソルによるキーセットページング（?after=<id>）
+#   - 描画済みのページ断片を、版（載っている quiz の id と revision）と
+#     最終更新時刻つきで上限付き LRU に保持（http_cache の ETag に使う）
+#   - Quiz の追加・更新・削除が commit されたら全ページ破棄
+# ============================================================
+
+
+class CatalogPage(NamedTuple):
+    html: Markup
+    version: str
+    last_modified: datetime | None
+    next_after: int | None
+
+
+# after（カーソル）-> 描画済みのカード一覧
+page_cache: LRUCache[int, CatalogPage] = LRUCache(32)
+
+
+@on_catalog_change
+def _drop_catalog_pages() -> None:
+    page_cache.clear()
+
+
+def init_app(app) -> None:
+    page_cache.maxsize = int(app.config.get("CATALOG_CACHE_PAGES", 32))
+    page_cache.clear()
+    app.add_template_global(catalog_url, "catalog_url")
+
+
+def catalog_url(after: int | None = None) -> str:
+    """カタログのページの URL。静的書き出し（static_export）中は /page/<after>/ にする。"""
+    if g.get("static_export"):
+        return f"/page/{after}/" if after else "/"
+    return url_for("public.index", after=after or None)
+
+
+def render_page(after: int) -> CatalogPage:
+    """カタログ1ページ分を描画する（キャッシュしない）。"""
+    quizzes, next_after = catalog_page(after, current_app.config.get("CATALOG_PAGE_SIZE", 24))
+    html = Markup(
+        render_template(
+            "public/_catalog.html", quizzes=quizzes, after=after, next_after=next_after
+        )
+    )
+    version = ",".join(f"{qz.id}:{qz.revision or 0}" for qz in quizzes) + f"|{next_after}"
+    stamps = [qz.updated_at for qz in quizzes if qz.updated_at is not None]
+    return CatalogPage(html, version, max(stamps) if stamps else None, next_after)
+
+
+def rendered_page(after: int) -> CatalogPage:
+    """カタログ1ページ分（キャッシュがあればそれを返す）。"""
+    return page_cache.get_or_load(after, render_page)
@@ -1,7 +1,120 @@
 from __future__ import annotations
 import os
 
+
+def database_url(url: str) -> str:
+    """DATABASE_URL を SQLAlchemy の形式にそろえる。
+
+    Render / Heroku などが渡す postgres:// は SQLAlchemy では使えないので、
+    ドライバ未指定の PostgreSQL は psycopg（v3）を使う URL にする。
+    """
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
-    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///diagnoser.db")
+    SQLALCHEMY_DATABASE_URI = database_url(os.getenv("DATABASE_URL", "sqlite:///diagnoser.db"))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite 以外（PostgreSQL など）のコネクションプール。複数ノードから接続する前提で、
+    # 切れた接続は使う前に検出し（pre_ping）、長く使った接続は作り直す
+    SQLALCHEMY_ENGINE_OPTIONS = (
+        {}
+        if SQLALCHEMY_DATABASE_URI.startswith("sqlite")
+        else {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_POOL_OVERFLOW", "10")),
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+        }
+    )
+
+    # SQLite のエンジン設定: default（既定のまま）/ production（WAL など。sqlite_profile.py）
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+    SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+    SQLITE_POOL_OVERFLOW = int(os.getenv("SQLITE_POOL_OVERFLOW", "10"))
+    # 管理画面の書き込みが SQLITE_BUSY になったときのやり直し回数
+    SQLITE_WRITE_RETRIES = int(os.getenv("SQLITE_WRITE_RETRIES", "3"))
+
+    # 前段の信頼できるリバースプロキシの段数（X-Forwarded-For を何段読むか）。0 なら読まない
+    PROXY_FIX_X_FOR = int(os.getenv("PROXY_FIX_X_FOR", "0"))
+
+    # 起動時に未適用のマイグレーションを自動で適用するか（0 なら flask db-upgrade で手動）
+    AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+    # スキーマ確認・admin パスワード同期を、import 時ではなく最初のリクエストで行う
+    # （0 なら従来どおり create_app() の中で行う）
+    LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") == "1"
+
+    # テンプレートのバイトコードを instance/jinja_cache に保存する
+    JINJA_BYTECODE_CACHE = os.getenv("JINJA_BYTECODE_CACHE", "1") == "1"
+
+    # 公開ページ用の診断プラン（quiz_cache）を何件までメモリに保持するか
+    QUIZ_PLAN_CACHE_SIZE = int(os.getenv("QUIZ_PLAN_CACHE_SIZE", "128"))
+
+    # トップページの診断一覧：1ページの件数と、描画済みページのキャッシュ数
+    CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "24"))
+    CATALOG_CACHE_PAGES = int(os.getenv("CATALOG_CACHE_PAGES", "32"))
+
+    # 公開ページの条件付き GET（ETag / Last-Modified）と圧縮済み本文のキャッシュ件数
+    HTTP_CONDITIONAL = os.getenv("HTTP_CONDITIONAL", "1") == "1"
+    HTTP_BODY_CACHE_SIZE = int(os.getenv("HTTP_BODY_CACHE_SIZE", "256"))
+
+    # 診断フォームの質問ごとの描画済み断片（form_fragments）を何件まで保持するか
+    QUESTION_FRAGMENT_CACHE_SIZE = int(os.getenv("QUESTION_FRAGMENT_CACHE_SIZE", "2048"))
+
+    # リクエストごとの SQL 数チェック（query_budget）: off / warn / raise
+    SQL_QUERY_BUDGET = os.getenv("SQL_QUERY_BUDGET", "off")
+
+    # 回答ログ（submission_log）: 有効/無効、1回に書き込む最大件数、待ち秒数、キュー上限
+    SUBMISSION_LOG_ENABLED = os.getenv("SUBMISSION_LOG_ENABLED", "1") == "1"
+    SUBMISSION_LOG_BATCH = int(os.getenv("SUBMISSION_LOG_BATCH", "500"))
+    SUBMISSION_LOG_FLUSH_INTERVAL = float(os.getenv("SUBMISSION_LOG_FLUSH_INTERVAL", "1.0"))
+    SUBMISSION_LOG_QUEUE_SIZE = int(os.getenv("SUBMISSION_LOG_QUEUE_SIZE", "10000"))
+
+    # アップロード画像の縮小版を作るスレッド数と、/media/ の Cache-Control max-age（秒）
+    UPLOAD_VARIANT_WORKERS = int(os.getenv("UPLOAD_VARIANT_WORKERS", "2"))
+    MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", str(365 * 24 * 3600)))
+
+    # 静的ファイル（assets.py）: ハッシュ付き URL を使うか、起動時に static/dist/ を更新するか
+    # （既定はしない。flask assets-build で作る）、max-age（秒）、
+    # プロキシへの引き渡し（"" / x-accel / x-sendfile）と X-Accel-Redirect の接頭辞
+    ASSET_PIPELINE = os.getenv("ASSET_PIPELINE", "1") == "1"
+    ASSET_BUILD_ON_STARTUP = os.getenv("ASSET_BUILD_ON_STARTUP", "0") == "1"
+    ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(365 * 24 * 3600)))
+    ASSET_OFFLOAD = os.getenv("ASSET_OFFLOAD", "")
+    ASSET_X_ACCEL_PREFIX = os.getenv("ASSET_X_ACCEL_PREFIX", "/_assets/")
+
+    # 一括採点 API（/admin/quiz/<id>/score-batch）で1回に受け付ける回答数
+    SCORE_BATCH_MAX = int(os.getenv("SCORE_BATCH_MAX", "10000"))
+
+    # まとめて編集 API（/admin/quiz/<id>/changeset）で1回に受け付ける追加・更新・削除の件数
+    CHANGESET_MAX_ITEMS = int(os.getenv("CHANGESET_MAX_ITEMS", "2000"))
+
+    # 合計点の分布（score_distribution.py）: 計算する合計点の幅の上限、リクエスト内で計算する
+    # 計算量の上限（合計点の幅 × 選択肢数。超えたらバックグラウンド）、スレッド数、保持する件数
+    SCORE_ANALYSIS_MAX_WIDTH = int(os.getenv("SCORE_ANALYSIS_MAX_WIDTH", "200000"))
+    SCORE_ANALYSIS_INLINE_LIMIT = int(os.getenv("SCORE_ANALYSIS_INLINE_LIMIT", "50000"))
+    SCORE_ANALYSIS_WORKERS = int(os.getenv("SCORE_ANALYSIS_WORKERS", "1"))
+    SCORE_ANALYSIS_CACHE_SIZE = int(os.getenv("SCORE_ANALYSIS_CACHE_SIZE", "64"))
+
+    # 採点（POST /quiz/<id>/result）のレート制限（ratelimit.py）: (アドレス, 診断) ごとに
+    # BURST 回まで続けて送れ、毎秒 RATE 回ずつ回復する。バケットの保持数・shard 数・TTL（秒）
+    # 既定は無効。キーはアドレスなので、プロキシの後ろでは PROXY_FIX_X_FOR を設定してから有効にする
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+    RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "1.0"))
+    RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "30"))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "64"))
+    RATE_LIMIT_TTL = float(os.getenv("RATE_LIMIT_TTL", "600"))
+    # 負荷制御: 有効/無効（レート制限とは別。既定で有効）と、処理中の採点の数・
+    # 回答ログの書き込み待ち・処理時間の移動平均（ms）の上限（0 でそれぞれ無効）
+    LOAD_SHED_ENABLED = os.getenv("LOAD_SHED_ENABLED", "1") == "1"
+    LOAD_SHED_MAX_INFLIGHT = int(os.getenv("LOAD_SHED_MAX_INFLIGHT", "32"))
+    LOAD_SHED_MAX_BACKLOG = int(os.getenv("LOAD_SHED_MAX_BACKLOG", "5000"))
+    LOAD_SHED_LATENCY_MS = float(os.getenv("LOAD_SHED_LATENCY_MS", "2000"))
+    # 処理中の枠を分けて持つ shard 数（スレッドが1本のロックを取り合わないように）
+    LOAD_SHED_SHARDS = int(os.getenv("LOAD_SHED_SHARDS", "8"))
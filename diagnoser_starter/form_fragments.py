@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from typing import Container, Iterable, Iterator, NamedTuple
+
+from flask import get_template_attribute
+from markupsafe import Markup
+
+from lru import LRUCache
+
+# ============================================================
+# 診断フォームの質問ごとの HTML 断片
+#   - 質問1問分の HTML を (question id, quiz revision, choice_style) ごとに
+#     描画して上限付き LRU に保持し、リクエスト間で使い回す
+#   - 断片は「番号の前 / 番号と選択肢の間 / 選択肢の後」の3つの文字列と
+#     選択肢 id -> <label>（checked の前後）の対応で持つ。ランダム表示で番号や
+#     選択肢の順が変わっても、ページ分割で前の回答を復元しても、文字列の連結だけで済む
+#   - revision がキーに入っているので、編集後の古い断片は使われずに LRU から落ちる
+# ============================================================
+
+TEMPLATE = "public/_question.html"
+
+# 番号・選択肢・checked を差し込む位置の印（質問文はエスケープされるので制御文字とは衝突しない）
+_NUMBER = "\x00number\x00"
+_CHOICES = "\x00choices\x00"
+_CHECKED = "\x00checked\x00"
+
+
+class QuestionFragment(NamedTuple):
+    head: str  # <section> 〜 "Q"
+    middle: str  # 番号の後 〜 選択肢の前
+    tail: str  # 選択肢の後 〜 </section>
+    choices: dict[int, tuple[str, str]]  # choice id -> <label> の checked の前と後
+
+
+# (question id, revision, choice_style) -> 描画済みの断片
+fragment_cache: LRUCache[tuple, QuestionFragment] = LRUCache(2048)
+
+
+def init_app(app) -> None:
+    fragment_cache.maxsize = int(app.config.get("QUESTION_FRAGMENT_CACHE_SIZE", 2048))
+    fragment_cache.clear()
+
+
+def input_class(choice_style: str) -> str:
+    """選択肢の input に付ける class（choice_style ごとに1回だけ決める）。"""
+    return "radio-look" if choice_style == "normal" else f"{choice_style}-radio"
+
+
+def _render(quiz, q) -> QuestionFragment:
+    question = get_template_attribute(TEMPLATE, "question")
+    choice = get_template_attribute(TEMPLATE, "choice")
+    cls = input_class(quiz.choice_style)
+    shell = str(question(q, Markup(_NUMBER), Markup(_CHOICES)))
+    head, rest = shell.split(_NUMBER, 1)
+    middle, tail = rest.split(_CHOICES, 1) if q.choices else (rest, "")
+    return QuestionFragment(
+        head=head,
+        middle=middle,
+        tail=tail,
+        choices={
+            ch.id: tuple(str(choice(q, ch, cls, Markup(_CHECKED))).split(_CHECKED, 1))
+            for ch in q.choices
+        },
+    )
+
+
+def fragment(quiz, q) -> QuestionFragment:
+    return fragment_cache.get_or_load(
+        (q.id, quiz.revision, quiz.choice_style), lambda _k: _render(quiz, q)
+    )
+
+
+def render_question(
+    quiz, number: int, q, choices: Iterable, checked: Container[int] = ()
+) -> Markup:
+    """表示順の選択肢で1問分の HTML を組み立てる。checked の選択肢は選択済みにする。"""
+    f = fragment(quiz, q)
+    parts = [f.head, str(number), f.middle]
+    for ch in choices:
+        before, after = f.choices[ch.id]
+        parts += (before, " checked" if ch.id in checked else "", after)
+    parts.append(f.tail)
+    return Markup("".join(parts))
+
+
+def render_questions(
+    quiz, items, start: int = 1, checked: Container[int] = ()
+) -> Iterator[Markup]:
+    """(質問, 表示順の選択肢) の並びを1問ずつ HTML にする（ストリーミング描画用に遅延評価）。"""
+    for number, (q, choices) in enumerate(items, start):
+        yield render_question(quiz, number, q, choices, checked)
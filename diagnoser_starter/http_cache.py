@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from datetime import datetime, timezone
+from typing import Callable, Hashable
+
+from flask import Response, current_app, make_response, request, session
+
+from lru import LRUCache
+
+try:  # brotli は任意（無ければ gzip のみ）
+    import brotli
+except ImportError:  # pragma: no cover - 環境依存
+    brotli = None
+
+# ============================================================
+# 公開ページの条件付き GET と圧縮済みレスポンスのキャッシュ
+#   - ページの「版」（quiz.revision など）から強い ETag を作り、
+#     If-None-Match / If-Modified-Since が一致すれば 304 を返す
+#   - 本文は (ページ, 版, エンコーディング) ごとに一度だけ描画・圧縮して保持
+#   - flash メッセージがあるリクエストは毎回描画（キャッシュしない）
+# ============================================================
+
+# (ページキー, 版ハッシュ, エンコーディング) -> 本文 bytes
+body_cache: LRUCache[tuple, bytes] = LRUCache(256)
+
+
+def init_app(app) -> None:
+    body_cache.maxsize = int(app.config.get("HTTP_BODY_CACHE_SIZE", 256))
+    body_cache.clear()
+
+
+def _choose_encoding() -> str:
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def _encode(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def _as_utc(dt: datetime | None) -> datetime | None:
+    if dt is None:
+        return None
+    dt = dt.replace(microsecond=0)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def _not_modified(etag: str, last_modified: datetime | None) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return bool(since and last_modified and since >= last_modified)
+
+
+def conditional_page(
+    key: Hashable,
+    version: str,
+    last_modified: datetime | None,
+    render: Callable[[], str],
+) -> Response:
+    """版付きの HTML ページを、304 / 圧縮済みキャッシュ付きで返す。
+
+    key はページの識別子（エンドポイントと引数）、version は内容の版。
+    版が変われば ETag も本文キャッシュのキーも変わる。
+    """
+    if not current_app.config.get("HTTP_CONDITIONAL", True) or session.get("_flashes"):
+        return make_response(render())
+
+    # base.html のフッター（年）とアセットの URL（assets）も本文に含まれるので版の一部にする
+    assets_version = current_app.extensions.get("assets_version")
+    digest = hashlib.sha1(
+        repr((key, version, datetime.now().year, assets_version)).encode("utf-8")
+    ).hexdigest()[:20]
+    encoding = _choose_encoding()
+    # 強い ETag は表現ごとに別の値にする（圧縮形式ごとに接尾辞）
+    etag = digest if encoding == "identity" else f"{digest}-{encoding}"
+    last_modified = _as_utc(last_modified)
+
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        identity = body_cache.get_or_load(
+            (key, digest, "identity"), lambda _k: render().encode("utf-8")
+        )
+        body = identity
+        if encoding != "identity":
+            body = body_cache.get_or_load(
+                (key, digest, encoding), lambda _k: _encode(identity, encoding)
+            )
+        response = Response(body, mimetype="text/html")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True  # 毎回再検証（304 で軽く返す）
+    return response
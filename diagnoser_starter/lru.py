@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """上限付き LRU（スレッドセーフ）。プロセス内キャッシュの共通部品。
+
+    get_or_load は、読み込み中に invalidate / clear が走った場合に古い値を
+    保存しないよう、世代番号で検出して捨てる（値自体は呼び出し元へ返す）。
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._put(key, value)
+
+    def _put(self, key: K, value: V) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def get_or_load(self, key: K, loader: Callable[[K], V | None]) -> V | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                return value
+            generation = self._generation
+
+        value = loader(key)
+        if value is None:
+            return None
+
+        with self._lock:
+            if generation == self._generation:
+                self._put(key, value)
+        return value
+
+    def invalidate(self, keys: Iterable[K]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._items.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[K], bool]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._items if predicate(k)]:
+                del self._items[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -1,6 +1,9 @@
 from __future__ import annotations
+from datetime import datetime, timezone
 from typing import List
+from sqlalchemy import event
 from extensions import db
+from scoring import BandIndex
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # ---------- Admin User ----------
@@ -17,10 +20,28 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
 # ---------- Quiz Domain ----------
+
+# 一覧カード用の説明文の長さ（Quiz.summary）
+SUMMARY_LENGTH = 120
+
+
+def summarize(text: str | None, limit: int = SUMMARY_LENGTH) -> str:
+    """説明文を一覧用に切り詰める（改行は空白に、超過分は「…」）。"""
+    flat = " ".join((text or "").split())
+    return flat if len(flat) <= limit else flat[: limit - 1] + "…"
+
+
+def utcnow() -> datetime:
+    """UTC の naive datetime（SQLite の DateTime に合わせる）。"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, default="")
+    # description から保存時に作る一覧用の短い説明（models.summarize）
+    summary = db.Column(db.String(200), nullable=True)
     display_mode = db.Column(db.String(20), nullable=False, default="ordered")
     choice_mode = db.Column(db.String(20), nullable=False, default="ordered")
 
@@ -28,11 +49,27 @@ class Quiz(db.Model):
 
     choice_style = db.Column(db.String(20), nullable=False, default="normal")
 
+    # 採点方式: "sum"（sum_points の合計 × 結果レンジ）/ "trait"（最大スコアの Trait）
+    scoring_mode = db.Column(db.String(20), nullable=False, default="sum")
+
+    # 1ページの質問数（0 は全問を1ページに表示）。quiz_steps で使う
+    page_size = db.Column(db.Integer, nullable=False, default=0)
+
+    # 内容のリビジョン。診断・質問・選択肢・結果などの変更で進む（quiz_events）
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+
     traits = db.relationship("Trait", backref="quiz", cascade="all, delete-orphan")
     questions = db.relationship("Question", backref="quiz", cascade="all, delete-orphan")
     results = db.relationship("Result", backref="quiz", cascade="all, delete-orphan")
 
 
+@event.listens_for(Quiz, "before_insert")
+@event.listens_for(Quiz, "before_update")
+def _fill_quiz_summary(mapper, connection, target: Quiz) -> None:
+    target.summary = summarize(target.description)
+
+
 class Trait(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), nullable=False)
@@ -89,10 +126,44 @@ def sum_total(picked_choice_ids: List[int]) -> int:
     return sum(int(getattr(ch, "sum_points", 0) or 0) for ch in rows)
 
 def pick_result_by_total(quiz: Quiz, total: int) -> Result | None:
-    """Pick first Result whose [min_total, max_total] band contains total."""
-    for r in quiz.results:
-        lo = r.min_total if r.min_total is not None else -10**9
-        hi = r.max_total if r.max_total is not None else  10**9
-        if lo <= total <= hi:
-            return r
-    return None
+    """Pick the Result whose [min_total, max_total] band contains total.
+
+    Overlapping bands resolve to the lowest Result.id (see scoring.BandIndex).
+    """
+    return BandIndex(quiz.results).lookup(total)
+
+
+# ---------- Submission Log ----------
+# 公開ページの回答ログと、その集計カウンタ。書き込みは submission_log の
+# バックグラウンドスレッドがまとめて行う（リクエスト処理は待たない）。
+# quiz / result への外部キーは張らない。id は削除後に再利用されるので、
+# 削除する側が submission_log.forget_quiz / forget_results でログとカウンタも消す。
+
+class Submission(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, nullable=False, index=True)
+    result_id = db.Column(db.Integer, nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    # 選ばれた choice id をカンマ区切りで（例: "12,15,31"）
+    choice_ids = db.Column(db.Text, nullable=False, default="")
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
+class QuizStat(db.Model):
+    """診断ごとの回答数（ダッシュボード用）。フラッシュのたびに加算する。"""
+
+    __tablename__ = "quiz_stat"
+
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_submitted_at = db.Column(db.DateTime, nullable=True)
+
+
+class ResultStat(db.Model):
+    """(quiz_id, result_id) ごとの回答数。フラッシュのたびに加算する。"""
+
+    __tablename__ = "result_stat"
+
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
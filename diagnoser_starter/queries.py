@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from flask import abort
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from extensions import db
+from models import Choice, Question, Quiz, QuizStat, Result, ResultStat, Submission, Trait
+
+# ============================================================
+# ルートから使うクエリの置き場
+#   - テンプレートが触る関連は selectinload / joinedload で先読みし、
+#     N+1（テンプレート内の遅延ロード）を起こさない
+#   - 一覧系は load_only で必要な列だけ読む
+# ============================================================
+
+
+def _get_or_404(model, ident: int, *options):
+    # populate_existing: commit 後（期限切れ）の再取得でも eager load を効かせる
+    obj = db.session.get(model, ident, options=list(options), populate_existing=True)
+    if obj is None:
+        abort(404)
+    return obj
+
+
+# ---------- 公開ページ ----------
+
+def catalog_page(after: int, limit: int) -> tuple[list[Quiz], int | None]:
+    """トップページの1ページ分（id によるキーセット方式）。
+
+    カード表示に必要な列だけを読み、(quizzes, 次ページのカーソル) を返す。
+    次ページが無ければカーソルは None。
+    """
+    rows = (
+        Quiz.query.options(
+            load_only(
+                Quiz.id, Quiz.title, Quiz.summary, Quiz.image_url, Quiz.revision, Quiz.updated_at
+            )
+        )
+        .filter(Quiz.id > after)
+        .order_by(Quiz.id.asc())
+        .limit(limit + 1)
+        .all()
+    )
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+def quiz_for_plan(quiz_id: int) -> Quiz | None:
+    """quiz_cache.compile_plan 用に、公開ページで使う関連をすべて先読みする。"""
+    # 同じセッションで期限切れになった Quiz があっても eager load をやり直す
+    return db.session.get(
+        Quiz,
+        quiz_id,
+        populate_existing=True,
+        options=[
+            selectinload(Quiz.questions)
+            .selectinload(Question.choices)
+            .selectinload(Choice.scores),
+            selectinload(Quiz.results),
+            selectinload(Quiz.traits),
+        ],
+    )
+
+
+# ---------- 管理画面 ----------
+
+def admin_quiz_list() -> list[Quiz]:
+    return Quiz.query.options(load_only(Quiz.id, Quiz.title)).order_by(Quiz.id.asc()).all()
+
+
+def quiz_stats() -> dict[int, QuizStat]:
+    """診断ごとの回答数カウンタ（quiz_id -> QuizStat）。"""
+    return {st.quiz_id: st for st in QuizStat.query.all()}
+
+
+def result_counts(quiz_id: int) -> dict[int, int]:
+    """結果ごとの回答数（result_id -> count）。"""
+    rows = db.session.execute(
+        db.select(ResultStat.result_id, ResultStat.count).where(ResultStat.quiz_id == quiz_id)
+    )
+    return dict(rows.all())
+
+
+def submission_rows(quiz_id: int, batch_size: int = 1000):
+    """回答ログを id 順に少しずつ読む（CSV エクスポート用のストリーム）。"""
+    stmt = (
+        db.select(
+            Submission.id,
+            Submission.created_at,
+            Submission.result_id,
+            Submission.total,
+            Submission.choice_ids,
+        )
+        .where(Submission.quiz_id == quiz_id)
+        .order_by(Submission.id.asc())
+        .execution_options(yield_per=batch_size)
+    )
+    return db.session.execute(stmt)
+
+
+def quiz_or_404(quiz_id: int) -> Quiz:
+    """関連を読まない Quiz 本体だけ。"""
+    return _get_or_404(Quiz, quiz_id)
+
+
+def quiz_tree_or_404(quiz_id: int) -> Quiz:
+    """削除（cascade）用に、子孫をまとめて先読みした Quiz。"""
+    return _get_or_404(
+        Quiz,
+        quiz_id,
+        selectinload(Quiz.questions).selectinload(Question.choices).selectinload(Choice.scores),
+        selectinload(Quiz.results),
+        selectinload(Quiz.traits),
+    )
+
+
+def trait_or_404(trait_id: int) -> Trait:
+    return _get_or_404(Trait, trait_id)
+
+
+def quiz_traits_or_404(quiz_id: int) -> Quiz:
+    return _get_or_404(Quiz, quiz_id, selectinload(Quiz.traits))
+
+
+def quiz_results_or_404(quiz_id: int) -> Quiz:
+    return _get_or_404(
+        Quiz,
+        quiz_id,
+        selectinload(Quiz.results).joinedload(Result.winning_trait),
+        selectinload(Quiz.traits),
+    )
+
+
+def ordered_questions(quiz_id: int) -> list[Question]:
+    """管理順（order, id）に並べた質問一覧（一覧表示に必要な列だけ）。"""
+    return (
+        Question.query.options(
+            load_only(Question.id, Question.quiz_id, Question.text, Question.order)
+        )
+        .filter_by(quiz_id=quiz_id)
+        .order_by(Question.order.asc(), Question.id.asc())
+        .all()
+    )
+
+
+def question_or_404(question_id: int) -> Question:
+    return _get_or_404(Question, question_id)
+
+
+def question_tree_or_404(question_id: int) -> Question:
+    """削除（cascade）用に、選択肢と Trait 配点を先読みした Question。"""
+    return _get_or_404(
+        Question, question_id, selectinload(Question.choices).selectinload(Choice.scores)
+    )
+
+
+def question_form_or_404(question_id: int) -> Question:
+    """質問編集画面用：選択肢・Trait 配点・診断の Trait を先読み。"""
+    return _get_or_404(
+        Question,
+        question_id,
+        selectinload(Question.choices).selectinload(Choice.scores),
+        joinedload(Question.quiz).selectinload(Quiz.traits),
+    )
+
+
+def choice_or_404(choice_id: int) -> Choice:
+    """選択肢の保存用：Trait 配点と、診断の Trait 一覧を先読み。"""
+    return _get_or_404(
+        Choice,
+        choice_id,
+        selectinload(Choice.scores),
+        joinedload(Choice.question).joinedload(Question.quiz).selectinload(Quiz.traits),
+    )
+
+
+def result_or_404(result_id: int) -> Result:
+    return _get_or_404(Result, result_id, joinedload(Result.quiz).selectinload(Quiz.traits))
+
+
+def result_row_or_404(result_id: int) -> Result:
+    """削除用：関連を読まない Result 本体だけ。"""
+    return _get_or_404(Result, result_id)
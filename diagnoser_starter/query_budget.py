@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable, Iterable, Iterator
+
+from flask import Flask, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+
+# ============================================================
+# リクエストごとの SQL 発行数カウントと「上限（budget）」チェック
+#   - 各ビューに @query_budget(n) で上限を宣言しておく
+#   - SQL_QUERY_BUDGET = "warn" ならログ、"raise" なら例外（テスト/デバッグ用）
+#   - "off"（既定）ならイベント自体を登録しない
+#   - ストリーミングのレスポンスは、本文の SQL が after_request の後に発行されるので、
+#     本文のジェネレータを check_stream で包んで、出し切ったところで別に数える
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit: int) -> Callable[[Callable], Callable]:
+    """ビュー関数に「1リクエストあたりの SQL 上限」を宣言するデコレータ。"""
+
+    def decorator(func: Callable) -> Callable:
+        func.query_budget = limit
+        return func
+
+    return decorator
+
+
+def query_count() -> int:
+    """現在のリクエストでこれまでに発行した SQL の数。"""
+    return g.get("sql_query_count", 0)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    if has_request_context():
+        g.sql_query_count = g.get("sql_query_count", 0) + 1
+
+
+def _over_budget(count: int, limit: int, what: str) -> None:
+    message = f"{request.endpoint}{what}: {count} SQL statements (budget {limit})"
+    if current_app.config.get("SQL_QUERY_BUDGET") == "raise":
+        raise QueryBudgetExceeded(message)
+    log.warning("query budget exceeded: %s", message)
+
+
+def _check_budget(response):
+    if g.get("sql_query_budget_checked"):
+        return response  # エラーページの描画などで2回目に呼ばれた場合
+    g.sql_query_budget_checked = True
+
+    view = current_app.view_functions.get(request.endpoint or "")
+    limit = getattr(view, "query_budget", None)
+    count = query_count()
+    response.headers["X-SQL-Queries"] = str(count)
+    if limit is not None and count > limit:
+        _over_budget(count, limit, "")
+    return response
+
+
+def check_stream(chunks: Iterable, limit: int | Callable[[int], int]) -> Iterator:
+    """ストリーミングの本文で発行した SQL を、出し切ったところで上限と比べる。
+
+    limit は上限の数か、「出したチャンク数 -> 上限」の関数（件数に比例する書き出し用）。
+    stream_with_context の内側で使う（リクエストの g で数えるため）。
+    """
+    start = query_count()
+    sent = 0
+    for chunk in chunks:
+        sent += 1
+        yield chunk
+    if current_app.config.get("SQL_QUERY_BUDGET") not in ("warn", "raise"):
+        return
+    count = query_count() - start
+    allowed = limit(sent) if callable(limit) else limit
+    if count > allowed:
+        _over_budget(count, allowed, f" (streamed body, {sent} chunks)")
+
+
+def init_app(app: Flask) -> None:
+    mode = app.config.get("SQL_QUERY_BUDGET", "off")
+    if mode not in ("warn", "raise"):
+        return
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _count_statement)
+    app.after_request(_check_budget)
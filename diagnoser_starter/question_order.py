@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, current_app
+from sqlalchemy import and_, case, event, func, or_, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Question
+from quiz_events import mark_quiz_changed
+from sqlite_profile import run_serialized
+
+# ============================================================
+# 質問の並び順（Question.order）
+#   - order は ORDER_GAP 間隔の疎なキー。末尾への追加は max + ORDER_GAP
+#   - 1つ上/下への移動は、隣と「その向こう」の中間のキーを振るだけ（1行の UPDATE）
+#   - 間が詰まって中間が取れないときだけ、その診断の order を振り直す（compact）。
+#     振り直しは1回の SELECT と CASE 式の UPDATE 1回。隙間が残り少なくなった診断は
+#     commit 後にバックグラウンドで先に振り直しておく
+#   - 一括の並べ替え（reorder）も CASE 式の UPDATE 1回で行う
+#   - 振り直しは並びを変えないので revision は進めない（reorder は進める）
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+ORDER_GAP = 1024
+# 移動後に隣との隙間がこれ未満なら、バックグラウンドで振り直す
+COMPACT_BELOW = 4
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_pending: set[int] = set()
+_SESSION_KEY = "question_order_compact"
+
+
+class OrderError(ValueError):
+    """一括並べ替えの id の並びが、その診断の質問と一致しない。"""
+
+
+def append_key(quiz_id: int) -> int:
+    """末尾に追加する質問の order。"""
+    last = db.session.scalar(select(func.max(Question.order)).where(Question.quiz_id == quiz_id))
+    return (last or 0) + ORDER_GAP
+
+
+def _set_orders(keys: dict[int, int]) -> None:
+    """{question id: order} を CASE 式の UPDATE 1回で書く（ORM を通らない）。"""
+    if not keys:
+        return
+    table = Question.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id.in_(list(keys)))
+        .values(order=case(keys, value=table.c.id))
+    )
+
+
+def compact(quiz_id: int) -> int:
+    """診断の質問の order を、いまの並びのまま ORDER_GAP 間隔に振り直す（commit はしない）。"""
+    ids = db.session.scalars(
+        select(Question.id)
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.order.asc(), Question.id.asc())
+    ).all()
+    _set_orders({qid: (n + 1) * ORDER_GAP for n, qid in enumerate(ids)})
+    return len(ids)
+
+
+def reorder(quiz_id: int, question_ids: list[int]) -> None:
+    """質問の並びを question_ids の順にする（全件そろっていること。commit はしない）。"""
+    current = set(db.session.scalars(select(Question.id).where(Question.quiz_id == quiz_id)))
+    if len(set(question_ids)) != len(question_ids) or set(question_ids) != current:
+        raise OrderError("質問の並びが、この診断の質問と一致しません。")
+    _set_orders({qid: (n + 1) * ORDER_GAP for n, qid in enumerate(question_ids)})
+    mark_quiz_changed(db.session, {quiz_id})
+
+
+def _neighbours(q: Question, up: bool) -> list[int]:
+    """q の隣と、その向こう（最大2件）の order。"""
+    col = Question.order
+    if up:
+        beyond = or_(col < q.order, and_(col == q.order, Question.id < q.id))
+        ordering = (col.desc(), Question.id.desc())
+    else:
+        beyond = or_(col > q.order, and_(col == q.order, Question.id > q.id))
+        ordering = (col.asc(), Question.id.asc())
+    return list(
+        db.session.scalars(
+            select(col).where(Question.quiz_id == q.quiz_id, beyond).order_by(*ordering).limit(2)
+        )
+    )
+
+
+def _between(q: Question, up: bool) -> tuple[int, int] | None:
+    """(移動先のキー, 移動後に残る隙間の小さい方)。端なら None、間が無ければ (None, 0)。"""
+    keys = _neighbours(q, up)
+    if not keys:
+        return None
+    near = keys[0]
+    step = -ORDER_GAP if up else ORDER_GAP
+    far = keys[1] if len(keys) > 1 else near + 2 * step
+    if abs(far - near) < 2:
+        return (None, 0)
+    mid = (near + far) // 2
+    return (mid, min(abs(mid - near), abs(far - mid)))
+
+
+def move(q: Question, direction: str) -> bool:
+    """q を1つ上（"up"）/下（"down"）に動かす。動かなければ False（commit はしない）。"""
+    up = direction == "up"
+    if direction not in ("up", "down"):
+        return False
+    if q.order is None:
+        compact(q.quiz_id)
+        db.session.refresh(q, ["order"])
+    found = _between(q, up)
+    if found is None:
+        return False
+    key, room = found
+    if key is None:
+        # 隙間が尽きた：この診断だけ振り直してから中間を取る
+        compact(q.quiz_id)
+        db.session.refresh(q, ["order"])
+        key, room = _between(q, up)
+    q.order = key
+    if room < COMPACT_BELOW:
+        # 移動が commit されてから振り直す（先に読むと移動前の並びで上書きしてしまう）
+        db.session.info.setdefault(_SESSION_KEY, set()).add(q.quiz_id)
+    return True
+
+
+# ---------- バックグラウンドの振り直し ----------
+
+def _run_compact(app: Flask, quiz_id: int) -> None:
+    try:
+        with app.app_context():
+
+            def attempt():
+                compact(quiz_id)
+                db.session.commit()
+
+            run_serialized(attempt)
+    except Exception:
+        log.exception("failed to compact question order of quiz %s", quiz_id)
+    finally:
+        with _executor_lock:
+            _pending.discard(quiz_id)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-order")
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def schedule_compact(quiz_id: int) -> None:
+    """振り直しを予約する（同じ診断の予約は1つにまとめる）。"""
+    app = current_app._get_current_object()
+    with _executor_lock:
+        if quiz_id in _pending:
+            return
+        _pending.add(quiz_id)
+        _get_executor().submit(_run_compact, app, quiz_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_after_commit(session: Session) -> None:
+    for quiz_id in session.info.pop(_SESSION_KEY, ()):
+        schedule_compact(quiz_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+from array import array
+from types import MappingProxyType
+from typing import Sequence
+
+from flask import abort
+
+from lru import LRUCache
+from models import Quiz
+from queries import quiz_for_plan
+from quiz_events import on_quiz_change
+from scoring import (
+    BandIndex,
+    BandIssue,
+    band_range,
+    check_bands,
+    decode_answer_set,
+    decode_answers,
+    score_total,
+    score_totals,
+    total_range,
+)
+from trait_scoring import TraitMatrix
+
+# ============================================================
+# 公開ページ用の「コンパイル済み診断プラン」
+#   - Quiz / Question / Choice / Result を一度だけ読み込んで不変オブジェクト化
+#   - quiz_id をキーにした上限付き LRU（lru.LRUCache）に保持
+#   - 管理画面などで quiz が変更されたら commit 時に自動で破棄
+# ============================================================
+
+
+class _Frozen:
+    """__slots__ ベースの読み取り専用オブジェクト（生成後の代入を禁止）。"""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _init(self, **values) -> None:
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+class ChoicePlan(_Frozen):
+    __slots__ = ("id", "text", "sum_points")
+
+    def __init__(self, id: int, text: str, sum_points: int):
+        self._init(id=id, text=text, sum_points=sum_points)
+
+
+class QuestionPlan(_Frozen):
+    """1問分。choice_ids / choice_points は array で持つ。"""
+
+    __slots__ = (
+        "id",
+        "field",
+        "text",
+        "multiple",
+        "choices",
+        "choice_ids",
+        "choice_points",
+        "choice_set",
+    )
+
+    def __init__(self, id: int, text: str, multiple: bool, choices: tuple[ChoicePlan, ...]):
+        self._init(
+            id=id,
+            field=f"q-{id}",
+            text=text,
+            multiple=multiple,
+            choices=choices,
+            choice_ids=array("q", (c.id for c in choices)),
+            choice_points=array("q", (c.sum_points for c in choices)),
+            choice_set=frozenset(c.id for c in choices),
+        )
+
+
+class TraitPlan(_Frozen):
+    __slots__ = ("id", "key", "name")
+
+    def __init__(self, id: int, key: str, name: str):
+        self._init(id=id, key=key, name=name)
+
+
+class ResultBand(_Frozen):
+    """結果1件と、その判定レンジ（None は無制限）。"""
+
+    __slots__ = ("id", "title", "description", "min_total", "max_total", "winning_trait_id")
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        description: str,
+        min_total: int | None,
+        max_total: int | None,
+        winning_trait_id: int | None,
+    ):
+        self._init(
+            id=id,
+            title=title,
+            description=description,
+            min_total=min_total,
+            max_total=max_total,
+            winning_trait_id=winning_trait_id,
+        )
+
+    def contains(self, total: int) -> bool:
+        lo, hi = band_range(self)
+        return lo <= total <= hi
+
+
+class QuizPlan(_Frozen):
+    """公開ページの表示・採点に必要なものだけを持つ不変スナップショット。"""
+
+    __slots__ = (
+        "id",
+        "title",
+        "description",
+        "image_url",
+        "display_mode",
+        "choice_mode",
+        "choice_style",
+        "scoring_mode",
+        "page_size",
+        "revision",
+        "updated_at",
+        "questions",
+        "fields",
+        "question_of",
+        "points",
+        "results",
+        "total_range",
+        "band_index",
+        "traits",
+        "trait_matrix",
+        "trait_results",
+    )
+
+    def __init__(
+        self,
+        quiz: Quiz,
+        questions: tuple[QuestionPlan, ...],
+        results: tuple[ResultBand, ...],
+        traits: tuple[TraitPlan, ...],
+        trait_matrix: TraitMatrix,
+    ):
+        points = {cid: pts for q in questions for cid, pts in zip(q.choice_ids, q.choice_points)}
+        reachable = total_range(questions)
+        # Trait -> 結果（同じ Trait に複数の結果があれば id の小さい方）
+        trait_results: dict[int, ResultBand] = {}
+        for band in results:
+            if band.winning_trait_id is not None:
+                trait_results.setdefault(band.winning_trait_id, band)
+        self._init(
+            id=quiz.id,
+            title=quiz.title,
+            description=quiz.description or "",
+            image_url=quiz.image_url,
+            display_mode=quiz.display_mode or "ordered",
+            choice_mode=quiz.choice_mode or "ordered",
+            choice_style=quiz.choice_style or "normal",
+            scoring_mode=quiz.scoring_mode or "sum",
+            page_size=quiz.page_size or 0,
+            revision=quiz.revision or 0,
+            updated_at=quiz.updated_at,
+            questions=questions,
+            fields=MappingProxyType({q.field: q for q in questions}),
+            question_of=MappingProxyType({cid: q for q in questions for cid in q.choice_ids}),
+            points=MappingProxyType(points),
+            results=results,
+            total_range=reachable,
+            band_index=BandIndex(results, reachable),
+            traits=traits,
+            trait_matrix=trait_matrix,
+            trait_results=MappingProxyType(trait_results),
+        )
+
+    @property
+    def shuffles(self) -> bool:
+        """表示のたびに質問/選択肢の並びが変わるか（＝ページをキャッシュできない）。"""
+        return self.display_mode == "random" or self.choice_mode == "random"
+
+    def decode_answers(self, form) -> list[int]:
+        """回答フォームから、この診断に属する choice id だけを取り出す。"""
+        return decode_answers(self.fields, form)
+
+    def sum_total(self, picked_choice_ids) -> int:
+        """models.sum_total と同じく、重複 id は1回だけ数える。"""
+        return score_total(self.points, set(picked_choice_ids))
+
+    def pick_result(self, total: int) -> ResultBand | None:
+        """total が入る結果を返す（重なりは id の小さい結果を優先）。"""
+        return self.band_index.lookup(total)
+
+    def trait_scores(self, picked_choice_ids) -> list[int]:
+        """Trait ごとの合計（self.traits と同じ並び）。"""
+        return self.trait_matrix.score(picked_choice_ids)
+
+    def evaluate(self, picked_choice_ids) -> tuple[int, ResultBand | None, list[int] | None]:
+        """(合計点, 結果, Trait ごとの合計) を返す。sum 方式では Trait 合計は None。"""
+        total = self.sum_total(picked_choice_ids)
+        if self.scoring_mode != "trait":
+            return total, self.pick_result(total), None
+        scores = self.trait_scores(picked_choice_ids)
+        winner = self.trait_matrix.winner(scores)
+        return total, self.trait_results.get(winner), scores
+
+    def decode_answer_set(self, answer) -> list[int] | None:
+        """JSON の回答1件（{"q-<id>": id} か id のリスト）を decode_answers と同じ規則で読む。"""
+        return decode_answer_set(self.fields, self.question_of, answer)
+
+    def evaluate_many(self, picked_sets: Sequence[Sequence[int]]) -> list[tuple]:
+        """evaluate を複数の回答にまとめて適用する（点数表・区間インデックスは共通）。"""
+        picked_sets = [list(dict.fromkeys(picked)) for picked in picked_sets]
+        totals = score_totals(self.points, picked_sets)
+        if self.scoring_mode != "trait":
+            return [
+                (total, band, None)
+                for total, band in zip(totals, self.band_index.lookup_many(totals))
+            ]
+        winner = self.trait_matrix.winner
+        return [
+            (total, self.trait_results.get(winner(scores)), scores)
+            for total, scores in zip(totals, self.trait_matrix.score_many(picked_sets))
+        ]
+
+    def band_issues(self) -> list[BandIssue]:
+        if self.scoring_mode == "trait":
+            return [
+                BandIssue("trait", f"Trait『{t.name}』に対応する結果がありません。")
+                for t in self.traits
+                if t.id not in self.trait_results
+            ]
+        return check_bands(self.results, self.total_range)
+
+
+def compile_plan(quiz: Quiz) -> QuizPlan:
+    """ORM の Quiz（関連はロード済みが望ましい）から QuizPlan を組み立てる。"""
+    questions = tuple(
+        QuestionPlan(
+            id=q.id,
+            text=q.text,
+            multiple=bool(q.multiple),
+            choices=tuple(
+                ChoicePlan(id=c.id, text=c.text, sum_points=int(c.sum_points or 0))
+                for c in sorted(q.choices, key=lambda c: c.id)
+            ),
+        )
+        for q in sorted(quiz.questions, key=lambda q: (q.order or 0, q.id))
+    )
+    results = tuple(
+        ResultBand(
+            id=r.id,
+            title=r.title,
+            description=r.description or "",
+            min_total=r.min_total,
+            max_total=r.max_total,
+            winning_trait_id=r.winning_trait_id,
+        )
+        for r in sorted(quiz.results, key=lambda r: r.id)
+    )
+    traits = tuple(
+        TraitPlan(id=t.id, key=t.key, name=t.name) for t in sorted(quiz.traits, key=lambda t: t.id)
+    )
+    trait_matrix = TraitMatrix(
+        [t.id for t in traits],
+        (cid for q in questions for cid in q.choice_ids),
+        (
+            (sc.choice_id, sc.trait_id, sc.points)
+            for q in quiz.questions
+            for c in q.choices
+            for sc in c.scores
+        ),
+    )
+    return QuizPlan(quiz, questions, results, traits, trait_matrix)
+
+
+def _load_plan(quiz_id: int) -> QuizPlan | None:
+    quiz = quiz_for_plan(quiz_id)
+    return compile_plan(quiz) if quiz is not None else None
+
+
+# quiz_id -> QuizPlan
+plan_cache: LRUCache[int, QuizPlan] = LRUCache(128)
+
+
+@on_quiz_change
+def _drop_changed_plans(quiz_ids: set[int]) -> None:
+    plan_cache.invalidate(quiz_ids)
+
+
+def init_app(app) -> None:
+    plan_cache.maxsize = int(app.config.get("QUIZ_PLAN_CACHE_SIZE", 128))
+    plan_cache.clear()
+
+
+def get_plan(quiz_id: int) -> QuizPlan | None:
+    return plan_cache.get_or_load(quiz_id, _load_plan)
+
+
+def get_plan_or_404(quiz_id: int) -> QuizPlan:
+    plan = get_plan(quiz_id)
+    if plan is None:
+        abort(404)
+    return plan
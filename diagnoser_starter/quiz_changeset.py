@@ -0,0 +1,456 @@
+from __future__ import annotations
+
+from typing import Any, Mapping, NamedTuple
+
+from sqlalchemy import bindparam, delete, insert, select
+
+from bulk_load import (
+    MAX_POINTS,
+    MAX_TOTAL,
+    check_int,
+    check_text,
+    insert_returning_ids,
+    is_int,
+    lock_for_write,
+)
+from extensions import db
+from models import Choice, ChoiceScore, Question, Quiz, Result, Trait
+from question_order import ORDER_GAP
+from quiz_events import mark_quiz_changed
+from submission_log import forget_results
+
+# ============================================================
+# 1つの診断の質問・選択肢・結果をまとめて編集する changeset
+#   - 追加（create）・更新（update）・削除（delete）を1つの JSON で受け取り、
+#     まず全件を検査してから（1件でも問題があれば何も書かない）、
+#     1トランザクションでテーブルごとの集合単位の文（executemany / IN）で書く
+#   - 追加する行は "ref"（任意の文字列）で名前を付け、同じ changeset の中から参照できる
+#     （新しい質問への選択肢の追加など）。応答で ref -> 採番 id を返す
+#   - "revision" を付けると、読み込んだ後に他の編集が入っていれば適用しない（衝突）
+#   - ORM を通らないので、最後に quiz_events へ変更を知らせる
+#
+# changeset の形:
+#   {
+#     "revision": 12,
+#     "questions": {
+#       "create": [{"ref": "q1", "text": "...", "multiple": false}],   # 末尾に追加
+#       "update": [{"id": 5, "text": "...", "multiple": true}],
+#       "delete": [7],                                                  # 選択肢・配点ごと
+#     },
+#     "choices": {
+#       "create": [{"ref": "c1", "question": 5 または "q1", "text": "...", "points": 1,
+#                   "scores": {"e": 2}}],
+#       "update": [{"id": 9, "points": 3, "scores": {"e": 0, "i": 1}}],  # 0 は配点の削除
+#       "delete": [11],
+#     },
+#     "results": {
+#       "create": [{"ref": "r1", "title": "...", "description": "", "min_total": 0,
+#                   "max_total": 5, "winning_trait": "e"}],
+#       "update": [{"id": 3, "min_total": 6, "max_total": null}],     # null は上限/下限なし
+#       "delete": [4],
+#     },
+#   }
+#   update は書いた項目だけを変える。trait は key で指定する
+# ============================================================
+
+KINDS = ("questions", "choices", "results")
+ACTIONS = ("create", "update", "delete")
+
+# 項目名 -> (列名, 文字数の上限。None は文字列以外)
+_FIELDS: dict[str, dict[str, tuple[str, int | None]]] = {
+    "questions": {"text": ("text", 300), "multiple": ("multiple", None)},
+    "choices": {"text": ("text", 200), "points": ("sum_points", None)},
+    "results": {
+        "title": ("title", 200),
+        "description": ("description", None),
+        "min_total": ("min_total", None),
+        "max_total": ("max_total", None),
+        "winning_trait": ("winning_trait_id", None),
+    },
+}
+
+
+class ChangesetConflict(RuntimeError):
+    """changeset の revision が、いまの診断の revision と違う。"""
+
+    def __init__(self, revision: int):
+        super().__init__("ほかの編集が先に保存されています。読み込み直してください。")
+        self.revision = revision
+
+
+class ChangesetResult(NamedTuple):
+    errors: list[str]
+    diff: dict[str, Any]  # errors が空のときだけ埋まる
+
+
+class _Current(NamedTuple):
+    """検査に使う、いまの診断の id の集合。"""
+
+    revision: int
+    traits: dict[str, int]  # key -> trait id
+    questions: set[int]
+    choices: dict[int, int]  # choice id -> question id
+    results: dict[int, tuple[int | None, int | None]]  # result id -> (min_total, max_total)
+    last_order: int
+
+
+def _section(errors: list[str], changeset: Mapping, kind: str) -> dict[str, list]:
+    value = changeset.get(kind) or {}
+    if not isinstance(value, Mapping):
+        errors.append(f"{kind}: {{create, update, delete}} のオブジェクトで指定してください")
+        return {a: [] for a in ACTIONS}
+    section = {}
+    for action in ACTIONS:
+        items = value.get(action) or []
+        if not isinstance(items, list):
+            errors.append(f"{kind}.{action}: 配列で指定してください")
+            items = []
+        section[action] = items
+    return section
+
+
+def _check_fields(errors: list[str], kind: str, where: str, item: Mapping, create: bool) -> None:
+    """項目の型と長さ（DB に触れない検査）。"""
+    if kind == "questions":
+        if create or "text" in item:
+            check_text(errors, f"{where}.text", item.get("text"), 300)
+        if "multiple" in item and not isinstance(item["multiple"], bool):
+            errors.append(f"{where}.multiple: true / false で指定してください")
+    elif kind == "choices":
+        if create or "text" in item:
+            check_text(errors, f"{where}.text", item.get("text"), 200)
+        check_int(errors, f"{where}.points", item.get("points"), MAX_POINTS)
+        scores = item.get("scores") or {}
+        if not isinstance(scores, Mapping):
+            errors.append(f"{where}.scores: {{trait key: 点数}} で指定してください")
+        else:
+            for key, points in scores.items():
+                if points is None:
+                    errors.append(f"{where}.scores.{key}: 整数で指定してください")
+                else:
+                    check_int(errors, f"{where}.scores.{key}", points, MAX_POINTS)
+    else:
+        if create or "title" in item:
+            check_text(errors, f"{where}.title", item.get("title"), 200)
+        if not isinstance(item.get("description") or "", str):
+            errors.append(f"{where}.description: 文字列で指定してください")
+        lo, hi = item.get("min_total"), item.get("max_total")
+        for name, value in (("min_total", lo), ("max_total", hi)):
+            check_int(errors, f"{where}.{name}", value, MAX_TOTAL)
+        if is_int(lo) and is_int(hi) and lo > hi:
+            errors.append(f"{where}: min_total が max_total より大きくなっています")
+    unknown = set(item) - set(_FIELDS[kind]) - {"id", "ref", "question", "scores"}
+    if unknown:
+        errors.append(f"{where}: 不明な項目 {', '.join(sorted(map(str, unknown)))}")
+
+
+def _load_current(quiz_id: int) -> _Current | None:
+    session = db.session
+    revision = session.scalar(select(Quiz.revision).where(Quiz.id == quiz_id))
+    if revision is None:
+        return None
+    traits = dict(
+        session.execute(select(Trait.key, Trait.id).where(Trait.quiz_id == quiz_id)).all()
+    )
+    questions: set[int] = set()
+    choices: dict[int, int] = {}
+    last_order = 0
+    rows = session.execute(
+        select(Question.id, Question.order, Choice.id)
+        .outerjoin(Choice, Choice.question_id == Question.id)
+        .where(Question.quiz_id == quiz_id)
+    )
+    for question_id, order, choice_id in rows:
+        questions.add(question_id)
+        last_order = max(last_order, order or 0)
+        if choice_id is not None:
+            choices[choice_id] = question_id
+    results = {
+        result_id: (lo, hi)
+        for result_id, lo, hi in session.execute(
+            select(Result.id, Result.min_total, Result.max_total).where(Result.quiz_id == quiz_id)
+        )
+    }
+    return _Current(revision, traits, questions, choices, results, last_order)
+
+
+def _validate(
+    changeset: Mapping, current: _Current, max_items: int | None
+) -> tuple[list[str], dict]:
+    """changeset 全体を検査し、(問題点, 種類ごとの create/update/delete) を返す。"""
+    errors: list[str] = []
+    sections = {kind: _section(errors, changeset, kind) for kind in KINDS}
+    count = sum(len(items) for section in sections.values() for items in section.values())
+    if max_items is not None and count > max_items:
+        return [f"1回に変更できるのは {max_items} 件までです（{count} 件）"], sections
+    existing = {
+        "questions": current.questions,
+        "choices": set(current.choices),
+        "results": current.results,
+    }
+    refs: dict[str, set[str]] = {kind: set() for kind in KINDS}
+    deleted: dict[str, set[int]] = {kind: set() for kind in KINDS}
+
+    for kind in KINDS:
+        section = sections[kind]
+        for n, value in enumerate(section["delete"], 1):
+            if not is_int(value) or value not in existing[kind]:
+                errors.append(f"{kind}.delete[{n}]: この診断に id {value!r} はありません")
+            else:
+                deleted[kind].add(value)
+        updated = set()
+        for n, item in enumerate(section["update"], 1):
+            where = f"{kind}.update[{n}]"
+            if not isinstance(item, Mapping):
+                errors.append(f"{where}: オブジェクトで指定してください")
+                continue
+            id_ = item.get("id")
+            if not is_int(id_) or id_ not in existing[kind]:
+                errors.append(f"{where}.id: この診断に id {id_!r} はありません")
+            elif id_ in deleted[kind]:
+                errors.append(f"{where}.id: 削除する {id_} は更新できません")
+            elif id_ in updated:
+                errors.append(f"{where}.id: {id_} の更新が重複しています")
+            updated.add(id_)
+            _check_fields(errors, kind, where, item, create=False)
+        for n, item in enumerate(section["create"], 1):
+            where = f"{kind}.create[{n}]"
+            if not isinstance(item, Mapping):
+                errors.append(f"{where}: オブジェクトで指定してください")
+                continue
+            ref = item.get("ref")
+            if ref is not None:
+                if not isinstance(ref, str) or not ref:
+                    errors.append(f"{where}.ref: 文字列で指定してください")
+                elif ref in refs[kind]:
+                    errors.append(f"{where}.ref: 『{ref}』が重複しています")
+                refs[kind].add(ref)
+            _check_fields(errors, kind, where, item, create=True)
+
+    # 質問を消すと、その選択肢も消える
+    gone = {cid for cid, qid in current.choices.items() if qid in deleted["questions"]}
+    for n, item in enumerate(sections["choices"]["update"], 1):
+        if isinstance(item, Mapping) and is_int(item.get("id")) and item["id"] in gone:
+            errors.append(f"choices.update[{n}].id: 質問ごと削除される選択肢です")
+    for n, item in enumerate(sections["choices"]["create"], 1):
+        if not isinstance(item, Mapping):
+            continue
+        target = item.get("question")
+        if isinstance(target, str):
+            if target not in refs["questions"]:
+                errors.append(f"choices.create[{n}].question: 未定義の ref『{target}』")
+        elif not is_int(target) or target not in current.questions:
+            errors.append(f"choices.create[{n}].question: この診断に id {target!r} はありません")
+        elif target in deleted["questions"]:
+            errors.append(f"choices.create[{n}].question: 削除する質問 {target} です")
+
+    # 片方の境界だけを変えるときは、保存済みのもう片方と合わせて min <= max を確かめる
+    for n, item in enumerate(sections["results"]["update"], 1):
+        if not isinstance(item, Mapping) or not is_int(item.get("id")):
+            continue
+        if item["id"] not in current.results:
+            continue
+        stored_lo, stored_hi = current.results[item["id"]]
+        lo = item["min_total"] if "min_total" in item else stored_lo
+        hi = item["max_total"] if "max_total" in item else stored_hi
+        if ("min_total" in item) != ("max_total" in item) and is_int(lo) and is_int(hi) and lo > hi:
+            errors.append(
+                f"results.update[{n}]: min_total（{lo}）が max_total（{hi}）より大きくなります"
+            )
+
+    # trait は key で参照する
+    for action in ("create", "update"):
+        for n, item in enumerate(sections["choices"][action], 1):
+            scores = item.get("scores") if isinstance(item, Mapping) else None
+            for key in scores if isinstance(scores, Mapping) else ():
+                if key not in current.traits:
+                    errors.append(f"choices.{action}[{n}].scores: 未定義の trait key『{key}』")
+        for n, item in enumerate(sections["results"][action], 1):
+            winner = item.get("winning_trait") if isinstance(item, Mapping) else None
+            if winner is not None and (not isinstance(winner, str) or winner not in current.traits):
+                errors.append(
+                    f"results.{action}[{n}].winning_trait: 未定義の trait key『{winner}』"
+                )
+    return errors, sections
+
+
+def _row(kind: str, item: Mapping, traits: Mapping[str, int]) -> dict[str, Any]:
+    """item の書かれている項目だけを列名の dict にする。"""
+    row = {"id": item["id"]} if "id" in item else {}
+    for name, (column, _limit) in _FIELDS[kind].items():
+        if name not in item:
+            continue
+        value = item[name]
+        if name == "winning_trait":
+            value = traits[value] if value is not None else None
+        elif name in ("text", "title"):
+            value = value.strip()
+        elif name == "points":
+            value = value or 0
+        elif name == "description":
+            value = (value or "").strip()
+        row[column] = value
+    return row
+
+
+def _refs(items: list[Mapping], ids: list[int]) -> dict[str, int]:
+    """ref を付けた追加行の ref -> 採番 id。"""
+    return {item["ref"]: id_ for item, id_ in zip(items, ids) if item.get("ref")}
+
+
+def _update_rows(conn, table, rows: list[dict]) -> None:
+    """id ごとの部分更新を、変える列の組み合わせごとに1回の executemany で書く。"""
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        if len(row) > 1:  # id だけ（変更なし）は書かない
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+    stmt = table.update().where(table.c.id == bindparam("b_id"))
+    for group in groups.values():
+        conn.execute(
+            stmt, [{"b_id": r["id"], **{k: v for k, v in r.items() if k != "id"}} for r in group]
+        )
+
+
+def apply_changeset(
+    quiz_id: int, changeset: Mapping, max_items: int | None = None
+) -> ChangesetResult | None:
+    """changeset を検査して適用し、commit する。診断が無ければ None。
+
+    検査で問題があれば何も書かずに errors を返す。revision が合わなければ
+    ChangesetConflict を送出する（どちらも呼び出し側で rollback すること）。
+    """
+    if not isinstance(changeset, Mapping):
+        return ChangesetResult(["changeset は JSON オブジェクトで指定してください"], {})
+    session = db.session
+    conn = session.connection()
+    # 検査から書き込みまでの間に他の接続が書けないよう、先に書き込みロックを取る
+    lock_for_write(conn)
+    current = _load_current(quiz_id)
+    if current is None:
+        return None
+    expected = changeset.get("revision")
+    if expected is not None and not is_int(expected):
+        return ChangesetResult(["revision: 整数で指定してください"], {})
+    if expected is not None and expected != current.revision:
+        raise ChangesetConflict(current.revision)
+    errors, sections = _validate(changeset, current, max_items)
+    if errors:
+        return ChangesetResult(errors, {})
+    if not any(items for section in sections.values() for items in section.values()):
+        return ChangesetResult([], {"revision": current.revision})
+    questions, choices, results = (sections[kind] for kind in KINDS)
+    traits = current.traits
+    cs, choice_t = ChoiceScore.__table__, Choice.__table__
+    question_t, result_t = Question.__table__, Result.__table__
+
+    # --- 1) 削除（質問の削除は、その選択肢と配点も消す） ---
+    dropped_questions = set(questions["delete"])
+    dropped_choices = set(choices["delete"]) | {
+        cid for cid, qid in current.choices.items() if qid in dropped_questions
+    }
+    if dropped_choices:
+        conn.execute(delete(cs).where(cs.c.choice_id.in_(sorted(dropped_choices))))
+        conn.execute(delete(choice_t).where(choice_t.c.id.in_(sorted(dropped_choices))))
+    if dropped_questions:
+        conn.execute(delete(question_t).where(question_t.c.id.in_(sorted(dropped_questions))))
+    if results["delete"]:
+        conn.execute(delete(result_t).where(result_t.c.id.in_(sorted(results["delete"]))))
+        forget_results(conn, quiz_id, results["delete"])
+
+    # --- 2) 質問（追加は末尾に ORDER_GAP 間隔で並べる） ---
+    question_ids = insert_returning_ids(
+        conn,
+        question_t,
+        [
+            {
+                "quiz_id": quiz_id,
+                "text": item["text"].strip(),
+                "multiple": bool(item.get("multiple", False)),
+                "order": current.last_order + (n + 1) * ORDER_GAP,
+            }
+            for n, item in enumerate(questions["create"])
+        ],
+    )
+    question_refs = _refs(questions["create"], question_ids)
+    _update_rows(conn, question_t, [_row("questions", i, traits) for i in questions["update"]])
+
+    # --- 3) 選択肢と配点 ---
+    choice_ids = insert_returning_ids(
+        conn,
+        choice_t,
+        [
+            {
+                "question_id": question_refs.get(item["question"], item["question"]),
+                "text": item["text"].strip(),
+                "sum_points": item.get("points") or 0,
+            }
+            for item in choices["create"]
+        ],
+    )
+    _update_rows(conn, choice_t, [_row("choices", item, traits) for item in choices["update"]])
+    # 更新で書かれた (選択肢, trait) の配点は消してから入れ直す（0 は消すだけ）
+    touched = [
+        {"b_choice": item["id"], "b_trait": traits[key]}
+        for item in choices["update"]
+        for key in item.get("scores") or {}
+    ]
+    if touched:
+        conn.execute(
+            delete(cs).where(
+                cs.c.choice_id == bindparam("b_choice"), cs.c.trait_id == bindparam("b_trait")
+            ),
+            touched,
+        )
+    score_rows = [
+        {"choice_id": choice_id, "trait_id": traits[key], "points": points}
+        for choice_id, item in [
+            *zip(choice_ids, choices["create"]),
+            *((item["id"], item) for item in choices["update"]),
+        ]
+        for key, points in (item.get("scores") or {}).items()
+        if points
+    ]
+    if score_rows:
+        conn.execute(insert(cs), score_rows)
+
+    # --- 4) 結果 ---
+    result_ids = insert_returning_ids(
+        conn,
+        result_t,
+        [
+            {
+                "quiz_id": quiz_id,
+                "description": "",
+                "min_total": None,
+                "max_total": None,
+                "winning_trait_id": None,
+                **_row("results", item, traits),
+            }
+            for item in results["create"]
+        ],
+    )
+    _update_rows(conn, result_t, [_row("results", item, traits) for item in results["update"]])
+
+    mark_quiz_changed(session, {quiz_id})
+    session.commit()
+
+    # 追加した行は create の順の id。ref を付けた行は refs で引けるようにする
+    created = {"questions": question_ids, "choices": choice_ids, "results": result_ids}
+    refs = {kind: _refs(sections[kind]["create"], ids) for kind, ids in created.items()}
+    diff = {
+        "revision": current.revision + 1,
+        "created": created,
+        "refs": refs,
+        "updated": {kind: sorted(i["id"] for i in sections[kind]["update"]) for kind in KINDS},
+        "deleted": {
+            "questions": sorted(dropped_questions),
+            "choices": sorted(dropped_choices),
+            "results": sorted(set(results["delete"])),
+        },
+    }
+    # 空の種類は省く（応答を小さく）
+    for key in ("created", "refs", "updated", "deleted"):
+        diff[key] = {kind: v for kind, v in diff[key].items() if v}
+        if not diff[key]:
+            del diff[key]
+    return ChangesetResult([], diff)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Choice, ChoiceScore, Question, Quiz, Result, Trait, utcnow
+
+# ============================================================
+# Quiz 単位の変更検知
+#   - ORM の flush で新規/更新/削除された行から quiz_id を割り出し、
+#     同じトランザクション内で quiz.revision / quiz.updated_at を進め、
+#     commit 成功時にだけ登録済みのコールバックへ通知する
+#   - 診断一覧（カタログ）に影響する Quiz 行そのものの変更は別途通知
+#   - rollback された変更は通知しない
+# ============================================================
+
+QuizChangeListener = Callable[[set[int]], None]
+
+_listeners: list[QuizChangeListener] = []
+_catalog_listeners: list[Callable[[], None]] = []
+
+_PENDING_KEY = "changed_quiz_ids"
+_CATALOG_KEY = "catalog_changed"
+
+
+def on_quiz_change(func: QuizChangeListener) -> QuizChangeListener:
+    """commit 後に「変更された quiz_id の集合」を受け取るコールバックを登録する。"""
+    _listeners.append(func)
+    return func
+
+
+def on_catalog_change(func: Callable[[], None]) -> Callable[[], None]:
+    """Quiz の追加・削除・列の更新が commit されたときに呼ばれるコールバックを登録する。"""
+    _catalog_listeners.append(func)
+    return func
+
+
+def mark_catalog_changed(session: Session) -> None:
+    session.info[_CATALOG_KEY] = True
+
+
+def mark_quiz_changed(session: Session, quiz_ids: Iterable[int]) -> None:
+    """quiz の revision を進め、commit 時の通知対象にする。
+
+    ORM の flush では自動で呼ばれる。ORM を通らない更新（Core の UPDATE など）
+    の後は、同じセッション・トランザクション内で明示的に呼ぶこと。
+    """
+    ids = {int(qid) for qid in quiz_ids if qid is not None}
+    if not ids:
+        return
+    quiz = Quiz.__table__
+    session.connection().execute(
+        quiz.update()
+        .where(quiz.c.id.in_(sorted(ids)))
+        .values(
+            revision=quiz.c.revision + 1,
+            updated_at=utcnow(),
+        )
+    )
+    session.info.setdefault(_PENDING_KEY, set()).update(ids)
+
+
+def _quiz_id_of(session: Session, obj) -> int | None:
+    """変更対象オブジェクトが属する quiz_id を返す（分からなければ None）。"""
+    if isinstance(obj, Quiz):
+        return obj.id
+    if isinstance(obj, (Question, Trait, Result)):
+        if obj.quiz_id is not None:
+            return obj.quiz_id
+        return obj.quiz.id if obj.quiz is not None else None
+    if isinstance(obj, ChoiceScore):
+        obj = obj.choice
+        if obj is None:
+            return None
+    if isinstance(obj, Choice):
+        if obj.question is not None:
+            return _quiz_id_of(session, obj.question)
+        if obj.question_id is not None:
+            return session.scalar(
+                Question.__table__.select()
+                .with_only_columns(Question.__table__.c.quiz_id)
+                .where(Question.__table__.c.id == obj.question_id)
+            )
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_quizzes(session: Session, flush_context) -> None:
+    touched = [*session.new, *session.dirty, *session.deleted]
+    if not touched:
+        return
+    with session.no_autoflush:
+        ids = {_quiz_id_of(session, obj) for obj in touched}
+    mark_quiz_changed(session, ids)
+
+    # 子の追加だけで dirty になった Quiz（列は不変）はカタログに影響しない
+    if any(isinstance(obj, Quiz) for obj in (*session.new, *session.deleted)) or any(
+        isinstance(obj, Quiz) and session.is_modified(obj, include_collections=False)
+        for obj in session.dirty
+    ):
+        mark_catalog_changed(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_changed_quizzes(session: Session) -> None:
+    if session.info.pop(_CATALOG_KEY, False):
+        for catalog_listener in _catalog_listeners:
+            catalog_listener()
+    changed = session.info.pop(_PENDING_KEY, None)
+    if not changed:
+        return
+    for listener in _listeners:
+        listener(set(changed))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_quizzes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_CATALOG_KEY, None)
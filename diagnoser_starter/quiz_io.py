@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import json
+from typing import IO, Iterable, Iterator, NamedTuple
+
+from sqlalchemy import select
+
+from bulk_load import QUIZ_FIELDS, load_quizzes, validate_spec
+from extensions import db
+from models import Choice, ChoiceScore, Question, Quiz, Result, Trait
+
+# ============================================================
+# 診断のエクスポート / インポート（JSON・NDJSON）
+#   - 形式は bulk_load の spec そのもの。id は持たず、Trait は key で参照する
+#     （取り込み先では新しい id が振られ、key から付け直される）
+#   - エクスポートは quiz id 順に EXPORT_BATCH 件ずつ読み、1件ずつ書き出す
+#     （カタログ全体をメモリに載せない）
+#   - インポートは1件ずつ読んで検査し、IMPORT_BATCH 件ごとにまとめて INSERT。
+#     全体で1トランザクションなので、途中でエラーがあれば何も書き込まない
+#
+# NDJSON: 1行目がヘッダ {"format": ..., "version": ...}、以降1行に1診断
+# JSON  : {"format": ..., "version": ..., "quizzes": [診断, ...]}
+# ============================================================
+
+FORMAT = "diagnoser-quiz"
+VERSION = 1
+
+EXPORT_BATCH = 50
+IMPORT_BATCH = 100
+READ_CHUNK = 64 * 1024
+
+
+class QuizFormatError(ValueError):
+    """取り込めない文書（形式・JSON の誤り）。"""
+
+
+class ImportReport(NamedTuple):
+    count: int  # 読み込んだ診断の数
+    quiz_ids: list[int]  # 作成した id（dry_run やエラー時は空）
+    errors: list[str]  # 「診断 n: メッセージ」の形
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+# ---------- エクスポート ----------
+
+def _header() -> dict:
+    return {"format": FORMAT, "version": VERSION}
+
+
+def _quiz_batches(quiz_ids: Iterable[int] | None) -> Iterator[list]:
+    """Quiz の行を EXPORT_BATCH 件ずつ（指定があればその id だけ）返す。"""
+    quiz = Quiz.__table__
+    columns = [quiz.c.id, quiz.c.title, quiz.c.description, *(quiz.c[f] for f in QUIZ_FIELDS)]
+    if quiz_ids is not None:
+        wanted = sorted(set(quiz_ids))
+        for start in range(0, len(wanted), EXPORT_BATCH):
+            chunk = wanted[start : start + EXPORT_BATCH]
+            rows = db.session.execute(
+                select(*columns).where(quiz.c.id.in_(chunk)).order_by(quiz.c.id)
+            ).all()
+            if rows:
+                yield rows
+        return
+
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(quiz.c.id > last_id).order_by(quiz.c.id).limit(EXPORT_BATCH)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _specs_for(rows) -> list[dict]:
+    """Quiz の行1バッチ分の子（Trait・質問・選択肢・配点・結果）をまとめて読み、spec にする。"""
+    ids = [row.id for row in rows]
+    specs = {}
+    for row in rows:
+        spec = {"title": row.title, "description": row.description or ""}
+        # 既定値（None / page_size の 0）は書かない
+        spec.update({f: getattr(row, f) for f in QUIZ_FIELDS if getattr(row, f) not in (None, 0)})
+        spec.update(traits=[], questions=[], results=[])
+        specs[row.id] = spec
+
+    trait_key = {}
+    for t in db.session.execute(
+        select(Trait.id, Trait.quiz_id, Trait.key, Trait.name)
+        .where(Trait.quiz_id.in_(ids))
+        .order_by(Trait.id)
+    ):
+        trait_key[t.id] = t.key
+        specs[t.quiz_id]["traits"].append({"key": t.key, "name": t.name})
+
+    questions = {}
+    for q in db.session.execute(
+        select(Question.id, Question.quiz_id, Question.text, Question.multiple)
+        .where(Question.quiz_id.in_(ids))
+        .order_by(Question.quiz_id, Question.order, Question.id)
+    ):
+        questions[q.id] = {"text": q.text, "multiple": bool(q.multiple), "choices": []}
+        specs[q.quiz_id]["questions"].append(questions[q.id])
+
+    choices = {}
+    for c in db.session.execute(
+        select(Choice.id, Choice.question_id, Choice.text, Choice.sum_points)
+        .join(Question, Question.id == Choice.question_id)
+        .where(Question.quiz_id.in_(ids))
+        .order_by(Choice.id)
+    ):
+        choices[c.id] = {"text": c.text, "points": c.sum_points or 0, "scores": {}}
+        questions[c.question_id]["choices"].append(choices[c.id])
+
+    for s in db.session.execute(
+        select(ChoiceScore.choice_id, ChoiceScore.trait_id, ChoiceScore.points)
+        .join(Trait, Trait.id == ChoiceScore.trait_id)
+        .where(Trait.quiz_id.in_(ids))
+        .order_by(ChoiceScore.id)
+    ):
+        if s.choice_id in choices and s.points:
+            choices[s.choice_id]["scores"][trait_key[s.trait_id]] = s.points
+
+    for r in db.session.execute(
+        select(
+            Result.quiz_id,
+            Result.title,
+            Result.description,
+            Result.min_total,
+            Result.max_total,
+            Result.winning_trait_id,
+        )
+        .where(Result.quiz_id.in_(ids))
+        .order_by(Result.id)  # 帯が重なるときは id の小さい方が勝つので順序を保つ
+    ):
+        specs[r.quiz_id]["results"].append(
+            {
+                "title": r.title,
+                "description": r.description or "",
+                "min_total": r.min_total,
+                "max_total": r.max_total,
+                "winning_trait": trait_key.get(r.winning_trait_id),
+            }
+        )
+
+    for spec in specs.values():
+        for q in spec["questions"]:
+            for c in q["choices"]:
+                if not c["scores"]:
+                    del c["scores"]
+    return list(specs.values())
+
+
+def export_query_budget(quizzes: int) -> int:
+    """quizzes 件（指定した id の数か、書き出した件数の多い方）の書き出しで発行する SQL の上限。
+
+    1バッチ = Quiz の行 + 子の5テーブルで6回。全件のときは最後に空のバッチを1回読む。
+    """
+    return (quizzes // EXPORT_BATCH + 1) * 6 + 1
+
+
+def iter_specs(quiz_ids: Iterable[int] | None = None) -> Iterator[dict]:
+    """診断を spec として1件ずつ返す（quiz_ids が None なら全件）。"""
+    for rows in _quiz_batches(quiz_ids):
+        yield from _specs_for(rows)
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def export_ndjson(quiz_ids: Iterable[int] | None = None) -> Iterator[str]:
+    yield _dumps(_header()) + "\n"
+    for spec in iter_specs(quiz_ids):
+        yield _dumps(spec) + "\n"
+
+
+def export_json(quiz_ids: Iterable[int] | None = None) -> Iterator[str]:
+    yield _dumps(_header())[:-1] + ',"quizzes":['
+    for n, spec in enumerate(iter_specs(quiz_ids)):
+        yield ("," if n else "") + "\n" + _dumps(spec)
+    yield "\n]}\n"
+
+
+# ---------- 読み込み（少しずつ読んでパースする） ----------
+
+def _check_header(obj) -> None:
+    if obj.get("format") != FORMAT:
+        raise QuizFormatError(f'format が "{FORMAT}" ではありません')
+    if obj.get("version") != VERSION:
+        raise QuizFormatError(f"対応していない version です: {obj.get('version')!r}")
+
+
+def read_ndjson(stream: IO[str]) -> Iterator[dict]:
+    """NDJSON を1行ずつ読む。ヘッダ行（format を持つ行）は検査して読み飛ばす。"""
+    for lineno, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise QuizFormatError(f"{lineno} 行目: JSON として読めません（{exc.msg}）") from None
+        if isinstance(obj, dict) and "format" in obj and "title" not in obj:
+            _check_header(obj)
+            continue
+        yield obj
+
+
+def read_json(stream: IO[str]) -> Iterator[dict]:
+    """JSON 文書の "quizzes" 配列（または配列そのもの）を、要素ごとに読み進める。
+
+    ヘッダのキーは "quizzes" より前に置くこと（export_json の出力はそうなっている）。
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = stream.read(READ_CHUNK)
+        buf, pos = buf[pos:] + chunk, 0
+        eof = not chunk
+        return bool(chunk)
+
+    def skip_ws() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ""
+
+    def expect(char: str) -> None:
+        nonlocal pos
+        if skip_ws() != char:
+            raise QuizFormatError(f"JSON の形式が正しくありません（{char!r} が必要です）")
+        pos += 1
+
+    def value():
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as exc:
+                if fill():
+                    continue
+                raise QuizFormatError(f"JSON として読めません（{exc.msg}）") from None
+            # 数値などは途中で切れていても読めてしまうので、末尾まで来たら読み足して確かめる
+            if end == len(buf) and not eof and not isinstance(obj, (dict, list, str)):
+                fill()
+                continue
+            pos = end
+            return obj
+
+    if skip_ws() == "{":
+        pos += 1
+        header = {}
+        while True:
+            key = value()
+            expect(":")
+            if key == "quizzes":
+                break
+            header[key] = value()
+            if skip_ws() != ",":
+                raise QuizFormatError('"quizzes" がありません')
+            pos += 1
+        _check_header(header)
+    expect("[")
+    if skip_ws() == "]":
+        return
+    while True:
+        yield value()
+        sep = skip_ws()
+        pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise QuizFormatError("JSON の形式が正しくありません（配列の区切り）")
+
+
+def read_specs(stream: IO[str], fmt: str | None = None) -> Iterator[dict]:
+    """fmt（"json" / "ndjson"）が無ければ、先頭の行が1つの JSON かどうかで判定する。"""
+    if fmt is None:
+        head = stream.read(READ_CHUNK)
+        first, newline, _ = head.partition("\n")
+        fmt = "json"
+        if newline:
+            try:
+                obj = json.loads(first)
+            except json.JSONDecodeError:
+                obj = None
+            # 1行に収まった JSON 文書（"quizzes" を持つ）は NDJSON のヘッダではない
+            if isinstance(obj, dict) and "quizzes" not in obj:
+                fmt = "ndjson"
+        stream = _Prepended(head, stream)
+    if fmt == "ndjson":
+        yield from read_ndjson(stream)
+    elif fmt == "json":
+        yield from read_json(stream)
+    else:
+        raise ValueError(f"unknown format: {fmt!r}")
+
+
+class _Prepended:
+    """判定のために読んだ先頭部分を戻したストリーム。"""
+
+    def __init__(self, head: str, stream: IO[str]):
+        self.head, self.stream = head, stream
+
+    def read(self, size: int = -1) -> str:
+        head, self.head = self.head, ""
+        if head:
+            return head  # 呼び出し側（read_json）は短く返っても構わない
+        return self.stream.read(size)
+
+    def __iter__(self) -> Iterator[str]:
+        head, self.head = self.head, ""
+        # splitlines は U+2028 などでも区切るので使わない
+        *lines, tail = head.split("\n")
+        for line in lines:
+            yield line + "\n"
+        if tail:
+            yield tail + self.stream.readline()
+        yield from self.stream
+
+
+# ---------- インポート ----------
+
+def import_specs(specs: Iterable, dry_run: bool = False, max_errors: int = 100) -> ImportReport:
+    """spec を検査しながら IMPORT_BATCH 件ずつ投入し、全体を1回だけ commit する。
+
+    dry_run なら検査だけして書き込まない。エラーが1つでもあればロールバックする。
+    """
+    errors: list[str] = []
+    quiz_ids: list[int] = []
+    batch: list = []
+    count = 0
+    try:
+        for count, spec in enumerate(specs, 1):
+            problems = validate_spec(spec)
+            errors.extend(f"診断 {count}: {p}" for p in problems)
+            if len(errors) >= max_errors:
+                break
+            if dry_run or errors:
+                continue  # エラー後も検査は続ける（書き込みはしない）
+            batch.append(spec)
+            if len(batch) >= IMPORT_BATCH:
+                quiz_ids += load_quizzes(batch, commit=False)
+                batch.clear()
+    except QuizFormatError as exc:
+        errors.append(str(exc))
+    except UnicodeDecodeError:
+        errors.append("UTF-8 のテキストとして読めません")
+
+    if dry_run or errors:
+        db.session.rollback()
+        return ImportReport(count, [], errors)
+    if batch:
+        quiz_ids += load_quizzes(batch, commit=False)
+    db.session.commit()
+    return ImportReport(count, quiz_ids, errors)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import random
+from typing import NamedTuple
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+# ============================================================
+# 質問の多い診断のページ分割（Quiz.page_size 問ずつ）
+#   - 途中の回答はサーバーに保存せず、署名付きトークン（itsdangerous）で
+#     フォームの hidden に持ち回る。最後のページは quiz_result に送る
+#   - トークンの中身は [quiz id, revision, 並びの seed, 回答]。
+#     回答は質問ごと（管理順）の「選んだ選択肢の位置」のビットマスクで、
+#     末尾の未回答は詰める。1問あたり数バイトで、id の列よりずっと小さい
+#   - ランダム表示の質問順は seed から作るので、ページ間で順番が揺れない
+#   - 途中で診断が編集された（revision が変わった）トークンは使わない
+# ============================================================
+
+SALT = "quiz-steps"
+MAX_PAGE_SIZE = 200
+
+
+class StepError(ValueError):
+    """トークンが壊れている・別の診断や古い版のもの。"""
+
+
+class StepState(NamedTuple):
+    seed: int
+    masks: tuple[int, ...]  # 管理順の質問ごとの、選んだ選択肢の位置のビット
+
+
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.secret_key, salt=SALT)
+
+
+def is_paged(quiz) -> bool:
+    return 0 < quiz.page_size < len(quiz.questions)
+
+
+def page_count(quiz) -> int:
+    return -(-len(quiz.questions) // quiz.page_size)
+
+
+def new_state(quiz) -> StepState:
+    seed = random.getrandbits(31) if quiz.display_mode == "random" else 0
+    return StepState(seed, ())
+
+
+def dumps(quiz, state: StepState) -> str:
+    masks = list(state.masks)
+    while masks and not masks[-1]:
+        masks.pop()
+    return _serializer().dumps([quiz.id, quiz.revision, state.seed, masks])
+
+
+def loads(quiz, token: str) -> StepState:
+    """hidden のトークンを読む。空なら最初のページ（ランダム表示では seed が要るのでエラー）。"""
+    if not token:
+        if quiz.display_mode == "random":
+            raise StepError("token required")
+        return new_state(quiz)
+    try:
+        quiz_id, revision, seed, masks = _serializer().loads(token)
+    except (BadSignature, TypeError, ValueError) as e:
+        raise StepError("bad token") from e
+    if quiz_id != quiz.id or revision != quiz.revision:
+        raise StepError("stale token")
+    if not isinstance(seed, int) or not all(isinstance(m, int) and m >= 0 for m in masks):
+        raise StepError("bad token")
+    return StepState(seed, tuple(masks[: len(quiz.questions)]))
+
+
+def clamp_page(quiz, page: int) -> int:
+    return min(max(page, 0), page_count(quiz) - 1)
+
+
+def page_questions(quiz, state: StepState, page: int) -> list:
+    """page（0 始まり）に表示する質問。ランダム表示は seed で並べた順から切り出す。"""
+    questions = list(quiz.questions)
+    if quiz.display_mode == "random":
+        random.Random(state.seed).shuffle(questions)
+    start = page * quiz.page_size
+    return questions[start : start + quiz.page_size]
+
+
+def _index_of(quiz) -> dict[int, int]:
+    return {q.id: i for i, q in enumerate(quiz.questions)}
+
+
+def record(quiz, state: StepState, questions, picked) -> StepState:
+    """questions（表示したページ）の回答を picked（decode_answers の結果）で置き換える。"""
+    index_of = _index_of(quiz)
+    masks = list(state.masks)
+    masks.extend([0] * (len(quiz.questions) - len(masks)))
+    for q in questions:
+        masks[index_of[q.id]] = 0
+    for cid in picked:
+        q = quiz.question_of[cid]
+        i = index_of[q.id]
+        masks[i] |= 1 << q.choice_ids.index(cid)
+    return state._replace(masks=tuple(masks))
+
+
+def picked_ids(quiz, state: StepState, questions=None) -> list[int]:
+    """トークンの回答を choice id の並びに戻す（questions を渡せばその質問の分だけ）。"""
+    if questions is None:
+        pairs = zip(quiz.questions, state.masks)
+    else:
+        index_of = _index_of(quiz)
+        pairs = (
+            (q, state.masks[index_of[q.id]])
+            for q in questions
+            if index_of[q.id] < len(state.masks)
+        )
+    return [
+        cid for q, mask in pairs if mask for n, cid in enumerate(q.choice_ids) if mask >> n & 1
+    ]
+
+
+def answered_count(state: StepState) -> int:
+    return sum(1 for mask in state.masks if mask)
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Hashable
+
+from flask import Flask, Response, current_app, request
+
+import submission_log
+
+# ============================================================
+# 公開の採点エンドポイントのレート制限と負荷制御（プロセス内）
+#   - トークンバケット：(クライアントのアドレス, 診断) ごとに BURST 個まで溜まり、
+#     毎秒 RATE 個ずつ回復する。足りなければ 429 + Retry-After
+#   - バケットは shard（既定 64）に分けて持ち、shard ごとのロックで守る
+#     （スレッド間で1本のロックを取り合わない）。shard ごとに件数の上限があり、
+#     しばらく使われないバケット（TTL）から捨てる
+#   - 負荷制御：処理中の採点リクエスト数・回答ログの書き込み待ち件数・最近の処理時間
+#     （指数移動平均）のどれかが上限を超えていたら 503 + Retry-After。
+#     処理中の枠と処理時間も shard に分けて持つ（全体で1本のロックは使わない）
+#   - どちらもビューの本体（＝DB を読む前）で判定する。レート制限（RATE_LIMIT_ENABLED）は
+#     既定で無効、負荷制御（LOAD_SHED_ENABLED）は既定で有効
+# ============================================================
+
+SHED_MESSAGE = "ただいまアクセスが集中しています。少し時間をおいてからお試しください。"
+LIMIT_MESSAGE = "短時間に送信が続いたため、少し時間をおいてからお試しください。"
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [残りトークン, 最後に補充した時刻]（古いものが先頭）
+        self.buckets: OrderedDict[Hashable, list[float]] = OrderedDict()
+
+
+class TokenBuckets:
+    """キーごとのトークンバケット（shard 分割・件数上限・TTL 付き）。"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_keys: int = 100_000,
+        shards: int = 64,
+        ttl: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.ttl = ttl
+        self.clock = clock
+        self._shards = tuple(_Shard() for _ in range(max(1, shards)))
+        self._per_shard = max(1, max_keys // len(self._shards))
+
+    def acquire(self, key: Hashable, cost: float = 1.0) -> float:
+        """トークンを cost 個使う。使えたら 0、足りなければ回復までの秒数。"""
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = self.clock()
+        with shard.lock:
+            buckets = shard.buckets
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [self.burst, now]
+                self._evict(buckets, now)
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / self.rate if self.rate > 0 else self.ttl
+
+    def _evict(self, buckets: OrderedDict, now: float) -> None:
+        # 先頭（最も長く使われていない）から、期限切れと上限超過の分を捨てる
+        while buckets:
+            _key, (_tokens, last) = next(iter(buckets.items()))
+            if len(buckets) <= self._per_shard and now - last < self.ttl:
+                return
+            buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            with shard.lock:
+                shard.buckets.clear()
+
+
+class _Slots:
+    """LoadShedder の shard。処理中の枠（limit 個まで）と、その枠で測った処理時間。"""
+
+    __slots__ = ("lock", "limit", "inflight", "shed", "latency")
+
+    def __init__(self, limit: int | None):
+        self.lock = threading.Lock()
+        self.limit = limit  # None は無制限
+        self.inflight = 0
+        self.shed = 0
+        self.latency: float | None = None  # 処理時間の指数移動平均（秒）。まだ無ければ None
+
+
+class LoadShedder:
+    """処理中の件数と最近の処理時間から、新しいリクエストを断るかを決める。
+
+    処理中の上限（max_inflight）は shard に分けて持つ（合計がちょうど max_inflight）。
+    スレッドごとに決まった shard から空きを探すので、ふだんは1本のロックを取り合わない。
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = 0,
+        max_backlog: int = 0,
+        latency_target: float = 0.0,
+        smoothing: float = 0.2,
+        shards: int = 8,
+    ):
+        self.max_inflight = max_inflight
+        self.max_backlog = max_backlog
+        self.latency_target = latency_target
+        self.smoothing = smoothing
+        if max_inflight:
+            count = max(1, min(shards, max_inflight))
+            per, extra = divmod(max_inflight, count)
+            self._shards = tuple(_Slots(per + (i < extra)) for i in range(count))
+        else:
+            self._shards = tuple(_Slots(None) for _ in range(max(1, shards)))
+
+    @property
+    def inflight(self) -> int:
+        return sum(slots.inflight for slots in self._shards)
+
+    @property
+    def shed(self) -> int:
+        return sum(slots.shed for slots in self._shards)
+
+    @property
+    def latency(self) -> float:
+        """shard ごとの処理時間の移動平均の平均（秒）。"""
+        measured = [s.latency for s in self._shards if s.latency is not None]
+        return sum(measured) / len(measured) if measured else 0.0
+
+    def enter(self) -> _Slots | None:
+        """受け付けるなら枠を1つ取って返す（終わったら leave に渡す）。断るなら None。"""
+        shards = self._shards
+        home = threading.get_ident() % len(shards)
+        overloaded = (
+            (self.max_backlog and submission_log.writer.backlog >= self.max_backlog)
+            # 処理中が無ければ受け付ける（平均が更新されずに断り続けないように）
+            or (self.latency_target and self.inflight and self.latency > self.latency_target)
+        )
+        if not overloaded:
+            for offset in range(len(shards)):
+                slots = shards[(home + offset) % len(shards)]
+                with slots.lock:
+                    if slots.limit is None or slots.inflight < slots.limit:
+                        slots.inflight += 1
+                        return slots
+        slots = shards[home]
+        with slots.lock:
+            slots.shed += 1
+        return None
+
+    def leave(self, slots: _Slots, elapsed: float) -> None:
+        with slots.lock:
+            slots.inflight -= 1
+            if slots.latency is None:
+                slots.latency = elapsed
+            else:
+                slots.latency += (elapsed - slots.latency) * self.smoothing
+
+
+def _too_many(message: str, status: int, retry_after: float) -> Response:
+    return Response(
+        message,
+        status=status,
+        mimetype="text/plain",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+
+def limited(name: str) -> Callable[[Callable], Callable]:
+    """ビューにレート制限と負荷制御をかけるデコレータ（キーはアドレス・name・URL 引数）。"""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            state = current_app.extensions.get("ratelimit")
+            if state is None:
+                return func(*args, **kwargs)
+            buckets, shedder = state
+            if buckets is not None:
+                key = (request.remote_addr, name, *kwargs.values())
+                wait = buckets.acquire(key)
+                if wait:
+                    return _too_many(LIMIT_MESSAGE, 429, wait)
+            if shedder is None:
+                return func(*args, **kwargs)
+            slots = shedder.enter()
+            if slots is None:
+                return _too_many(SHED_MESSAGE, 503, 1)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                shedder.leave(slots, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def init_app(app: Flask) -> None:
+    """レート制限と負荷制御は別々に有効にする（負荷制御はアドレスに依らないので既定で有効）。"""
+    buckets = shedder = None
+    if app.config.get("RATE_LIMIT_ENABLED", False):
+        buckets = TokenBuckets(
+            rate=float(app.config.get("RATE_LIMIT_RATE", 1.0)),
+            burst=float(app.config.get("RATE_LIMIT_BURST", 30)),
+            max_keys=int(app.config.get("RATE_LIMIT_MAX_KEYS", 100_000)),
+            shards=int(app.config.get("RATE_LIMIT_SHARDS", 64)),
+            ttl=float(app.config.get("RATE_LIMIT_TTL", 600)),
+        )
+    if app.config.get("LOAD_SHED_ENABLED", True):
+        shedder = LoadShedder(
+            max_inflight=int(app.config.get("LOAD_SHED_MAX_INFLIGHT", 32)),
+            max_backlog=int(app.config.get("LOAD_SHED_MAX_BACKLOG", 5000)),
+            latency_target=float(app.config.get("LOAD_SHED_LATENCY_MS", 2000)) / 1000,
+            shards=int(app.config.get("LOAD_SHED_SHARDS", 8)),
+        )
+    if buckets is None and shedder is None:
+        app.extensions.pop("ratelimit", None)
+    else:
+        # (TokenBuckets か None, LoadShedder か None)
+        app.extensions["ratelimit"] = (buckets, shedder)
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from math import prod
+from typing import Mapping, NamedTuple, Sequence
+
+from flask import Flask, current_app
+from sqlalchemy import select
+
+from extensions import db
+from lru import LRUCache
+from models import Submission
+from scoring import optional_numpy  # NumPy は任意（無ければ純 Python で同じ計算）
+
+# ============================================================
+# 合計点の分布（結果レンジの調整用）
+#   - すべての回答の組み合わせについて、合計点ごとの割合を厳密に求める
+#     （質問ごとの点数の分布を畳み込む。組み合わせを列挙しない）
+#       単一選択：選択肢のどれか1つ
+#       複数選択：選択肢の任意の部分集合（未選択を含む）。選択肢1つずつ
+#                 「選ぶ / 選ばない」を畳み込む部分和の計算
+#   - 重みは2通り
+#       uniform  ：どの組み合わせも同じ確率（＝組み合わせの数の割合）
+#       observed ：回答ログ（submission）で各選択肢が選ばれた割合（質問ごとに独立とみなす）
+#   - 到達しうる合計点（重みによらない）、結果ごとの確率、どの結果にも当たらない
+#     到達可能な合計点を出す
+#   - 小さい診断はリクエスト内で計算し、大きい診断と observed はバックグラウンドの
+#     スレッドで計算して (quiz id, revision, 重み, 回答数) ごとに LRU に置く
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+WEIGHTS = ("uniform", "observed")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_pending: dict[tuple, Future] = {}
+
+# (quiz id, revision, 重み, 回答数) -> Distribution か、計算できなかった理由（str）
+result_cache: LRUCache[tuple, object] = LRUCache(64)
+
+
+class AnalysisError(ValueError):
+    """合計点の幅が広すぎて分布を計算しない。"""
+
+
+class BandShare(NamedTuple):
+    band: object  # quiz_cache.ResultBand
+    probability: float
+    totals: int  # この結果に当たる、到達可能な合計点の数
+
+
+class Distribution(NamedTuple):
+    quiz_id: int
+    revision: int
+    weights: str
+    samples: int  # observed の元にした回答数
+    lo: int  # 到達可能な最小の合計点
+    hi: int  # 到達可能な最大の合計点
+    combinations: int  # 回答の組み合わせの数
+    probabilities: tuple[float, ...]  # lo..hi の合計点ごとの確率
+    reachable: tuple[bool, ...]  # lo..hi の合計点ごとに、到達できるか
+    mean: float
+    bands: tuple[BandShare, ...]  # sum 方式のときだけ
+    uncovered: tuple[tuple[int, int], ...]  # どの結果にも当たらない到達可能な合計点の区間
+    uncovered_probability: float
+
+    def histogram(self, max_bins: int = 60) -> list[tuple[int, int, float, bool]]:
+        """(合計点の下限, 上限, 確率, 結果の無い合計点を含むか) の棒。
+
+        幅が広ければ隣り合う合計点をまとめる。
+        """
+        probs = self.probabilities
+        step = max(1, -(-len(probs) // max_bins))
+        bars = []
+        for i in range(0, len(probs), step):
+            lo, hi = self.lo + i, min(self.lo + i + step - 1, self.hi)
+            missed = any(a <= hi and lo <= b for a, b in self.uncovered)
+            bars.append((lo, hi, sum(probs[i : i + step]), missed))
+        return bars
+
+
+# ---------- 畳み込み ----------
+
+def _convolve(a: Sequence[float], b: Sequence[float]):
+    np = optional_numpy()
+    if np is not None:
+        return np.convolve(a, b)
+    out = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                out[i + j] += x * y
+    return out
+
+
+def _clip(values):
+    """0 より大きいところを 1 にする（到達できるかどうかだけを残す）。"""
+    np = optional_numpy()
+    if np is not None:
+        return (np.asarray(values) > 0).astype(float)
+    return [1.0 if v > 0 else 0.0 for v in values]
+
+
+def _single(points: Sequence[int], weights: Sequence[float]) -> tuple[int, list[float]]:
+    """単一選択の (最小点, 点数ごとの確率)。"""
+    lo = min(points)
+    dist = [0.0] * (max(points) - lo + 1)
+    for p, w in zip(points, weights):
+        dist[p - lo] += w
+    return lo, dist
+
+
+def _subset_sum(points: Sequence[int], picks: Sequence[float], clip: bool) -> tuple[int, list]:
+    """複数選択の (最小点, 点数ごとの確率)。選択肢 i を picks[i] の確率で独立に選ぶ。"""
+    offset, dist = 0, [1.0]
+    for p, q in zip(points, picks):
+        if p == 0:  # 選んでも選ばなくても同じ点
+            continue
+        kernel = [0.0] * (abs(p) + 1)
+        kernel[0], kernel[-1] = (1 - q, q) if p > 0 else (q, 1 - q)
+        if p < 0:
+            offset += p
+        dist = _convolve(dist, kernel)
+        if clip:
+            dist = _clip(dist)
+    return offset, dist
+
+
+def _question_weights(q, counts: Mapping[int, int] | None, samples: int) -> list[float]:
+    """選択肢ごとの重み（単一選択は合計 1、複数選択は選ばれる確率）。"""
+    n = len(q.choice_ids)
+    if counts is None or samples == 0:
+        return [0.5] * n if q.multiple else [1 / n] * n
+    picked = [counts.get(cid, 0) for cid in q.choice_ids]
+    if q.multiple:
+        return [min(c / samples, 1.0) for c in picked]
+    total = sum(picked)
+    return [c / total for c in picked] if total else [1 / n] * n
+
+
+def estimated_work(plan) -> int:
+    """計算量の目安（合計点の幅 × 選択肢の数）。"""
+    lo, hi = plan.total_range
+    return (hi - lo + 1) * max(1, sum(len(q.choice_ids) for q in plan.questions))
+
+
+def analyze(
+    plan,
+    counts: Mapping[int, int] | None = None,
+    samples: int = 0,
+    max_width: int = 200_000,
+) -> Distribution:
+    """QuizPlan の合計点の分布。counts（choice id -> 選ばれた回数）があれば observed。"""
+    lo, hi = plan.total_range
+    if hi - lo + 1 > max_width:
+        raise AnalysisError(
+            f"合計点の幅（{lo}〜{hi}）が広すぎるため、分布は計算しません（上限 {max_width}）。"
+        )
+    np = optional_numpy()
+    offset, probs, support = 0, [1.0], [1.0]
+    for q in plan.questions:
+        points = list(q.choice_points)
+        if not points:
+            continue
+        weights = _question_weights(q, counts, samples)
+        if q.multiple:
+            q_lo, q_probs = _subset_sum(points, weights, clip=False)
+            _, q_support = _subset_sum(points, [0.5] * len(points), clip=True)
+        else:
+            q_lo, q_probs = _single(points, weights)
+            q_support = _single(points, [1.0] * len(points))[1]
+        offset += q_lo
+        probs = _convolve(probs, q_probs)
+        support = _clip(_convolve(support, q_support))
+    if np is not None:
+        probs, support = np.asarray(probs).tolist(), np.asarray(support).tolist()
+
+    # 端の到達できない合計点を落とす（total_range は上下限の見積もり）
+    reachable = [v > 0 for v in support]
+    first = reachable.index(True)
+    last = len(reachable) - 1 - reachable[::-1].index(True)
+    probs, reachable = probs[first : last + 1], reachable[first : last + 1]
+    lo = offset + first
+    hi = offset + last
+    scale = sum(probs) or 1.0
+    probs = [p / scale for p in probs]
+
+    bands: list[BandShare] = []
+    covered = [False] * len(probs)
+    if plan.scoring_mode != "trait":
+        shares: dict[int, list] = {band.id: [0.0, 0] for band in plan.results}
+        index = plan.band_index
+        for start, end, owner in zip(index.starts, index.ends, index.owners):
+            a, b = max(start, lo) - lo, min(end, hi) - lo
+            if a > b:
+                continue
+            shares[owner.id][0] += sum(probs[a : b + 1])
+            shares[owner.id][1] += sum(reachable[a : b + 1])
+            covered[a : b + 1] = [True] * (b - a + 1)
+        bands = [BandShare(band, *shares[band.id]) for band in plan.results]
+
+    uncovered: list[tuple[int, int]] = []
+    missed = 0.0
+    if plan.scoring_mode != "trait":
+        for i, (ok, hit) in enumerate(zip(reachable, covered)):
+            if not ok or hit:
+                continue
+            missed += probs[i]
+            if uncovered and uncovered[-1][1] == lo + i - 1:
+                uncovered[-1] = (uncovered[-1][0], lo + i)
+            else:
+                uncovered.append((lo + i, lo + i))
+
+    return Distribution(
+        quiz_id=plan.id,
+        revision=plan.revision,
+        weights="observed" if counts is not None else "uniform",
+        samples=samples,
+        lo=lo,
+        hi=hi,
+        combinations=prod(
+            (2 ** len(q.choice_ids) if q.multiple else len(q.choice_ids))
+            for q in plan.questions
+            if q.choice_ids
+        ),
+        probabilities=tuple(probs),
+        reachable=tuple(reachable),
+        mean=sum((lo + i) * p for i, p in enumerate(probs)),
+        bands=tuple(bands),
+        uncovered=tuple(uncovered),
+        uncovered_probability=missed,
+    )
+
+
+# ---------- 回答ログの集計 ----------
+
+def choice_counts(quiz_id: int, batch_size: int = 1000) -> tuple[dict[int, int], int]:
+    """回答ログから (choice id -> 選ばれた回数, 回答数)。"""
+    counts: dict[int, int] = {}
+    samples = 0
+    rows = db.session.scalars(
+        select(Submission.choice_ids)
+        .where(Submission.quiz_id == quiz_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for raw in rows:
+        samples += 1
+        for part in raw.split(","):
+            if part:
+                cid = int(part)
+                counts[cid] = counts.get(cid, 0) + 1
+    return counts, samples
+
+
+# ---------- バックグラウンド計算 ----------
+
+def _compute(plan, weights: str, max_width: int) -> object:
+    try:
+        if weights == "observed":
+            counts, samples = choice_counts(plan.id)
+            return analyze(plan, counts, samples, max_width=max_width)
+        return analyze(plan, max_width=max_width)
+    except AnalysisError as e:
+        return str(e)
+
+
+def _run(app: Flask, key: tuple, plan, weights: str) -> None:
+    try:
+        with app.app_context():
+            max_width = int(app.config.get("SCORE_ANALYSIS_MAX_WIDTH", 200_000))
+            result_cache.put(key, _compute(plan, weights, max_width))
+    except Exception:
+        log.exception("failed to analyze score distribution of quiz %s", plan.id)
+    finally:
+        with _executor_lock:
+            _pending.pop(key, None)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(current_app.config.get("SCORE_ANALYSIS_WORKERS", 1))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score-analysis")
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def distribution(plan, weights: str = "uniform", samples: int = 0) -> object | None:
+    """計算済みの分布（か計算できなかった理由の str）。まだなら予約して None。
+
+    samples は observed のキャッシュキー（回答数が変われば計算し直す）。
+    uniform で小さい診断はその場で計算する。
+    """
+    key = (plan.id, plan.revision, weights, samples if weights == "observed" else 0)
+    found = result_cache.get(key)
+    if found is not None:
+        return found
+    config = current_app.config
+    if weights == "uniform" and estimated_work(plan) <= config.get(
+        "SCORE_ANALYSIS_INLINE_LIMIT", 50_000
+    ):
+        found = _compute(plan, weights, int(config.get("SCORE_ANALYSIS_MAX_WIDTH", 200_000)))
+        result_cache.put(key, found)
+        return found
+    app = current_app._get_current_object()
+    with _executor_lock:
+        if key not in _pending:
+            _pending[key] = _get_executor().submit(_run, app, key, plan, weights)
+    return None
+
+
+def init_app(app: Flask) -> None:
+    result_cache.maxsize = int(app.config.get("SCORE_ANALYSIS_CACHE_SIZE", 64))
+    result_cache.clear()
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import cache
+from typing import Iterable, Mapping, Sequence
+
+# ============================================================
+# 採点まわりの純粋関数群（DB に依存しない）
+#   - 回答フォームのデコードと合計点の計算
+#   - 結果レンジ（min_total / max_total）の区間インデックス
+#   - レンジの重なり・すき間チェック
+# ============================================================
+
+# min_total / max_total が空欄（None）のときの「無制限」
+NO_LIMIT = 10**9
+
+# 到達しうる合計点の幅がこれ以下なら total -> 結果 の表を丸ごと作る
+DENSE_TABLE_LIMIT = 4096
+
+
+@cache
+def optional_numpy():
+    """NumPy があれば返す（無ければ None）。
+
+    import に時間がかかるので、起動時ではなく最初に使うときに読み込む。
+    """
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - 環境依存
+        return None
+    return numpy
+
+
+def decode_answers(fields: Mapping[str, object], form) -> list[int]:
+    """回答フォームを1パスで読み、有効な choice id を重複なしで返す。
+
+    fields は「フィールド名（q-<question id>）-> 質問」の対応表で、質問は
+    multiple と choice_set（その質問に属する choice id の集合）を持つ。
+      - 対応表に無いフィールドは無視
+      - その質問に属さない id・数値でない値は捨てる
+      - 単一選択は先頭の値だけを見る（2つ目以降は無視）
+    """
+    return _decode_lists(fields, form.lists())
+
+
+def _decode_lists(fields: Mapping[str, object], pairs) -> list[int]:
+    picked: list[int] = []
+    seen: set[int] = set()
+    for field, values in pairs:
+        q = fields.get(field)
+        if q is None:
+            continue
+        if not q.multiple:
+            values = values[:1]
+        for v in values:
+            try:
+                cid = int(v)
+            except (TypeError, ValueError):
+                continue
+            if cid in q.choice_set and cid not in seen:
+                seen.add(cid)
+                picked.append(cid)
+    return picked
+
+
+def decode_answer_set(
+    fields: Mapping[str, object], question_of: Mapping[int, object], answer
+) -> list[int] | None:
+    """JSON の回答1件を decode_answers と同じ規則で choice id の並びにする。
+
+    answer は {"q-<id>": choice id または choice id のリスト} か、choice id の
+    リストのどちらか。リストの場合は question_of（choice id -> 質問）で
+    質問ごとに振り分ける。どちらでもなければ None。
+    """
+    if isinstance(answer, Mapping):
+        pairs = [(k, v if isinstance(v, list) else [v]) for k, v in answer.items()]
+    elif isinstance(answer, list):
+        grouped: dict[str, list[int]] = {}
+        for v in answer:
+            try:
+                cid = int(v)
+            except (TypeError, ValueError):
+                continue
+            q = question_of.get(cid)
+            if q is not None:
+                grouped.setdefault(q.field, []).append(cid)
+        pairs = grouped.items()
+    else:
+        return None
+    return _decode_lists(fields, pairs)
+
+
+def score_total(points: Mapping[int, int], picked: Iterable[int]) -> int:
+    """choice id -> 点数 の表から合計点を出す（表に無い id は 0 点）。"""
+    get = points.get
+    return sum(get(cid, 0) for cid in picked)
+
+
+def score_totals(points: Mapping[int, int], picked_sets: Sequence[Sequence[int]]) -> list[int]:
+    """複数の回答の合計点をまとめて出す（NumPy があれば1回の bincount）。"""
+    np = optional_numpy()
+    if np is None:
+        return [score_total(points, picked) for picked in picked_sets]
+    get = points.get
+    flat = [get(cid, 0) for picked in picked_sets for cid in picked]
+    owner = np.repeat(
+        np.arange(len(picked_sets)), [len(picked) for picked in picked_sets]
+    )
+    totals = np.bincount(owner, weights=flat, minlength=len(picked_sets))
+    return totals.astype(np.int64).tolist()
+
+
+def band_range(band) -> tuple[int, int]:
+    lo = band.min_total if band.min_total is not None else -NO_LIMIT
+    hi = band.max_total if band.max_total is not None else NO_LIMIT
+    return lo, hi
+
+
+def total_range(questions) -> tuple[int, int]:
+    """回答として到達しうる合計点の [最小, 最大] を返す。
+
+    単一選択は必須回答なので選択肢の最小/最大、複数選択は任意の部分集合
+    （未選択を含む）なので負の点の和〜正の点の和。選択肢が無い質問は 0。
+    """
+    lo = hi = 0
+    for q in questions:
+        points = list(q.choice_points)
+        if not points:
+            continue
+        if q.multiple:
+            lo += sum(p for p in points if p < 0)
+            hi += sum(p for p in points if p > 0)
+        else:
+            lo += min(points)
+            hi += max(points)
+    return lo, hi
+
+
+class BandIndex:
+    """結果レンジの区間インデックス。
+
+    レンジが重なる場合は id の小さい結果（＝先に登録した結果）を優先する。
+    重なりを解消した「互いに素な区間」を開始点でソートして持ち、bisect で
+    O(log n) に引く。到達範囲が狭い診断では total -> 結果 の表で O(1)。
+    """
+
+    __slots__ = ("starts", "ends", "owners", "dense_lo", "dense")
+
+    def __init__(
+        self,
+        bands: Iterable,
+        reachable: tuple[int, int] | None = None,
+        dense_limit: int = DENSE_TABLE_LIMIT,
+    ):
+        bands = sorted(bands, key=lambda b: b.id)
+        ranges = [band_range(b) for b in bands]
+
+        # 境界点で数直線を区切り、各区間の持ち主（優先度最上位の結果）を決める
+        points = sorted({p for lo, hi in ranges if lo <= hi for p in (lo, hi + 1)})
+        starts, ends, owners = array("q"), array("q"), []
+        for start, stop in zip(points, points[1:]):
+            owner = next(
+                (b for b, (lo, hi) in zip(bands, ranges) if lo <= start <= hi),
+                None,
+            )
+            if owner is None:
+                continue
+            if owners and owners[-1] is owner and ends[-1] == start - 1:
+                ends[-1] = stop - 1
+            else:
+                starts.append(start)
+                ends.append(stop - 1)
+                owners.append(owner)
+
+        self.starts = starts
+        self.ends = ends
+        self.owners = tuple(owners)
+        self.dense_lo = 0
+        self.dense: tuple | None = None
+        if reachable is not None and reachable[1] - reachable[0] < dense_limit:
+            self.dense_lo = reachable[0]
+            self.dense = tuple(
+                self._bisect(t) for t in range(reachable[0], reachable[1] + 1)
+            )
+
+    def _bisect(self, total: int):
+        i = bisect_right(self.starts, total) - 1
+        if i >= 0 and total <= self.ends[i]:
+            return self.owners[i]
+        return None
+
+    def lookup(self, total: int):
+        dense = self.dense
+        if dense is not None:
+            offset = total - self.dense_lo
+            if 0 <= offset < len(dense):
+                return dense[offset]
+        return self._bisect(total)
+
+    def lookup_many(self, totals: Sequence[int]) -> list:
+        """lookup をまとめて行う（NumPy があれば searchsorted で一括）。"""
+        np = optional_numpy()
+        if np is None or self.dense is not None:
+            lookup = self.lookup
+            return [lookup(t) for t in totals]
+        owners = self.owners
+        if not owners:
+            return [None] * len(totals)
+        values = np.asarray(totals, dtype=np.int64)
+        idx = np.searchsorted(np.frombuffer(self.starts, dtype=np.int64), values, "right") - 1
+        ends = np.frombuffer(self.ends, dtype=np.int64)
+        hit = (idx >= 0) & (values <= ends[np.maximum(idx, 0)])
+        return [owners[i] if ok else None for i, ok in zip(idx.tolist(), hit.tolist())]
+
+    def covered(self) -> list[tuple[int, int]]:
+        """いずれかの結果が当たる区間（連続区間はまとめる）。"""
+        merged: list[tuple[int, int]] = []
+        for lo, hi in zip(self.starts, self.ends):
+            if merged and merged[-1][1] + 1 >= lo:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+            else:
+                merged.append((lo, hi))
+        return merged
+
+
+@dataclass(frozen=True)
+class BandIssue:
+    kind: str  # "overlap" / "gap" / "empty"
+    message: str
+
+
+def _fmt(lo: int, hi: int) -> str:
+    return str(lo) if lo == hi else f"{lo}〜{hi}"
+
+
+def uncovered_ranges(index: BandIndex, reachable: tuple[int, int]) -> list[tuple[int, int]]:
+    """reachable の範囲のうち、どの結果にも当たらない区間。"""
+    lo, hi = reachable
+    gaps: list[tuple[int, int]] = []
+    cursor = lo
+    for c_lo, c_hi in index.covered():
+        if c_hi < cursor:
+            continue
+        if c_lo > hi:
+            break
+        if c_lo > cursor:
+            gaps.append((cursor, c_lo - 1))
+        cursor = max(cursor, c_hi + 1)
+    if cursor <= hi:
+        gaps.append((cursor, hi))
+    return gaps
+
+
+def check_bands(bands: Sequence, reachable: tuple[int, int]) -> list[BandIssue]:
+    """結果レンジの重なり・すき間・逆転（最小 > 最大）を列挙する。"""
+    issues: list[BandIssue] = []
+    bands = sorted(bands, key=lambda b: b.id)
+    valid = []
+    for b in bands:
+        lo, hi = band_range(b)
+        if lo > hi:
+            issues.append(
+                BandIssue(
+                    "empty",
+                    f"『{b.title}』は最小 {lo} が最大 {hi} より大きく、判定に使われません。",
+                )
+            )
+        else:
+            valid.append((lo, hi, b))
+
+    # 重なり：開始点でソートして隣接比較（優先されるのは id の小さい方）
+    valid.sort(key=lambda t: (t[0], t[2].id))
+    active: list[tuple[int, int, object]] = []
+    for lo, hi, b in valid:
+        active = [a for a in active if a[1] >= lo]
+        for a_lo, a_hi, a in active:
+            first, second = (a, b) if a.id < b.id else (b, a)
+            issues.append(
+                BandIssue(
+                    "overlap",
+                    f"『{first.title}』と『{second.title}』のレンジが "
+                    f"{_fmt(max(a_lo, lo), min(a_hi, hi))} で重なっています"
+                    f"（『{first.title}』が優先されます）。",
+                )
+            )
+        active.append((lo, hi, b))
+
+    index = BandIndex(bands)
+    for g_lo, g_hi in uncovered_ranges(index, reachable):
+        issues.append(
+            BandIssue(
+                "gap",
+                f"合計 {_fmt(g_lo, g_hi)} に該当する結果がありません"
+                f"（到達しうる範囲は {_fmt(*reachable)}）。",
+            )
+        )
+    return issues
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from functools import wraps
+from typing import Callable, TypeVar
+
+from flask import Flask, current_app, request, session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+# ============================================================
+# SQLite のエンジン設定（プロファイル）と書き込みの直列化
+#   - SQLITE_PROFILE=production で WAL などの PRAGMA を接続ごとに設定し、
+#     マルチスレッドの WSGI サーバー向けにプールの大きさを決める
+#   - 管理画面の書き込みは @serialized_write でプロセス内の1本の列に並べ、
+#     SQLITE_BUSY（database is locked）なら少し待って数回だけやり直す
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 接続ごとに実行する PRAGMA（プロファイル名 -> 値）
+PROFILES: dict[str, dict[str, object]] = {
+    "default": {},
+    "production": {
+        "journal_mode": "WAL",  # 読み取りが書き込みを待たない
+        "synchronous": "NORMAL",  # WAL なら NORMAL でもクラッシュで壊れない
+        "cache_size": -20000,  # 約 20MB（負数は KiB 単位）
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # ミリ秒。ロック中はこの時間まで待つ
+    },
+}
+
+# プロセス内の書き込みを1本にする（ワーカープロセス間は busy_timeout とリトライで）
+_write_lock = threading.RLock()
+
+
+def _is_sqlite(app: Flask) -> bool:
+    return str(app.config.get("SQLALCHEMY_DATABASE_URI", "")).startswith("sqlite")
+
+
+def _pragmas(app: Flask) -> dict[str, object]:
+    name = app.config.get("SQLITE_PROFILE", "default")
+    if name not in PROFILES:
+        raise ValueError(f"unknown SQLITE_PROFILE: {name!r} (choose from {sorted(PROFILES)})")
+    pragmas = dict(PROFILES[name])
+    if ":memory:" in str(app.config.get("SQLALCHEMY_DATABASE_URI")):
+        pragmas.pop("journal_mode", None)  # メモリ DB は WAL にできない
+        pragmas.pop("mmap_size", None)
+    return pragmas
+
+
+def configure_engine(app: Flask) -> None:
+    """プロファイルに合わせて SQLALCHEMY_ENGINE_OPTIONS を補う（db.init_app より前に呼ぶ）。"""
+    if not _is_sqlite(app) or not _pragmas(app):
+        return
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    connect_args = dict(options.get("connect_args") or {})
+    # sqlite3 側の待ち時間（秒）も busy_timeout に揃える
+    connect_args.setdefault("timeout", int(_pragmas(app).get("busy_timeout", 5000)) / 1000)
+    connect_args.setdefault("check_same_thread", False)
+    options["connect_args"] = connect_args
+    options.setdefault("pool_size", int(app.config.get("SQLITE_POOL_SIZE", 10)))
+    options.setdefault("max_overflow", int(app.config.get("SQLITE_POOL_OVERFLOW", 10)))
+    options.setdefault("pool_timeout", 10)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def init_app(app: Flask) -> None:
+    """新しい接続ごとに PRAGMA を実行するリスナーを登録する（db.init_app の後に呼ぶ）。"""
+    app.extensions["sqlite_write_retries"] = int(app.config.get("SQLITE_WRITE_RETRIES", 3))
+    if not _is_sqlite(app):
+        return
+    pragmas = _pragmas(app)
+    if not pragmas:
+        return
+
+    def apply_pragmas(dbapi_conn, _record) -> None:
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value};")
+        finally:
+            cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, "connect", apply_pragmas)
+
+
+def _is_busy(exc: OperationalError) -> bool:
+    message = str(exc.orig).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def run_serialized(func: Callable[[], T], retries: int = 3, delay: float = 0.05) -> T:
+    """func をプロセス内の書き込みロックの下で実行し、BUSY なら待ってやり直す。
+
+    やり直しの前には db.session をロールバックする（func は最初から実行し直される）。
+    """
+    attempt = 0
+    while True:
+        with _write_lock:
+            try:
+                return func()
+            except OperationalError as exc:
+                if not _is_busy(exc) or attempt >= retries:
+                    raise
+                db.session.rollback()
+        attempt += 1
+        log.info("database is busy; retrying write (%d/%d)", attempt, retries)
+        time.sleep(delay * (2 ** (attempt - 1)))
+
+
+def serialized_write(func: Callable) -> Callable:
+    """管理画面の書き込み（GET/HEAD 以外）を run_serialized で実行するデコレータ。"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            return func(*args, **kwargs)
+
+        # やり直す場合は、失敗した回に積まれた flash を捨て、アップロードを先頭から読み直す
+        flashes = list(session.get("_flashes", ()))
+
+        def attempt():
+            if session.get("_flashes", []) != flashes:
+                session["_flashes"] = list(flashes)
+            for upload in request.files.values():
+                upload.stream.seek(0)
+            return func(*args, **kwargs)
+
+        retries = current_app.extensions.get("sqlite_write_retries", 3)
+        return run_serialized(attempt, retries=retries)
+
+    return wrapper
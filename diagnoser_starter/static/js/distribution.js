@@ -0,0 +1,21 @@
+(function () {
+  // 合計点の分布がバックグラウンドで計算中なら、できあがるまで待って再読み込みする
+  const pending = document.getElementById("distribution-pending");
+  if (!pending) return;
+
+  let delay = 1000;
+  function poll() {
+    fetch(pending.dataset.url, { credentials: "same-origin", headers: { Accept: "application/json" } })
+      .then(res => (res.ok ? res.json() : null))
+      .then(data => {
+        if (data && data.ready) {
+          location.reload();
+          return;
+        }
+        delay = Math.min(delay * 1.5, 10000);
+        setTimeout(poll, delay);
+      })
+      .catch(() => {});
+  }
+  setTimeout(poll, delay);
+})();
@@ -0,0 +1,34 @@
+// 質問一覧の行をドラッグで並べ替え、並び順をまとめて1回で保存する
+(function () {
+  const rows = document.getElementById("question-rows");
+  const form = document.getElementById("reorder-form");
+  if (!rows || !form) return;
+
+  let dragging = null;
+
+  rows.addEventListener("dragstart", (e) => {
+    dragging = e.target.closest("tr[data-question-id]");
+    if (dragging) e.dataTransfer.effectAllowed = "move";
+  });
+
+  rows.addEventListener("dragover", (e) => {
+    const over = e.target.closest("tr[data-question-id]");
+    if (!dragging || !over || over === dragging) return;
+    e.preventDefault();
+    const box = over.getBoundingClientRect();
+    const after = e.clientY > box.top + box.height / 2;
+    rows.insertBefore(dragging, after ? over.nextSibling : over);
+  });
+
+  rows.addEventListener("dragend", () => {
+    if (!dragging) return;
+    dragging = null;
+    const ids = Array.from(rows.querySelectorAll("tr[data-question-id]"), tr => tr.dataset.questionId);
+    // 表示上の番号を振り直し、保存ボタンを出す
+    rows.querySelectorAll("tr[data-question-id]").forEach((tr, n) => {
+      tr.cells[0].textContent = String(n + 1);
+    });
+    form.elements.order.value = ids.join(",");
+    form.hidden = false;
+  });
+})();
@@ -3,36 +3,39 @@
   if (!wrap) return;
 
   const total = Number(wrap.dataset.total || 0);
+  // ページ分割のときは、前のページまでに答えた数（このページの分は下で数える）
+  const before = Number(wrap.dataset.answered || 0);
   const fill = wrap.querySelector(".progress-fill");
   const text = wrap.querySelector(".progress-text");
 
-  // 質問セクション単位で「少なくとも1つ選ばれているか」を数える
-  function countAnswered() {
-    const sections = document.querySelectorAll('[data-question]');
-    let answered = 0;
-    sections.forEach(sec => {
-      // そのセクション内の input でチェックされているものが1つでもあるか？
-      const checked = sec.querySelector('input[type="radio"]:checked, input[type="checkbox"]:checked');
-      if (checked) answered += 1;
-    });
-    return answered;
+  // 回答済みの質問セクション。変化のあったセクションだけ調べて出し入れする
+  const answered = new Set();
+
+  function isAnswered(sec) {
+    return sec.querySelector('input[type="radio"]:checked, input[type="checkbox"]:checked') !== null;
   }
 
   function updateProgress() {
-    const answered = countAnswered();
-    const pct = total > 0 ? Math.round((answered / total) * 100) : 0;
+    const count = before + answered.size;
+    const pct = total > 0 ? Math.round((count / total) * 100) : 0;
     if (fill) fill.style.width = pct + "%";
-    if (text) text.textContent = `${answered} / ${total}`;
+    if (text) text.textContent = `${count} / ${total}`;
   }
 
-  // 入力の変化を監視
+  // 入力の変化を監視（変わった input のセクションだけを見直す）
   document.addEventListener('change', (e) => {
     const t = e.target;
-    if (t && (t.matches('input[type="radio"]') || t.matches('input[type="checkbox"]'))) {
-      updateProgress();
-    }
+    if (!t || !(t.matches('input[type="radio"]') || t.matches('input[type="checkbox"]'))) return;
+    const sec = t.closest('[data-question]');
+    if (!sec) return;
+    if (t.checked || isAnswered(sec)) answered.add(sec);
+    else answered.delete(sec);
+    updateProgress();
   });
 
-  // 初期描画
+  // 初期描画（「戻る」で復元した回答や、ブラウザが復元した入力を1回だけ数える）
+  document.querySelectorAll('[data-question]').forEach(sec => {
+    if (isAnswered(sec)) answered.add(sec);
+  });
   updateProgress();
 })();
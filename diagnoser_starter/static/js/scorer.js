@@ -0,0 +1,90 @@
+// 静的書き出し（flask export-static）のページ用：点数表で採点して結果をその場に表示する
+// 判定は QuizPlan.evaluate と同じ（重複は1回、レンジの重なりは先の結果、Trait の同点は先の Trait）
+(function () {
+  const form = document.querySelector("form[data-scoring]");
+  if (!form) return;
+
+  let table = null;
+  function load() {
+    if (table) return Promise.resolve(table);
+    return fetch(form.dataset.scoring)
+      .then(r => { if (!r.ok) throw new Error(r.status); return r.json(); })
+      .then(t => (table = t));
+  }
+
+  function shuffle(items) {
+    for (let i = items.length - 1; i > 0; i--) {
+      const j = Math.floor(Math.random() * (i + 1));
+      [items[i], items[j]] = [items[j], items[i]];
+    }
+    return items;
+  }
+
+  // ランダム表示（書き出した HTML は管理順なので、ここで並べ替える）
+  if (form.dataset.displayMode === "random") {
+    const sections = Array.from(form.querySelectorAll("[data-question]"));
+    if (sections.length) {
+      const anchor = sections[sections.length - 1].nextSibling;
+      shuffle(sections).forEach((sec, n) => {
+        form.insertBefore(sec, anchor);
+        const h = sec.querySelector("h3");
+        if (h && h.firstChild) h.firstChild.nodeValue = h.firstChild.nodeValue.replace(/Q\d+\./, `Q${n + 1}.`);
+      });
+    }
+  }
+  if (form.dataset.choiceMode === "random") {
+    form.querySelectorAll(".choices").forEach(box => {
+      shuffle(Array.from(box.querySelectorAll("label.choice"))).forEach(label => box.appendChild(label));
+    });
+  }
+
+  function evaluate(t, picked) {
+    let total = 0;
+    picked.forEach(id => { total += t.points[id] || 0; });
+    if (t.mode === "trait") {
+      const scores = t.traits.map(() => 0);
+      picked.forEach(id => (t.trait_points[id] || []).forEach((v, j) => { scores[j] += v; }));
+      let best = -1;
+      scores.forEach((v, j) => { if (best < 0 || v > scores[best]) best = j; });
+      const index = best < 0 ? null : t.trait_results[best];
+      return { total, scores, result: index == null ? null : t.results[index] };
+    }
+    const band = t.bands.find(b => b[0] <= total && total <= b[1]);
+    return { total, scores: null, result: band ? t.results[band[2]] : null };
+  }
+
+  function show(t, outcome) {
+    const box = document.getElementById("static-result");
+    const set = (sel, text) => { box.querySelector(sel).textContent = text; };
+    const list = box.querySelector("[data-result-traits]");
+    list.replaceChildren();
+    if (!outcome.result) {
+      set("[data-result-title]", "結果を判定できませんでした");
+      set("[data-result-total]", "");
+      set("[data-result-description]", "");
+    } else {
+      set("[data-result-title]", outcome.result.title);
+      set("[data-result-total]", outcome.scores ? "" : `合計スコア：${outcome.total}`);
+      set("[data-result-description]", outcome.result.description);
+      (outcome.scores || []).forEach((v, j) => {
+        const li = document.createElement("li");
+        li.textContent = `${t.traits[j]}：${v}`;
+        list.appendChild(li);
+      });
+    }
+    box.hidden = false;
+    box.scrollIntoView({ behavior: "smooth", block: "start" });
+  }
+
+  // 最初の回答で点数表を読み始めておく
+  form.addEventListener("change", () => { load().catch(() => {}); }, { once: true });
+  form.addEventListener("submit", (e) => {
+    e.preventDefault();
+    const picked = Array.from(new Set(
+      Array.from(form.querySelectorAll("input:checked"), i => i.value)
+    ));
+    load().then(t => show(t, evaluate(t, picked))).catch(() => {
+      alert("採点表を読み込めませんでした。時間をおいて再度お試しください。");
+    });
+  });
+})();
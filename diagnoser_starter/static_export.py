@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import NamedTuple
+
+from flask import Flask, g, render_template
+from sqlalchemy import select
+
+import assets
+import catalog
+import uploads
+from extensions import db
+from form_fragments import render_questions
+from models import Quiz
+from quiz_cache import get_plan
+
+# ============================================================
+# 公開ページの静的書き出し（flask export-static）
+#   - トップ（カタログの各ページ）と各診断ページを HTML に描画して書き出す
+#       index.html / page/<after>/index.html / quiz/<id>/index.html
+#   - 採点はブラウザで行う。診断ごとに点数表（quiz/<id>/scoring.json）を出し、
+#     js/scorer.js が合計点・Trait 合計から結果を判定してその場に表示する
+#   - /assets/（ハッシュ付きの CSS・JS と .gz / .br）と /media/（画像）もコピーする
+#   - export-manifest.json に書き出した各診断の [revision, updated_at] を記録し、
+#     次回はどちらかが変わった診断だけ描画し直す（消えた診断のディレクトリは削除）。
+#     id は削除後に再利用され、作り直した診断の revision は 0 から数え直すので、
+#     revision だけでは別の診断と見分けられない。
+#     内容が同じファイルは書き直さないので、更新時刻で同期するツールとも相性がよい
+#   - ページ分割（page_size）の診断も1ページにまとめて書き出す
+# ============================================================
+
+MANIFEST = "export-manifest.json"
+# 書き出しの形式・テンプレートを変えたら上げる（上がったら全件描画し直す）
+EXPORT_VERSION = 2
+
+
+class ExportReport(NamedTuple):
+    rendered: int  # 描画し直した診断
+    skipped: int  # 変更が無く描画しなかった診断
+    removed: int  # 消えた診断
+    written: int  # 実際に書き換えたファイル
+
+
+class _Writer:
+    """内容が変わったファイルだけを書く。"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.written = 0
+
+    def path(self, relpath: str) -> str:
+        return os.path.join(self.root, *relpath.split("/"))
+
+    def write(self, relpath: str, data: str | bytes) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = self.path(relpath)
+        try:
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.written += 1
+
+    def copy_missing(self, src_dir: str, relpath: str, names) -> None:
+        """内容ハッシュの名前のファイル（中身が変わらない）を、無いものだけコピーする。"""
+        for name in names:
+            target = self.path(f"{relpath}/{name}")
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(src_dir, name), target + ".part")
+            os.replace(target + ".part", target)
+            self.written += 1
+
+
+# ---------- 採点表 ----------
+
+def scoring_table(plan) -> dict:
+    """ブラウザで採点するための点数表（QuizPlan.evaluate と同じ判定をする）。"""
+    results = list(plan.results)
+    index_of = {band.id: i for i, band in enumerate(results)}
+    table = {
+        "quiz": plan.id,
+        "revision": plan.revision,
+        "mode": plan.scoring_mode,
+        # 0 点の選択肢は省く
+        "points": {str(cid): pts for cid, pts in plan.points.items() if pts},
+        "results": [{"title": r.title, "description": r.description} for r in results],
+        # 重なりを解消済みの区間 [start, end, 結果の位置]（scoring.BandIndex）
+        "bands": [
+            [start, end, index_of[owner.id]]
+            for start, end, owner in zip(
+                plan.band_index.starts, plan.band_index.ends, plan.band_index.owners
+            )
+        ],
+    }
+    if plan.scoring_mode == "trait":
+        rows = {}
+        for q in plan.questions:
+            for cid in q.choice_ids:
+                row = plan.trait_scores([cid])
+                if any(row):
+                    rows[str(cid)] = row
+        table.update(
+            traits=[t.name for t in plan.traits],
+            trait_points=rows,
+            # Trait の並び（id 順。同点は先の Trait）-> 結果の位置
+            trait_results=[
+                index_of[plan.trait_results[t.id].id] if t.id in plan.trait_results else None
+                for t in plan.traits
+            ],
+        )
+    return table
+
+
+# ---------- 書き出し ----------
+
+def _render_quiz(plan) -> str:
+    # 表示順のランダム化はブラウザ側（scorer.js）で行う。ここでは管理順
+    items = [(q, q.choices) for q in plan.questions]
+    return render_template(
+        "public/quiz_form.html",
+        quiz=plan,
+        total=len(items),
+        questions=render_questions(plan, items),
+        scoring_url=f"/quiz/{plan.id}/scoring.json",
+    )
+
+
+def _export_catalog(out: _Writer) -> set[str]:
+    """カタログの全ページを書き、書いたパスを返す。"""
+    paths = set()
+    after = 0
+    while True:
+        page = catalog.render_page(after)
+        relpath = "index.html" if not after else f"page/{after}/index.html"
+        out.write(relpath, render_template("public/index.html", catalog_html=page.html))
+        paths.add(relpath)
+        if page.next_after is None:
+            return paths
+        after = page.next_after
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _quiz_stamp(revision: int | None, updated_at: datetime | None) -> list:
+    """マニフェストに記録する、診断の版の印（JSON に書けるリスト）。"""
+    return [revision or 0, updated_at.isoformat() if updated_at else None]
+
+
+def export_site(app: Flask, output: str, full: bool = False) -> ExportReport:
+    """公開ページを output に書き出す。full=False なら変更のあった診断だけ描画する。"""
+    out = _Writer(output)
+    os.makedirs(output, exist_ok=True)
+    manifest_path = os.path.join(output, MANIFEST)
+    previous = _load_manifest(manifest_path)
+    stamp = {
+        "version": EXPORT_VERSION,
+        "assets": app.extensions.get("assets_version"),
+        "year": datetime.now().year,  # フッターの年
+    }
+    # 形式・アセット・年が変わった（か full）なら全件描画し直す
+    rerender = full or any(previous.get(k) != v for k, v in stamp.items())
+    done: dict[str, list] = {} if rerender else dict(previous.get("quizzes", {}))
+
+    rendered = skipped = removed = 0
+    with app.test_request_context("/"):
+        g.static_export = True
+        rows = db.session.execute(
+            select(Quiz.id, Quiz.revision, Quiz.updated_at).order_by(Quiz.id)
+        )
+        stamps = {str(qid): _quiz_stamp(rev, at) for qid, rev, at in rows}
+        for key, quiz_stamp in stamps.items():
+            if done.get(key) == quiz_stamp and os.path.exists(out.path(f"quiz/{key}/index.html")):
+                skipped += 1
+                continue
+            plan = get_plan(int(key))
+            if plan is None:  # 読み込みの間に消えた
+                continue
+            out.write(f"quiz/{key}/index.html", _render_quiz(plan))
+            out.write(
+                f"quiz/{key}/scoring.json",
+                json.dumps(scoring_table(plan), ensure_ascii=False, separators=(",", ":")),
+            )
+            done[key] = _quiz_stamp(plan.revision, plan.updated_at)
+            rendered += 1
+        # 消えた診断
+        for key in set(previous.get("quizzes", {})) - set(stamps):
+            shutil.rmtree(out.path(f"quiz/{key}"), ignore_errors=True)
+            done.pop(key, None)
+            removed += 1
+
+        pages = _export_catalog(out)
+        for old in set(previous.get("pages", [])) - pages:
+            shutil.rmtree(os.path.dirname(out.path(old)), ignore_errors=True)
+
+    # ハッシュ付きのアセットと画像（名前が同じなら中身も同じ）
+    manifest = app.extensions.get("assets") or {}
+    dist = os.path.join(app.static_folder, assets.DIST_DIR)
+    names = [
+        name + suffix
+        for name in manifest.values()
+        for suffix in ("", ".gz", ".br")
+        if os.path.exists(os.path.join(dist, name + suffix))
+    ]
+    out.copy_missing(dist, "assets", names)
+    if app.debug or not manifest:
+        # asset_url が /static/ を指す（debug・ASSET_PIPELINE=0）ときは元のファイルを置く
+        for name, path in assets.iter_sources(app.static_folder):
+            with open(path, "rb") as f:
+                out.write(f"static/{name}", f.read())
+    media = uploads.upload_folder(app)
+    if os.path.isdir(media):
+        # ページは縮小版の URL を指すので、まだ無いものはここで作っておく
+        uploads.make_missing_variants(media)
+        out.copy_missing(
+            media, "media", sorted(n for n in os.listdir(media) if uploads.is_media_name(n))
+        )
+
+    out.write(
+        MANIFEST,
+        json.dumps({**stamp, "quizzes": done, "pages": sorted(pages)}, indent=1, sort_keys=True),
+    )
+    return ExportReport(rendered, skipped, removed, out.written)
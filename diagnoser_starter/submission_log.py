@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Iterable
+
+from flask import Flask
+from sqlalchemy import delete, insert, select, update
+
+from extensions import db
+from models import Quiz, QuizStat, Result, ResultStat, Submission, utcnow
+from sqlite_profile import run_serialized
+
+# ============================================================
+# 回答ログ（Submission）の非同期・一括書き込み
+#   - リクエスト側はキューに積むだけ（SQLite の書き込みロックを待たない）
+#   - 専用スレッドがまとめて取り出し、1回のフラッシュ = 1トランザクションで
+#       1) submission へ executemany で INSERT
+#       2) quiz_stat / result_stat のカウンタを加算（UPSERT）
+#   - キューが溢れたら記録を捨てて警告ログ（公開ページは止めない）
+#   - quiz / result の id は削除後に再利用される（SQLite・bulk_load の採番）ので、
+#     削除するときは forget_quiz / forget_results でログとカウンタも消す。
+#     削除と入れ違いにキューに残っていた分は、書き込み時に捨てる
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _upsert(table, conn):
+    """方言ごとの INSERT ... ON CONFLICT 文（SQLite / PostgreSQL）。"""
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+
+class SubmissionWriter:
+    def __init__(self):
+        self.app: Flask | None = None
+        self.enabled = False
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.enabled = bool(app.config.get("SUBMISSION_LOG_ENABLED", True))
+        self.batch_size = int(app.config.get("SUBMISSION_LOG_BATCH", 500))
+        self.flush_interval = float(app.config.get("SUBMISSION_LOG_FLUSH_INTERVAL", 1.0))
+        self._queue = queue.Queue(maxsize=int(app.config.get("SUBMISSION_LOG_QUEUE_SIZE", 10000)))
+
+    # ---------- リクエスト側 ----------
+
+    def record(
+        self, quiz_id: int, choice_ids: Iterable[int], total: int, result_id: int | None
+    ) -> None:
+        """1件の回答をキューに積む（待たない）。"""
+        if not self.enabled:
+            return
+        self._ensure_started()
+        row = {
+            "quiz_id": quiz_id,
+            "result_id": result_id,
+            "total": int(total),
+            "choice_ids": ",".join(str(cid) for cid in sorted(set(choice_ids))),
+            "created_at": utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            log.warning("submission log queue is full; dropped %d record(s)", self.dropped)
+
+    @property
+    def backlog(self) -> int:
+        """書き込み待ちの件数（負荷制御の目安。ratelimit）。"""
+        return self._queue.qsize()
+
+    # ---------- 書き込みスレッド ----------
+
+    def _ensure_started(self) -> None:
+        # CLI（flask seed など）ではスレッドを起こさないよう、最初の記録時に起動する
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="submission-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            rows = [first]
+            stop = self._collect(rows)
+            self._flush_safely(rows)
+            if stop:
+                return
+
+    def _collect(self, rows: list[dict]) -> bool:
+        """flush_interval の間、batch_size まで追加で取り出す。_STOP を見たら True。"""
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            rows.append(item)
+        return False
+
+    def _flush_safely(self, rows: list[dict]) -> None:
+        try:
+            with self.app.app_context():
+                # 管理画面の書き込みと同じ列に並び、BUSY なら数回やり直す
+                run_serialized(lambda: self.write_batch(rows))
+        except Exception:
+            log.exception("failed to write %d submission(s)", len(rows))
+
+    def write_batch(self, rows: list[dict]) -> None:
+        """ログの INSERT とカウンタ加算を1トランザクションで行う。"""
+        if not rows:
+            return
+        with db.engine.begin() as conn:
+            rows = _drop_deleted(conn, rows)
+            if rows:
+                self._write(conn, rows)
+
+    def _write(self, conn, rows: list[dict]) -> None:
+        per_quiz: Counter[int] = Counter()
+        last_at: dict[int, object] = {}
+        per_result: Counter[tuple[int, int]] = Counter()
+        for row in rows:
+            per_quiz[row["quiz_id"]] += 1
+            last_at[row["quiz_id"]] = row["created_at"]  # キューは到着順
+            if row["result_id"] is not None:
+                per_result[(row["quiz_id"], row["result_id"])] += 1
+
+        conn.execute(insert(Submission.__table__), rows)
+
+        stmt = _upsert(QuizStat.__table__, conn)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["quiz_id"],
+                set_={
+                    "count": QuizStat.__table__.c.count + stmt.excluded.count,
+                    "last_submitted_at": stmt.excluded.last_submitted_at,
+                },
+            ),
+            [
+                {"quiz_id": qid, "count": n, "last_submitted_at": last_at[qid]}
+                for qid, n in per_quiz.items()
+            ],
+        )
+
+        if per_result:
+            stmt = _upsert(ResultStat.__table__, conn)
+            conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["quiz_id", "result_id"],
+                    set_={"count": ResultStat.__table__.c.count + stmt.excluded.count},
+                ),
+                [
+                    {"quiz_id": qid, "result_id": rid, "count": n}
+                    for (qid, rid), n in per_result.items()
+                ],
+            )
+
+    def flush(self) -> None:
+        """キューに溜まっている分をこのスレッドで書き出す（CLI・終了時用）。"""
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rows.append(item)
+        for i in range(0, len(rows), self.batch_size):
+            self._flush_safely(rows[i : i + self.batch_size])
+
+    def stop(self) -> None:
+        """書き込みスレッドを止め、残りを書き出す。"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout=10)
+        self._thread = None
+        self.flush()
+
+
+writer = SubmissionWriter()
+
+
+def _drop_deleted(conn, rows: list[dict]) -> list[dict]:
+    """削除済みの診断の回答を捨て、削除済みの結果は result_id を None にする。"""
+    quiz_ids = {row["quiz_id"] for row in rows}
+    live = set(conn.execute(select(Quiz.id).where(Quiz.id.in_(quiz_ids))).scalars())
+    rows = [row for row in rows if row["quiz_id"] in live]
+    result_ids = {row["result_id"] for row in rows if row["result_id"] is not None}
+    if result_ids:
+        stmt = select(Result.id, Result.quiz_id).where(Result.id.in_(result_ids))
+        results = {(rid, qid) for rid, qid in conn.execute(stmt)}
+        for row in rows:
+            if (row["result_id"], row["quiz_id"]) not in results:
+                row["result_id"] = None
+    return rows
+
+
+def forget_quiz(conn, quiz_id: int) -> None:
+    """削除する診断の回答ログとカウンタを消す（id が再利用されても引き継がない）。"""
+    conn.execute(delete(Submission.__table__).where(Submission.quiz_id == quiz_id))
+    conn.execute(delete(QuizStat.__table__).where(QuizStat.quiz_id == quiz_id))
+    conn.execute(delete(ResultStat.__table__).where(ResultStat.quiz_id == quiz_id))
+
+
+def forget_results(conn, quiz_id: int, result_ids: Iterable[int]) -> None:
+    """削除する結果のカウンタを消し、回答ログからはその結果の紐付けだけ外す。"""
+    result_ids = sorted(result_ids)
+    if not result_ids:
+        return
+    conn.execute(
+        delete(ResultStat.__table__).where(
+            ResultStat.quiz_id == quiz_id, ResultStat.result_id.in_(result_ids)
+        )
+    )
+    conn.execute(
+        update(Submission.__table__)
+        .where(Submission.quiz_id == quiz_id, Submission.result_id.in_(result_ids))
+        .values(result_id=None)
+    )
+
+
+def init_app(app: Flask) -> None:
+    writer.init_app(app)
+
+
+def record(quiz_id: int, choice_ids: Iterable[int], total: int, result_id: int | None) -> None:
+    writer.record(quiz_id, choice_ids, total, result_id)
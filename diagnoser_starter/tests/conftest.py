@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+# ============================================================
+# テスト共通の設定
+#   - diagnoser_starter/ を import パスに入れる（python -m pytest をどこから実行してもよい）
+#   - Config は import 時に環境変数を読むので、app を import する前に
+#     一時ディレクトリの SQLite とテスト向けの設定を入れておく
+#   - リポジトリ内のファイル（instance/*.db・static/dist など）には書き込まない
+# ============================================================
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="diagnoser-test-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TMP, "test.db")
+os.environ["AUTO_MIGRATE"] = "1"
+os.environ["ASSET_BUILD_ON_STARTUP"] = "0"
+os.environ["JINJA_BYTECODE_CACHE"] = "0"
+os.environ["SUBMISSION_LOG_ENABLED"] = "0"
+for name in ("ADMIN_PASSWORD", "RATE_LIMIT_ENABLED", "LOAD_SHED_ENABLED"):
+    os.environ.pop(name, None)  # 既定値のまま動かす
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    from app import prepare_database
+
+    prepare_database(flask_app)
+    return flask_app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
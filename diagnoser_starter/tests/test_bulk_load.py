@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import select
+
+from bulk_load import MAX_POINTS, MAX_TOTAL, load_quizzes, validate_spec
+from extensions import db
+from models import Question
+from question_order import ORDER_GAP
+from quiz_steps import MAX_PAGE_SIZE
+
+# ============================================================
+# 一括投入・取り込みの spec 検査（bulk_load.validate_spec）と投入
+# ============================================================
+
+
+@pytest.mark.parametrize("page_size", [None, 0, 1, MAX_PAGE_SIZE])
+def test_page_size_within_range(page_size):
+    assert validate_spec({"title": "t", "page_size": page_size}) == []
+
+
+@pytest.mark.parametrize("page_size", [-1, MAX_PAGE_SIZE + 1, 10**9, "5", 1.5, True])
+def test_page_size_out_of_range(page_size):
+    errors = validate_spec({"title": "t", "page_size": page_size})
+    assert errors == [f"page_size: 0〜{MAX_PAGE_SIZE} の整数で指定してください"]
+
+
+def _question(**fields) -> dict:
+    return {"title": "t", "questions": [{"text": "Q", **fields}]}
+
+
+@pytest.mark.parametrize("multiple", [None, True, False])
+def test_multiple_is_a_bool(multiple):
+    assert validate_spec(_question(multiple=multiple)) == []
+
+
+@pytest.mark.parametrize("multiple", ["false", "true", 0, 1])
+def test_multiple_rejects_non_bool(multiple):
+    errors = validate_spec(_question(multiple=multiple))
+    assert errors == ["questions[1].multiple: true / false で指定してください"]
+
+
+@pytest.mark.parametrize("order", ["1", 1.5, True, MAX_TOTAL + 1])
+def test_order_must_be_an_int(order):
+    errors = validate_spec(_question(order=order))
+    assert errors == [f"questions[1].order: -{MAX_TOTAL}〜{MAX_TOTAL} の整数で指定してください"]
+
+
+def test_points_and_totals_are_bounded():
+    spec = {
+        "title": "t",
+        "traits": [{"key": "e"}],
+        "questions": [
+            {
+                "text": "Q",
+                "choices": [
+                    {"text": "ok", "points": -MAX_POINTS, "scores": {"e": MAX_POINTS}},
+                    {"text": "big", "points": MAX_POINTS + 1, "scores": {"e": -(2**63)}},
+                    ["short", 10**30],
+                ],
+            }
+        ],
+        "results": [
+            {"title": "ok", "min_total": -MAX_TOTAL, "max_total": MAX_TOTAL},
+            {"title": "big", "min_total": 2**63},
+        ],
+    }
+    points = f"-{MAX_POINTS}〜{MAX_POINTS} の整数で指定してください"
+    assert validate_spec(spec) == [
+        f"questions[1].choices[2].points: {points}",
+        f"questions[1].choices[2].scores.e: {points}",
+        f"questions[1].choices[3].points: {points}",
+        f"results[2].min_total: -{MAX_TOTAL}〜{MAX_TOTAL} の整数で指定してください",
+    ]
+
+
+def test_loaded_question_keeps_multiple_and_order(app_context):
+    spec = {
+        "title": "flags",
+        "questions": [
+            {"text": "A", "multiple": False, "order": 5},
+            {"text": "B", "multiple": True},
+            {"text": "C", "order": None},
+        ],
+    }
+    assert validate_spec(spec) == []
+    (quiz_id,) = load_quizzes([spec])
+    rows = db.session.execute(
+        select(Question.text, Question.multiple, Question.order)
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.id)
+    )
+    assert [tuple(row) for row in rows] == [
+        ("A", False, 5),
+        ("B", True, 2 * ORDER_GAP),
+        ("C", False, 3 * ORDER_GAP),
+    ]
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from app_migrate import LATEST_VERSION, MIGRATIONS, current_version, run_auto_migrations
+from config import database_url
+from extensions import db
+
+# ============================================================
+# 古いスキーマ（マイグレーション導入前の DB）を LATEST_VERSION まで上げ、
+# もう一度流しても何も変わらないことを確かめる
+#   - SQLite は常に実行（一時ディレクトリのファイル）
+#   - PostgreSQL は TEST_POSTGRES_URL があるときだけ実行する。
+#     その DB のアプリのテーブルは作り直すので、テスト専用の DB を指定すること
+# ============================================================
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+# 最初の版のスキーマ（sum_points・min/max_total・multiple などが無く、
+# result.winning_trait_id は NOT NULL）
+LEGACY_SCHEMA = (
+    "CREATE TABLE quiz (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, description TEXT)",
+    "CREATE TABLE trait (id INTEGER PRIMARY KEY, quiz_id INTEGER NOT NULL REFERENCES quiz (id),"
+    " key VARCHAR(50) NOT NULL, name VARCHAR(100) NOT NULL)",
+    'CREATE TABLE question (id INTEGER PRIMARY KEY, quiz_id INTEGER NOT NULL REFERENCES quiz (id),'
+    ' text VARCHAR(300) NOT NULL, "order" INTEGER)',
+    "CREATE TABLE choice (id INTEGER PRIMARY KEY,"
+    " question_id INTEGER NOT NULL REFERENCES question (id), text VARCHAR(200) NOT NULL)",
+    "CREATE TABLE result (id INTEGER PRIMARY KEY, quiz_id INTEGER NOT NULL REFERENCES quiz (id),"
+    " title VARCHAR(200) NOT NULL, description TEXT,"
+    " winning_trait_id INTEGER NOT NULL REFERENCES trait (id))",
+)
+
+LEGACY_ROWS = (
+    "INSERT INTO quiz (id, title, description) VALUES (1, 'legacy', 'line one\nline two')",
+    "INSERT INTO trait (id, quiz_id, key, name) VALUES (1, 1, 'a', 'A')",
+    'INSERT INTO question (id, quiz_id, text, "order") VALUES (1, 1, \'Q1\', 1)',
+    "INSERT INTO choice (id, question_id, text) VALUES (1, 1, 'C1'), (2, 1, 'C2')",
+    "INSERT INTO result (id, quiz_id, title, description, winning_trait_id)"
+    " VALUES (1, 1, 'R1', '', 1)",
+)
+
+BACKENDS = [
+    pytest.param("sqlite", id="sqlite"),
+    pytest.param(
+        "postgresql",
+        id="postgresql",
+        marks=pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL が未設定"),
+    ),
+]
+
+
+def _drop_everything(conn) -> None:
+    tables = ["schema_version", "result_new", *(t.name for t in db.metadata.sorted_tables)]
+    for table in tables:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{table}" CASCADE'))
+
+
+@pytest.fixture(params=BACKENDS)
+def legacy_app(request, tmp_path):
+    app = Flask(__name__)
+    if request.param == "sqlite":
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(tmp_path / "legacy.db")
+    else:
+        app.config["SQLALCHEMY_DATABASE_URI"] = database_url(POSTGRES_URL)
+    db.init_app(app)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            if request.param != "sqlite":
+                _drop_everything(conn)
+            for statement in LEGACY_SCHEMA + LEGACY_ROWS:
+                conn.execute(text(statement))
+        yield app
+        if request.param != "sqlite":
+            with db.engine.begin() as conn:
+                _drop_everything(conn)
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _schema() -> dict[str, dict[str, tuple]]:
+    """テーブル -> 列名 -> (型, NULL 許容)。"""
+    inspector = inspect(db.engine)
+    return {
+        table: {
+            col["name"]: (str(col["type"]), col["nullable"])
+            for col in inspector.get_columns(table)
+        }
+        for table in inspector.get_table_names()
+    }
+
+
+def test_legacy_schema_migrates_to_latest(legacy_app):
+    assert current_version() == 0
+
+    applied = run_auto_migrations()
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert current_version() == LATEST_VERSION
+
+    schema = _schema()
+    for table in db.metadata.tables:
+        assert set(schema[table]) >= set(db.metadata.tables[table].columns.keys()), table
+    assert schema["result"]["winning_trait_id"][1] is True
+
+    with db.engine.connect() as conn:
+        quiz = conn.execute(
+            text(
+                "SELECT title, summary, display_mode, scoring_mode, revision, page_size"
+                " FROM quiz WHERE id = 1"
+            )
+        ).one()
+        assert tuple(quiz) == ("legacy", "line one line two", "ordered", "sum", 0, 0)
+        points = conn.execute(text("SELECT sum_points FROM choice ORDER BY id")).scalars()
+        assert points.all() == [0, 0]
+        assert conn.execute(text("SELECT multiple FROM question")).scalar() in (False, 0)
+        result = conn.execute(text("SELECT title, min_total, max_total FROM result")).one()
+        assert tuple(result) == ("R1", None, None)
+
+
+def test_rerun_is_a_no_op(legacy_app):
+    run_auto_migrations()
+    before = _schema()
+
+    # 最新なら schema_version を読むだけ
+    assert run_auto_migrations() == []
+    assert _schema() == before
+
+    # 記録が消えても、各ステップは列の有無を見るので何も変えない
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP TABLE schema_version"))
+    assert current_version() == 0
+    assert len(run_auto_migrations()) == len(MIGRATIONS)
+    assert current_version() == LATEST_VERSION
+    assert _schema() == before
+    with db.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM result")).scalar() == 1
+        assert conn.execute(text("SELECT summary FROM quiz")).scalar() == "line one line two"
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import pytest
+
+import question_order
+from extensions import db
+from models import Question, Quiz
+from question_order import ORDER_GAP, OrderError
+
+# ============================================================
+# 質問の並び順（question_order）と一括並べ替えの API
+#   - 移動は隣とその向こうの中間のキーを振るだけ
+#   - 中間が取れないときは振り直してから動かす（並びは保つ）
+#   - 一括並べ替えは、その診断の質問の id がちょうどそろっているときだけ
+# ============================================================
+
+
+@pytest.fixture
+def quiz(app_context):
+    quiz = Quiz(title="order")
+    quiz.questions = [Question(text=f"Q{n}", order=(n + 1) * ORDER_GAP) for n in range(4)]
+    db.session.add(quiz)
+    db.session.commit()
+    yield quiz
+    db.session.rollback()
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_user_id"] = 1
+    return client
+
+
+def _ids(quiz: Quiz) -> list[int]:
+    return list(
+        db.session.scalars(
+            db.select(Question.id)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Question.order.asc(), Question.id.asc())
+        )
+    )
+
+
+def _orders(quiz: Quiz) -> list[int]:
+    return list(
+        db.session.scalars(
+            db.select(Question.order)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Question.order.asc(), Question.id.asc())
+        )
+    )
+
+
+def test_move_takes_the_midpoint(quiz):
+    a, b, c, d = _ids(quiz)
+    first = db.session.get(Question, a)
+    assert question_order.move(first, "down")
+    db.session.flush()
+    # b と c の中間に入る。他の行は動かない
+    assert first.order == (2 * ORDER_GAP + 3 * ORDER_GAP) // 2
+    assert _ids(quiz) == [b, a, c, d]
+    assert _orders(quiz)[::2] == [2 * ORDER_GAP, 3 * ORDER_GAP]
+
+    last = db.session.get(Question, d)
+    assert question_order.move(last, "up")
+    db.session.flush()
+    assert _ids(quiz) == [b, a, d, c]
+    assert not question_order.move(db.session.get(Question, b), "up")  # 先頭
+
+
+def test_move_compacts_when_keys_run_out(quiz):
+    a, b, c, d = _ids(quiz)
+    question_order._set_orders({a: 10, b: 11, c: 12, d: 13})
+    db.session.expire_all()
+
+    moving = db.session.get(Question, a)
+    assert question_order.move(moving, "down")
+    db.session.flush()
+    assert _ids(quiz) == [b, a, c, d]
+    # 振り直したあとの ORDER_GAP 間隔のキーで中間を取っている
+    half = ORDER_GAP // 2
+    assert _orders(quiz) == [2 * ORDER_GAP, 2 * ORDER_GAP + half, 3 * ORDER_GAP, 4 * ORDER_GAP]
+
+
+def test_move_schedules_compaction_when_room_is_low(quiz):
+    a, b, c, _d = _ids(quiz)
+    question_order._set_orders({b: 2 * ORDER_GAP, c: 2 * ORDER_GAP + 4})
+    db.session.expire_all()
+    assert question_order.move(db.session.get(Question, a), "down")
+    assert quiz.id in db.session.info[question_order._SESSION_KEY]
+
+
+def test_reorder_requires_the_same_set_of_ids(quiz):
+    a, b, c, d = _ids(quiz)
+    revision = quiz.revision
+    for ids in ([a, b, c], [a, b, c, d, d], [a, b, c, d + 1000], []):
+        with pytest.raises(OrderError):
+            question_order.reorder(quiz.id, ids)
+
+    question_order.reorder(quiz.id, [d, c, b, a])
+    db.session.commit()
+    db.session.expire_all()
+    assert _ids(quiz) == [d, c, b, a]
+    assert _orders(quiz) == [n * ORDER_GAP for n in range(1, 5)]
+    assert quiz.revision == revision + 1
+
+
+def test_reorder_endpoint(quiz, admin):
+    a, b, c, d = _ids(quiz)
+    url = f"/admin/quiz/{quiz.id}/questions/order"
+
+    r = admin.post(url, json={"order": [b, a, d, c]})
+    assert r.status_code == 200
+    assert r.get_json() == {"ok": True, "count": 4}
+    db.session.expire_all()
+    assert _ids(quiz) == [b, a, d, c]
+
+    r = admin.post(url, json={"order": [a, b, c]})
+    assert r.status_code == 400
+    assert r.get_json()["error"] == "質問の並びが、この診断の質問と一致しません。"
+
+
+@pytest.mark.parametrize(
+    "body",
+    [{"order": "12"}, {"order": 12}, {"order": None}, {"order": [1.5]}, {"order": [True]}, [1, 2]],
+)
+def test_reorder_endpoint_rejects_malformed_json(quiz, admin, body):
+    before = _ids(quiz)
+    r = admin.post(f"/admin/quiz/{quiz.id}/questions/order", json=body)
+    assert r.status_code == 400
+    assert r.get_json() == {"ok": False, "error": "並びの形式が不正です。"}
+    db.session.expire_all()
+    assert _ids(quiz) == before
+
+
+def test_reorder_endpoint_unknown_quiz(admin):
+    assert admin.post("/admin/quiz/999999/questions/order", json={"order": []}).status_code == 404
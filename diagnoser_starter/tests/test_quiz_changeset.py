@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import pytest
+
+from bulk_load import MAX_TOTAL
+from extensions import db
+from models import Quiz, Result
+from quiz_changeset import apply_changeset
+
+# ============================================================
+# changeset の結果レンジの検査（quiz_changeset）
+#   - 片方の境界だけを更新するときも、保存済みのもう片方と合わせて min <= max
+# ============================================================
+
+
+@pytest.fixture
+def result(app_context):
+    quiz = Quiz(title="changeset")
+    quiz.results = [Result(title="R", min_total=0, max_total=10)]
+    db.session.add(quiz)
+    db.session.commit()
+    yield quiz.results[0]
+    db.session.rollback()
+
+
+def _update(result: Result, fields: dict):
+    return apply_changeset(result.quiz_id, {"results": {"update": [{"id": result.id, **fields}]}})
+
+
+@pytest.mark.parametrize(
+    "update",
+    [{"min_total": 11}, {"max_total": -1}, {"min_total": 5, "max_total": 4}],
+)
+def test_update_that_inverts_the_range_is_rejected(result, update):
+    outcome = _update(result, update)
+    db.session.rollback()
+    assert len(outcome.errors) == 1
+    assert outcome.errors[0].startswith("results.update[1]")
+    stored = db.session.get(Result, result.id, populate_existing=True)
+    assert (stored.min_total, stored.max_total) == (0, 10)
+
+
+@pytest.mark.parametrize(
+    "update, expected",
+    [
+        ({"min_total": 10}, (10, 10)),
+        ({"max_total": 0}, (0, 0)),
+        ({"min_total": 50, "max_total": None}, (50, None)),
+        ({"max_total": None}, (0, None)),
+    ],
+)
+def test_update_within_the_stored_range_is_applied(result, update, expected):
+    outcome = _update(result, update)
+    assert outcome.errors == []
+    stored = db.session.get(Result, result.id, populate_existing=True)
+    assert (stored.min_total, stored.max_total) == expected
+
+
+def test_bounds_are_shared_with_bulk_load(result):
+    outcome = _update(result, {"max_total": MAX_TOTAL + 1})
+    db.session.rollback()
+    assert outcome.errors == [
+        f"results.update[1].max_total: -{MAX_TOTAL}〜{MAX_TOTAL} の整数で指定してください"
+    ]
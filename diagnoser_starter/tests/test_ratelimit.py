@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter
+
+import pytest
+from flask import Flask
+
+import ratelimit
+from config import Config
+from extensions import db
+from models import Choice, Question, Quiz, Result
+from ratelimit import LoadShedder, TokenBuckets
+
+# ============================================================
+# ratelimit.py を複数スレッドから同時に叩き、通した数・断った数がちょうどになること、
+# 終わったあとに処理中の数が 0 に戻ることを確かめる
+#   - 時計を止めておけば（clock=固定値）トークンは回復しないので、通る数は BURST ちょうど
+#   - LoadShedder は全スレッドが枠を持ったまま Barrier で待ち合わせるので、
+#     同時に通る数は max_inflight ちょうど
+# ============================================================
+
+THREADS = 16
+
+
+def _run_threads(count: int, target) -> None:
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_same_key_admits_exactly_burst():
+    buckets = TokenBuckets(rate=1.0, burst=50, clock=lambda: 0.0)
+    outcomes: Counter = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def work(_n: int) -> None:
+        start.wait()
+        for _ in range(40):
+            ok = buckets.acquire(("127.0.0.1", "result", 1)) == 0
+            with lock:
+                outcomes[ok] += 1
+
+    _run_threads(THREADS, work)
+    assert outcomes[True] == 50
+    assert outcomes[False] == THREADS * 40 - 50
+    assert len(buckets) == 1
+
+
+def test_separate_keys_do_not_share_tokens():
+    buckets = TokenBuckets(rate=1.0, burst=5, shards=4, clock=lambda: 0.0)
+    admitted = [0] * THREADS
+    start = threading.Barrier(THREADS)
+
+    def work(n: int) -> None:
+        start.wait()
+        for _ in range(20):
+            if buckets.acquire((f"10.0.0.{n}", "result", 1)) == 0:
+                admitted[n] += 1
+
+    _run_threads(THREADS, work)
+    assert admitted == [5] * THREADS
+    assert len(buckets) == THREADS
+
+
+def test_retry_after_reflects_the_refill_rate():
+    now = [0.0]
+    buckets = TokenBuckets(rate=2.0, burst=1, clock=lambda: now[0])
+    assert buckets.acquire("k") == 0
+    assert buckets.acquire("k") == pytest.approx(0.5)
+    now[0] = 0.5
+    assert buckets.acquire("k") == 0
+
+
+@pytest.mark.parametrize("max_inflight, shards", [(5, 8), (13, 4), (1, 64)])
+def test_shedder_admits_exactly_max_inflight(max_inflight, shards):
+    shedder = LoadShedder(max_inflight=max_inflight, shards=shards)
+    threads = max_inflight + 12
+    for _round in range(5):
+        admitted = [False] * threads
+        holding = threading.Barrier(threads)
+
+        def work(n: int) -> None:
+            slots = shedder.enter()
+            admitted[n] = slots is not None
+            holding.wait()  # 通ったスレッドは枠を持ったまま、全員がそろうまで待つ
+            if slots is not None:
+                shedder.leave(slots, 0.001)
+
+        _run_threads(threads, work)
+        assert sum(admitted) == max_inflight
+        assert shedder.inflight == 0
+    assert shedder.shed == 5 * 12
+    assert all(slots.inflight == 0 for slots in shedder._shards)
+
+
+def test_shedder_sheds_on_latency_only_while_busy():
+    shedder = LoadShedder(latency_target=0.1)
+    slots = shedder.enter()
+    shedder.leave(slots, 1.0)
+    # 処理中が無ければ、平均が遅くても受け付ける
+    held = shedder.enter()
+    assert held is not None
+    assert shedder.enter() is None
+    shedder.leave(held, 0.0)
+    assert shedder.inflight == 0
+    assert shedder.shed == 1
+
+
+def _scoring_quiz(app) -> tuple[str, dict]:
+    """採点できる診断を1つ作り、(採点の URL, 回答フォーム) を返す。"""
+    with app.app_context():
+        quiz = Quiz(title="ratelimit")
+        quiz.questions = [Question(text="Q", choices=[Choice(text="A", sum_points=1)])]
+        quiz.results = [Result(title="R", min_total=0, max_total=10)]
+        db.session.add(quiz)
+        db.session.commit()
+        question = quiz.questions[0]
+        return f"/quiz/{quiz.id}/result", {f"q-{question.id}": str(question.choices[0].id)}
+
+
+@pytest.mark.parametrize(
+    "limit, shed, expected",
+    [(False, True, (None, LoadShedder)), (True, False, (TokenBuckets, None)), (False, False, None)],
+)
+def test_init_app_enables_limiter_and_shedder_separately(limit, shed, expected):
+    app = Flask(__name__)
+    app.config.update(RATE_LIMIT_ENABLED=limit, LOAD_SHED_ENABLED=shed)
+    ratelimit.init_app(app)
+    state = app.extensions.get("ratelimit")
+    if expected is None:
+        assert state is None
+    else:
+        assert [type(part) if part is not None else None for part in state] == list(expected)
+
+
+def test_shedder_is_active_with_the_default_config(app):
+    assert Config.RATE_LIMIT_ENABLED is False
+    assert Config.LOAD_SHED_ENABLED is True
+    buckets, shedder = app.extensions["ratelimit"]
+    assert buckets is None
+    assert isinstance(shedder, LoadShedder)
+    assert shedder.max_inflight == Config.LOAD_SHED_MAX_INFLIGHT
+
+    url, answer = _scoring_quiz(app)
+    client = app.test_client()
+    held = [shedder.enter() for _ in range(shedder.max_inflight)]
+    try:
+        r = client.post(url, data=answer)
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "1"
+    finally:
+        for slots in held:
+            shedder.leave(slots, 0.0)
+    assert client.post(url, data=answer).status_code == 200
+    assert shedder.inflight == 0
+
+
+def test_scoring_endpoint_under_concurrency(app, monkeypatch):
+    url, answer = _scoring_quiz(app)
+
+    burst = 20
+    buckets = TokenBuckets(rate=1.0, burst=burst, clock=lambda: 0.0)
+    shedder = LoadShedder(max_inflight=4, shards=2)
+    monkeypatch.setitem(app.extensions, "ratelimit", (buckets, shedder))
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def work(_n: int) -> None:
+        client = app.test_client()
+        start.wait()
+        for _ in range(10):
+            status = client.post(url, data=answer).status_code
+            with lock:
+                statuses[status] += 1
+
+    _run_threads(8, work)
+    # 429 以外は、通った（200）か混雑で断られた（503）かのどちらか。トークンは BURST ちょうど
+    assert statuses[429] == 8 * 10 - burst
+    assert statuses[200] + statuses[503] == burst
+    assert set(statuses) <= {200, 429, 503}
+    assert shedder.inflight == 0
+    assert shedder.shed == statuses[503]
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import itertools
+import random
+from collections import defaultdict
+
+import pytest
+
+import score_distribution
+from extensions import db
+from models import Choice, Question, Quiz, Result
+from quiz_cache import compile_plan
+from score_distribution import analyze
+
+# ============================================================
+# 合計点の分布（score_distribution.analyze）を、小さい診断で全組み合わせを
+# 列挙した結果と突き合わせる
+#   - 単一選択・複数選択（部分集合）を混ぜ、負の点数と 0 点も含める
+#   - lo / hi、合計点ごとの確率と到達可否、結果ごとの確率、どの結果にも当たらない区間
+#   - uniform と observed の重み、NumPy あり / なしの両方
+# ============================================================
+
+SEEDS = range(15)
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def numpy_mode(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(score_distribution, "optional_numpy", lambda: None)
+    return request.param
+
+
+def _bound(rng: random.Random) -> int | None:
+    return None if rng.random() < 0.2 else rng.randint(-8, 14)
+
+
+def _make_quiz(rng: random.Random) -> Quiz:
+    quiz = Quiz(title=f"distribution {rng.random()}")
+    for n in range(rng.randint(1, 4)):
+        q = Question(text=f"Q{n}", order=n, multiple=rng.random() < 0.5)
+        q.choices = [
+            Choice(text=f"C{n}-{k}", sum_points=rng.randint(-4, 6))
+            for k in range(rng.randint(1, 4))
+        ]
+        quiz.questions.append(q)
+    for n in range(rng.randint(0, 4)):
+        lo, hi = _bound(rng), _bound(rng)
+        if lo is not None and hi is not None and lo > hi:
+            lo, hi = hi, lo
+        quiz.results.append(Result(title=f"R{n}", min_total=lo, max_total=hi))
+    db.session.add(quiz)
+    db.session.commit()
+    return quiz
+
+
+def _options(q, weights):
+    """質問の回答の選び方ごとの (点数, 確率)。weights は analyze と同じ意味。"""
+    if not q.multiple:
+        return list(zip(q.choice_points, weights))
+    options = []
+    for picked in itertools.product((False, True), repeat=len(q.choice_points)):
+        p = 1.0
+        for on, w in zip(picked, weights):
+            p *= w if on else 1 - w
+        options.append((sum(pt for pt, on in zip(q.choice_points, picked) if on), p))
+    return options
+
+
+def _brute_force(plan, weights_of):
+    """全組み合わせを列挙した (合計点 -> 確率, 到達できる合計点の集合, 組み合わせの数)。"""
+    per_question = [_options(q, weights_of(q)) for q in plan.questions if q.choice_ids]
+    probs: dict[int, float] = defaultdict(float)
+    for combo in itertools.product(*per_question):
+        p = 1.0
+        for _points, w in combo:
+            p *= w
+        probs[sum(points for points, _w in combo)] += p
+    combinations = 1
+    for options in per_question:
+        combinations *= len(options)
+    return probs, set(probs), combinations
+
+
+def _owner(plan, total: int):
+    """合計点の結果（区間が重なれば id の小さい方）。"""
+    hits = [
+        band
+        for band in plan.results
+        if (band.min_total is None or band.min_total <= total)
+        and (band.max_total is None or total <= band.max_total)
+    ]
+    return min(hits, key=lambda band: band.id) if hits else None
+
+
+def _check(dist, plan, probs, reachable, combinations):
+    scale = sum(probs.values())
+    lo, hi = min(reachable), max(reachable)
+    assert (dist.lo, dist.hi) == (lo, hi)
+    assert dist.combinations == combinations
+    assert dist.reachable == tuple(t in reachable for t in range(lo, hi + 1))
+    expected = [probs.get(t, 0.0) / scale for t in range(lo, hi + 1)]
+    assert list(dist.probabilities) == pytest.approx(expected, abs=1e-9)
+    assert dist.mean == pytest.approx(sum(t * p for t, p in zip(range(lo, hi + 1), expected)))
+
+    share = defaultdict(float)
+    count = defaultdict(int)
+    missed = []
+    for t in sorted(reachable):
+        band = _owner(plan, t)
+        if band is None:
+            missed.append(t)
+        else:
+            share[band.id] += probs[t] / scale
+            count[band.id] += 1
+    assert [b.band.id for b in dist.bands] == [band.id for band in plan.results]
+    for b in dist.bands:
+        assert b.probability == pytest.approx(share[b.band.id], abs=1e-9)
+        assert b.totals == count[b.band.id]
+
+    runs: list[tuple[int, int]] = []
+    for t in missed:
+        if runs and runs[-1][1] == t - 1:
+            runs[-1] = (runs[-1][0], t)
+        else:
+            runs.append((t, t))
+    assert list(dist.uncovered) == runs
+    assert dist.uncovered_probability == pytest.approx(
+        sum(probs[t] for t in missed) / scale, abs=1e-9
+    )
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_uniform_matches_brute_force(app_context, numpy_mode, seed):
+    rng = random.Random(seed)
+    plan = compile_plan(_make_quiz(rng))
+
+    def uniform(q):
+        n = len(q.choice_ids)
+        return [0.5] * n if q.multiple else [1 / n] * n
+
+    dist = analyze(plan)
+    assert dist.weights == "uniform"
+    _check(dist, plan, *_brute_force(plan, uniform))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_observed_matches_brute_force(app_context, numpy_mode, seed):
+    rng = random.Random(1000 + seed)
+    plan = compile_plan(_make_quiz(rng))
+    samples = 20
+    counts = {cid: rng.randint(0, samples) for q in plan.questions for cid in q.choice_ids}
+
+    def observed(q):
+        picked = [counts[cid] for cid in q.choice_ids]
+        if q.multiple:
+            return [c / samples for c in picked]
+        total = sum(picked)
+        return [c / total for c in picked] if total else [1 / len(picked)] * len(picked)
+
+    dist = analyze(plan, counts, samples)
+    assert (dist.weights, dist.samples) == ("observed", samples)
+    probs, _, combinations = _brute_force(plan, observed)
+    # 到達できるかは重みによらない（観測で選ばれていない選択肢も数える）
+    _, reachable, _ = _brute_force(plan, lambda q: [0.5 if q.multiple else 1.0] * len(q.choice_ids))
+    _check(dist, plan, probs, reachable, combinations)
+
+
+def test_negative_points_and_gaps(app_context, numpy_mode):
+    quiz = Quiz(title="gaps")
+    single = Question(text="single", order=0, multiple=False)
+    single.choices = [Choice(text=t, sum_points=p) for t, p in (("a", -3), ("b", 0), ("c", 4))]
+    multi = Question(text="multi", order=1, multiple=True)
+    multi.choices = [Choice(text=t, sum_points=p) for t, p in (("x", 5), ("y", -2), ("z", 0))]
+    quiz.questions = [single, multi]
+    quiz.results = [
+        Result(title="low", min_total=None, max_total=-3),
+        Result(title="mid", min_total=0, max_total=3),
+        Result(title="overlap", min_total=2, max_total=None),
+    ]
+    db.session.add(quiz)
+    db.session.commit()
+    plan = compile_plan(quiz)
+
+    dist = analyze(plan)
+    # 単一 {-3, 0, 4} + 複数 {0, 5, -2, 3}（z は 0 点）
+    assert (dist.lo, dist.hi) == (-5, 9)
+    assert dist.combinations == 3 * 8
+    reachable = {a + b for a in (-3, 0, 4) for b in (0, 5, -2, 3)}
+    assert {dist.lo + i for i, ok in enumerate(dist.reachable) if ok} == reachable
+    # -2 だけが、到達できるのにどの結果にも当たらない（-4・-1 には到達できない）
+    assert dist.uncovered == ((-2, -2),)
+    # 2・3 は mid と overlap が重なるので id の小さい mid
+    low, mid, overlap = dist.bands
+    assert (low.totals, mid.totals, overlap.totals) == (2, 3, 4)
+    shares = low.probability + mid.probability + overlap.probability
+    assert shares + dist.uncovered_probability == pytest.approx(1.0)
+    _check(dist, plan, *_brute_force(plan, lambda q: [0.5] * 3 if q.multiple else [1 / 3] * 3))
+
+
+def test_numpy_and_pure_python_agree(app_context, monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(42)
+    plan = compile_plan(_make_quiz(rng))
+    with_numpy = analyze(plan)
+    monkeypatch.setattr(score_distribution, "optional_numpy", lambda: None)
+    pure = analyze(plan)
+    assert (pure.lo, pure.hi, pure.reachable, pure.uncovered) == (
+        with_numpy.lo,
+        with_numpy.hi,
+        with_numpy.reachable,
+        with_numpy.uncovered,
+    )
+    assert list(pure.probabilities) == pytest.approx(list(with_numpy.probabilities), abs=1e-12)
+    assert all(type(p) is float for p in with_numpy.probabilities)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import models
+from extensions import db
+from models import Choice, Question, Quiz
+from quiz_cache import compile_plan
+
+# ============================================================
+# 1パスのデコード＋点数表による採点（QuizPlan / scoring）を、
+# 従来の models.sum_total（Choice を IN で引いて合計）と突き合わせる
+#   - 単一選択・複数選択をランダムに作った診断で、有効な回答の合計が一致すること
+#   - 他の診断・他の質問の choice id と重複した id の扱い
+# ============================================================
+
+SEEDS = range(20)
+
+
+def _make_quiz(rng: random.Random, questions: int = 6) -> Quiz:
+    quiz = Quiz(title=f"scoring {rng.random()}")
+    for n in range(questions):
+        q = Question(text=f"Q{n}", order=n, multiple=rng.random() < 0.5)
+        q.choices = [
+            Choice(text=f"C{n}-{k}", sum_points=rng.randint(-5, 10))
+            for k in range(rng.randint(1, 5))
+        ]
+        quiz.questions.append(q)
+    db.session.add(quiz)
+    db.session.commit()
+    return quiz
+
+
+def _random_answer(rng: random.Random, quiz: Quiz) -> MultiDict:
+    """有効な回答（単一は0〜1個、複数は任意の部分集合）のフォーム。"""
+    form = MultiDict()
+    for q in quiz.questions:
+        ids = [c.id for c in q.choices]
+        if q.multiple:
+            picked = [cid for cid in ids if rng.random() < 0.5]
+        else:
+            picked = [rng.choice(ids)] if rng.random() < 0.9 else []
+        for cid in picked:
+            form.add(f"q-{q.id}", str(cid))
+    return form
+
+
+@pytest.fixture
+def rng():
+    return random.Random(20260301)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_sum_total_on_valid_answers(app_context, seed):
+    rng = random.Random(seed)
+    quiz = _make_quiz(rng)
+    plan = compile_plan(quiz)
+    for _ in range(25):
+        form = _random_answer(rng, quiz)
+        expected_ids = [int(v) for _field, values in form.lists() for v in values]
+        picked = plan.decode_answers(form)
+        assert sorted(picked) == sorted(expected_ids)
+        assert plan.sum_total(picked) == models.sum_total(expected_ids)
+        assert plan.evaluate_many([picked])[0][0] == models.sum_total(expected_ids)
+
+
+def test_foreign_choice_ids_are_dropped(app_context, rng):
+    quiz = _make_quiz(rng)
+    other = _make_quiz(rng)
+    plan = compile_plan(quiz)
+    q1, q2 = quiz.questions[0], quiz.questions[1]
+    own = q1.choices[0].id
+    form = MultiDict(
+        [
+            (f"q-{q1.id}", str(own)),
+            (f"q-{q1.id}", str(other.questions[0].choices[0].id)),  # 他の診断
+            (f"q-{q2.id}", str(q1.choices[-1].id)),  # 同じ診断の別の質問
+            (f"q-{other.questions[1].id}", str(other.questions[1].choices[0].id)),
+            (f"q-{q2.id}", "not-a-number"),
+        ]
+    )
+
+    picked = plan.decode_answers(form)
+    assert picked == [own]
+    assert plan.sum_total(picked) == models.sum_total([own])
+
+
+def test_single_choice_reads_only_the_first_value(app_context, rng):
+    quiz = _make_quiz(rng)
+    q = next((q for q in quiz.questions if not q.multiple and len(q.choices) > 1), None)
+    if q is None:
+        q = Question(text="single", multiple=False)
+        q.choices = [Choice(text="a", sum_points=1), Choice(text="b", sum_points=7)]
+        quiz.questions.append(q)
+        db.session.commit()
+    plan = compile_plan(quiz)
+    first, second = q.choices[0].id, q.choices[1].id
+    form = MultiDict([(f"q-{q.id}", str(first)), (f"q-{q.id}", str(second))])
+    assert plan.decode_answers(form) == [first]
+
+
+def test_duplicate_choice_ids_count_once(app_context, rng):
+    quiz = _make_quiz(rng)
+    multi = Question(text="multi", multiple=True)
+    multi.choices = [Choice(text="a", sum_points=3), Choice(text="b", sum_points=4)]
+    quiz.questions.append(multi)
+    db.session.commit()
+    plan = compile_plan(quiz)
+    a, b = multi.choices[0].id, multi.choices[1].id
+
+    field = f"q-{multi.id}"
+    form = MultiDict([(field, str(a)), (field, str(a)), (field, str(b))])
+    picked = plan.decode_answers(form)
+    assert picked == [a, b]
+    # models.sum_total も IN で引くので重複は1回だけ数える
+    assert plan.sum_total([a, a, b]) == models.sum_total([a, a, b]) == 7
+    assert plan.evaluate_many([[a, a, b]])[0][0] == 7
+
+
+def test_answer_set_uses_the_same_rules(app_context, rng):
+    quiz = _make_quiz(rng)
+    other = _make_quiz(rng)
+    plan = compile_plan(quiz)
+    for _ in range(25):
+        form = _random_answer(rng, quiz)
+        ids = [int(v) for _field, values in form.lists() for v in values]
+        foreign = other.questions[0].choices[0].id
+        picked = plan.decode_answer_set(ids + [foreign] + ids[:1])
+        assert sorted(picked) == sorted(ids)
+        assert plan.sum_total(picked) == models.sum_total(ids)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from bulk_load import load_quizzes
+from extensions import db
+from models import Quiz
+from static_export import MANIFEST, export_site
+
+# ============================================================
+# 静的書き出し（static_export）の差分描画
+#   - 変更の無い診断は描画し直さない
+#   - 消した診断の id を再利用した診断は、revision が同じでも描画し直す
+# ============================================================
+
+
+def _spec(title: str) -> dict:
+    return {"title": title, "questions": [{"text": "Q", "choices": [{"text": "A"}]}]}
+
+
+@pytest.fixture
+def output(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    return tmp_path / "site"
+
+
+def test_reused_quiz_id_is_rendered_again(app_context, output):
+    (quiz_id,) = load_quizzes([_spec("first export")])
+    first = export_site(app_context, str(output))
+    assert first.rendered >= 1
+
+    again = export_site(app_context, str(output))
+    assert again.rendered == 0
+    assert again.skipped == first.rendered
+
+    old = db.session.get(Quiz, quiz_id)
+    revision = old.revision
+    db.session.delete(old)
+    db.session.commit()
+    (reused,) = load_quizzes([_spec("second export")])
+    assert reused == quiz_id
+    assert db.session.get(Quiz, reused).revision == revision
+
+    report = export_site(app_context, str(output))
+    assert report.rendered == 1
+    page = (output / "quiz" / str(quiz_id) / "index.html").read_text(encoding="utf-8")
+    assert "second export" in page
+    assert "first export" not in page
+    manifest = json.loads((output / MANIFEST).read_text(encoding="utf-8"))
+    assert manifest["quizzes"][str(quiz_id)][0] == revision
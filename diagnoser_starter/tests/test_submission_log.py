@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import pytest
+
+import queries
+from bulk_load import load_quizzes
+from extensions import db
+from models import Quiz, Result, utcnow
+from quiz_changeset import apply_changeset
+from submission_log import writer
+
+# ============================================================
+# 回答ログとカウンタ（submission_log）と、quiz / result の削除
+#   - SQLite も bulk_load も MAX(id) の続きで採番するので、最後の診断・結果を消すと
+#     次に作ったものが同じ id になる。消したもののログやカウンタを引き継がないこと
+#   - 削除と入れ違いにキューに残っていた回答は、書き込み時に捨てる
+# ============================================================
+
+SPEC = {
+    "title": "submission log",
+    "questions": [{"text": "Q", "choices": [{"text": "A", "points": 1}]}],
+    "results": [
+        {"title": "low", "min_total": 0, "max_total": 0},
+        {"title": "high", "min_total": 1, "max_total": 1},
+    ],
+}
+
+
+def _submit(quiz: Quiz, result: Result | None, times: int = 1) -> None:
+    choice = quiz.questions[0].choices[0]
+    row = {
+        "quiz_id": quiz.id,
+        "result_id": result.id if result is not None else None,
+        "total": 1,
+        "choice_ids": str(choice.id),
+    }
+    writer.write_batch([{**row, "created_at": utcnow()} for _ in range(times)])
+
+
+def _logs(quiz_id: int) -> list[tuple]:
+    return [(r.result_id, r.total) for r in queries.submission_rows(quiz_id)]
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_user_id"] = 1
+    return client
+
+
+@pytest.fixture
+def quiz(app_context):
+    (quiz_id,) = load_quizzes([SPEC])
+    quiz = db.session.get(Quiz, quiz_id)
+    _submit(quiz, quiz.results[1], times=3)
+    assert queries.quiz_stats()[quiz_id].count == 3
+    yield quiz
+    db.session.rollback()
+
+
+def test_deleted_quiz_id_starts_without_logs(quiz, admin):
+    quiz_id = quiz.id
+    assert admin.post(f"/admin/quiz/{quiz_id}/delete").status_code == 302
+    db.session.expire_all()
+
+    (reused,) = load_quizzes([SPEC])
+    assert reused == quiz_id  # id は再利用される
+    assert quiz_id not in queries.quiz_stats()
+    assert queries.result_counts(quiz_id) == {}
+    assert _logs(quiz_id) == []
+
+
+def test_deleted_result_id_starts_without_counts(quiz, admin):
+    high = quiz.results[1]
+    result_id = high.id
+    assert queries.result_counts(quiz.id) == {result_id: 3}
+    assert admin.post(f"/admin/result/{result_id}/delete").status_code == 302
+    db.session.expire_all()
+
+    # 回答ログは残し、消した結果への紐付けだけ外す
+    assert queries.result_counts(quiz.id) == {}
+    assert _logs(quiz.id) == [(None, 1)] * 3
+    assert queries.quiz_stats()[quiz.id].count == 3
+
+    reused = Result(quiz_id=quiz.id, title="again", min_total=1, max_total=1)
+    db.session.add(reused)
+    db.session.commit()
+    assert reused.id == result_id
+    assert queries.result_counts(quiz.id) == {}
+
+
+def test_changeset_delete_forgets_result_counts(quiz):
+    low, high = quiz.results
+    _submit(quiz, low)
+    outcome = apply_changeset(
+        quiz.id,
+        {"results": {"delete": [high.id], "create": [{"title": "new", "min_total": 1}]}},
+    )
+    assert outcome.errors == []
+    (created,) = outcome.diff["created"]["results"]
+    assert created == high.id  # 同じ changeset の中で id が再利用される
+    assert queries.result_counts(quiz.id) == {low.id: 1}
+    assert sorted(_logs(quiz.id), key=str) == sorted([(None, 1)] * 3 + [(low.id, 1)], key=str)
+
+
+def test_rows_queued_before_a_delete_are_dropped(quiz):
+    high = quiz.results[1]
+    db.session.delete(high)
+    db.session.commit()
+    _submit(quiz, high)  # 削除済みの結果 -> 紐付けを外して記録
+    assert _logs(quiz.id)[-1] == (None, 1)
+    assert queries.quiz_stats()[quiz.id].count == 4
+
+    quiz_id, logged = quiz.id, _logs(quiz.id)
+    db.session.delete(quiz)
+    db.session.commit()
+    _submit(quiz, None)  # 削除済みの診断 -> 記録しない
+    assert _logs(quiz_id) == logged
+    assert queries.quiz_stats()[quiz_id].count == 4
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import itertools
+import random
+
+import pytest
+
+import trait_scoring
+from bulk_load import load_quizzes
+from extensions import db
+from models import Quiz
+from quiz_cache import compile_plan
+from trait_scoring import TraitMatrix
+
+# ============================================================
+# Trait 方式の採点（trait_scoring.TraitMatrix / QuizPlan.evaluate）
+#   - NumPy の有無で score / score_many / winner の結果が変わらないこと
+#   - 勝者は最大スコアの Trait、同点は Trait の id が小さい方
+#   - trait 方式の診断では、勝者の Trait を winning_trait に持つ結果（id の小さい方）
+# ============================================================
+
+SEEDS = range(10)
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def numpy_mode(request, monkeypatch):
+    """TraitMatrix を NumPy あり / なしで作らせる。"""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(trait_scoring, "optional_numpy", lambda: None)
+    return request.param
+
+
+def _random_matrix(rng: random.Random):
+    trait_ids = rng.sample(range(1, 50), rng.randint(1, 5))
+    choice_ids = rng.sample(range(100, 200), rng.randint(1, 12))
+    scores = [
+        (rng.choice(choice_ids + [999]), rng.choice(trait_ids + [0]), rng.randint(-3, 5))
+        for _ in range(rng.randint(0, 30))
+    ]
+    scores.append((choice_ids[0], trait_ids[0], None))
+    return trait_ids, choice_ids, scores
+
+
+def _expected(trait_ids, choice_ids, scores, picked) -> list[int]:
+    """行列を作らずに、(choice, trait, 点数) を直接足した Trait 合計（id 順）。"""
+    order = sorted(trait_ids)
+    totals = dict.fromkeys(order, 0)
+    for cid in picked:
+        if cid not in choice_ids:  # 他の診断の choice は数えない
+            continue
+        for choice_id, trait_id, points in scores:
+            if choice_id == cid and trait_id in totals:
+                totals[trait_id] += points or 0
+    return [totals[tid] for tid in order]
+
+
+def _expected_winner(trait_ids, totals) -> int:
+    best = max(totals)
+    return min(tid for tid, v in zip(sorted(trait_ids), totals) if v == best)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matrix_matches_brute_force(numpy_mode, seed):
+    rng = random.Random(seed)
+    trait_ids, choice_ids, scores = _random_matrix(rng)
+    matrix = TraitMatrix(trait_ids, choice_ids, scores)
+    assert isinstance(matrix.rows, tuple) == (numpy_mode == "pure")
+    assert matrix.trait_ids == tuple(sorted(trait_ids))
+
+    picked_sets = [
+        rng.sample(choice_ids + [999, 998], rng.randint(0, len(choice_ids))) for _ in range(30)
+    ]
+    picked_sets.append([])
+    expected = [_expected(trait_ids, choice_ids, scores, picked) for picked in picked_sets]
+    assert [matrix.score(picked) for picked in picked_sets] == expected
+    assert matrix.score_many(picked_sets) == expected
+    for totals in expected:
+        assert matrix.winner(totals) == _expected_winner(trait_ids, totals)
+
+
+def test_numpy_and_pure_python_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(7)
+    trait_ids, choice_ids, scores = _random_matrix(rng)
+    with_numpy = TraitMatrix(trait_ids, choice_ids, scores)
+    monkeypatch.setattr(trait_scoring, "optional_numpy", lambda: None)
+    pure = TraitMatrix(trait_ids, choice_ids, scores)
+
+    picked_sets = [rng.sample(choice_ids, rng.randint(0, len(choice_ids))) for _ in range(50)]
+    for picked in picked_sets:
+        assert with_numpy.score(picked) == pure.score(picked)
+    assert with_numpy.score_many(picked_sets) == pure.score_many(picked_sets)
+    # NumPy の行列でも結果は Python の int
+    assert all(type(v) is int for v in with_numpy.score(choice_ids))
+
+
+def test_winner_ties_go_to_the_lowest_trait_id(numpy_mode):
+    matrix = TraitMatrix([30, 10, 20], [1, 2], [(1, 30, 2), (1, 20, 2), (2, 10, 1)])
+    assert matrix.score([1]) == [0, 2, 2]
+    assert matrix.winner(matrix.score([1])) == 20
+    assert matrix.winner(matrix.score([1, 2])) == 20
+    assert matrix.winner(matrix.score([2])) == 10
+    assert matrix.winner(matrix.score([])) == 10  # 全員 0 点
+    assert matrix.score_many([[1], [2], []]) == [[0, 2, 2], [1, 0, 0], [0, 0, 0]]
+
+    empty = TraitMatrix([], [1], [])
+    assert empty.score([1]) == []
+    assert empty.winner([]) is None
+
+
+TRAIT_QUIZ = {
+    "title": "traits",
+    "scoring_mode": "trait",
+    "traits": [{"key": "a"}, {"key": "b"}, {"key": "c"}, {"key": "d"}],
+    "questions": [
+        {
+            "text": "Q1",
+            "choices": [
+                {"text": "a", "points": 1, "scores": {"a": 2}},
+                {"text": "b", "scores": {"b": 2, "c": 1}},
+                {"text": "ab", "scores": {"a": 1, "b": 1}},
+            ],
+        },
+        {
+            "text": "Q2",
+            "multiple": True,
+            "choices": [
+                {"text": "c", "scores": {"c": 3}},
+                {"text": "-a", "scores": {"a": -2, "d": 1}},
+                {"text": "none", "points": 5},
+            ],
+        },
+    ],
+    "results": [
+        {"title": "A", "winning_trait": "a"},
+        {"title": "B", "winning_trait": "b"},
+        {"title": "B2", "winning_trait": "b"},  # 同じ Trait の2つ目は使われない
+        {"title": "C", "winning_trait": "c"},
+        {"title": "none"},  # d には結果が無い
+    ],
+}
+
+
+def _answers(plan):
+    """単一選択は0〜1個、複数選択は任意の部分集合の、すべての組み合わせ。"""
+    per_question = []
+    for q in plan.questions:
+        ids = list(q.choice_ids)
+        if q.multiple:
+            per_question.append(
+                [list(c) for r in range(len(ids) + 1) for c in itertools.combinations(ids, r)]
+            )
+        else:
+            per_question.append([[]] + [[cid] for cid in ids])
+    for combo in itertools.product(*per_question):
+        yield [cid for part in combo for cid in part]
+
+
+def test_trait_mode_evaluate_resolves_the_winning_trait(app_context, numpy_mode):
+    (quiz_id,) = load_quizzes([TRAIT_QUIZ])
+    quiz = db.session.get(Quiz, quiz_id)
+    plan = compile_plan(quiz)
+    assert isinstance(plan.trait_matrix.rows, tuple) == (numpy_mode == "pure")
+
+    trait_of = {t.key: t.id for t in quiz.traits}
+    result_of = {r.title: r.id for r in quiz.results}
+    key_of = {tid: key for key, tid in trait_of.items()}
+    scores = [
+        (c.id, sc.trait_id, sc.points) for q in quiz.questions for c in q.choices for sc in c.scores
+    ]
+    points = {c.id: c.sum_points for q in quiz.questions for c in q.choices}
+    expected_result = {"a": "A", "b": "B", "c": "C", "d": None}
+
+    answers = list(_answers(plan))
+    assert len(answers) == 4 * 8
+    seen = set()
+    for picked, many in zip(answers, plan.evaluate_many(answers)):
+        total, result, totals = plan.evaluate(picked)
+        assert totals == _expected(trait_of.values(), points, scores, picked)
+        assert total == sum(points[cid] for cid in picked)
+        winner = key_of[_expected_winner(trait_of.values(), totals)]
+        title = expected_result[winner]
+        assert (result.id if result else None) == (result_of[title] if title else None)
+        assert many == (total, result, totals)
+        seen.add(winner)
+    assert seen == {"a", "b", "c", "d"}
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+import uploads
+
+# ============================================================
+# アップロード画像の縮小版 URL（|variant）と /media/ の配信
+#   - ページには縮小版ができる前から縮小版の URL を書く（キャッシュされたページに
+#     元画像の URL が残らないように）
+#   - 縮小版がまだ無ければ、その URL に元画像を短いキャッシュで返す
+# ============================================================
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def media(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    buf = io.BytesIO()
+    PIL.new("RGB", (1600, 900), (200, 40, 40)).save(buf, "PNG")
+    name = "0123456789abcdef0123456789abcdef.png"
+    (tmp_path / name).write_bytes(buf.getvalue())
+    return tmp_path, name
+
+
+def test_variant_url_does_not_depend_on_the_file(app, media):
+    folder, name = media
+    with app.test_request_context():
+        url = uploads.variant_url(uploads.media_url(name), "thumb")
+        assert url == "/media/0123456789abcdef0123456789abcdef-thumb.webp"
+        uploads.make_variants(name, str(folder))
+        assert uploads.variant_url(uploads.media_url(name), "thumb") == url
+        assert uploads.variant_url("/static/img/x.png", "thumb") == "/static/img/x.png"
+
+
+def test_missing_variant_falls_back_to_the_original(app, media, monkeypatch):
+    folder, name = media
+    scheduled = []
+    monkeypatch.setattr(uploads, "schedule_variants", scheduled.append)
+    client = app.test_client()
+
+    r = client.get("/media/0123456789abcdef0123456789abcdef-hero.webp")
+    assert r.status_code == 200
+    assert r.mimetype == "image/png"
+    assert not r.cache_control.immutable
+    assert r.cache_control.max_age == uploads.FALLBACK_MAX_AGE
+    assert scheduled == [name]
+
+    uploads.make_variants(name, str(folder))
+    r = client.get("/media/0123456789abcdef0123456789abcdef-hero.webp")
+    assert r.status_code == 200
+    assert r.mimetype == "image/webp"
+    assert r.cache_control.immutable
+
+    assert client.get("/media/ffffffffffffffffffffffffffffffff-hero.webp").status_code == 404
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+from scoring import optional_numpy  # NumPy は任意（無ければ純 Python で同じ計算）
+
+# ============================================================
+# Trait（性格軸）ベースの採点
+#   - 診断ごとに「選択肢 × Trait」の点数行列を一度だけ作る
+#   - 回答は選ばれた行の和（疎な行和）で各 Trait の合計を出す
+#   - 最大スコアの Trait を勝者とし、同点は Trait の id が小さい方
+# ============================================================
+
+
+class TraitMatrix:
+    """choice id -> 行、Trait -> 列 の密行列。"""
+
+    __slots__ = ("trait_ids", "row_of", "rows")
+
+    def __init__(
+        self,
+        trait_ids: Sequence[int],
+        choice_ids: Iterable[int],
+        scores: Iterable[tuple[int, int, int]],
+    ):
+        """scores は (choice_id, trait_id, points) の並び。"""
+        trait_ids = tuple(sorted(trait_ids))
+        col_of = {tid: j for j, tid in enumerate(trait_ids)}
+        row_of = {cid: i for i, cid in enumerate(choice_ids)}
+
+        dense = [[0] * len(trait_ids) for _ in row_of]
+        for choice_id, trait_id, points in scores:
+            i = row_of.get(choice_id)
+            j = col_of.get(trait_id)
+            if i is not None and j is not None:
+                dense[i][j] += int(points or 0)
+
+        self.trait_ids = trait_ids
+        self.row_of = row_of
+        np = optional_numpy()
+        if np is not None:
+            self.rows = np.array(dense, dtype=np.int64).reshape(len(row_of), len(trait_ids))
+        else:
+            self.rows = tuple(tuple(r) for r in dense)
+
+    def score(self, picked: Iterable[int]) -> list[int]:
+        """選ばれた choice の行を足し合わせ、Trait ごとの合計を返す。"""
+        row_of = self.row_of
+        idx = [row_of[cid] for cid in picked if cid in row_of]
+        if not isinstance(self.rows, tuple):  # NumPy の行列
+            return self.rows[idx].sum(axis=0).tolist()
+        totals = [0] * len(self.trait_ids)
+        for i in idx:
+            for j, v in enumerate(self.rows[i]):
+                totals[j] += v
+        return totals
+
+    def score_many(self, picked_sets: Sequence[Iterable[int]]) -> list[list[int]]:
+        """複数の回答の Trait 合計をまとめて出す（NumPy があれば1回の add.at）。"""
+        np = optional_numpy()
+        if np is None or isinstance(self.rows, tuple):
+            return [self.score(picked) for picked in picked_sets]
+        row_of = self.row_of
+        idx, owner = [], []
+        for n, picked in enumerate(picked_sets):
+            for cid in picked:
+                i = row_of.get(cid)
+                if i is not None:
+                    idx.append(i)
+                    owner.append(n)
+        totals = np.zeros((len(picked_sets), len(self.trait_ids)), dtype=np.int64)
+        np.add.at(totals, owner, self.rows[idx])
+        return totals.tolist()
+
+    def winner(self, totals: Sequence[int]) -> int | None:
+        """最大スコアの Trait id（同点は id が小さい方。Trait が無ければ None）。"""
+        if not self.trait_ids:
+            return None
+        best = max(range(len(totals)), key=lambda j: (totals[j], -j))
+        return self.trait_ids[best]
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import Flask, abort, current_app, send_from_directory
+
+from extensions import db
+from models import Quiz
+from query_budget import query_budget
+
+try:  # Pillow は任意（無ければ縮小版を作らず、元画像をそのまま使う）
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - 環境依存
+    Image = ImageOps = None
+
+# ============================================================
+# アップロード画像の保存と配信
+#   - 内容の SHA-256 をファイル名にする（同じ画像は1つだけ保存）
+#       UPLOAD_FOLDER/<hash>.<ext>          元画像
+#       UPLOAD_FOLDER/<hash>-<variant>.webp 縮小・再エンコード版（VARIANTS）
+#   - 縮小版はリクエストとは別のスレッド（ThreadPoolExecutor）で作る。
+#     ページには（Pillow があれば）最初から縮小版の URL を書く。ページはキャッシュされるので、
+#     「まだ無いから元画像の URL」を書くとその URL が残り続けてしまう
+#   - /media/<name> は内容が変わらない URL なので、1年 + immutable で配信する。
+#     縮小版がまだ無いあいだは元画像を短いキャッシュで返し、作成を予約する
+# ============================================================
+
+log = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "/media/"
+
+# 名前 -> (幅, 高さ, 切り抜くか)。thumb はトップのカード（高さ 180px）の2倍密度
+VARIANTS: dict[str, tuple[int, int, bool]] = {
+    "thumb": (640, 360, True),
+    "hero": (1280, 720, False),
+}
+WEBP_QUALITY = 80
+
+_NAME_RE = re.compile(r"^(?P<hash>[0-9a-f]{32})(?:-(?P<variant>[a-z]+))?\.(?P<ext>[a-z0-9]+)$")
+_HASH_BYTES = 16  # 32 桁の16進
+_CHUNK = 64 * 1024
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_pending: dict[str, Future] = {}
+
+# 縮小版がまだ無いときに代わりに返す元画像の max-age（秒）
+FALLBACK_MAX_AGE = 60
+
+
+def upload_folder(app: Flask | None = None) -> str:
+    app = app or current_app
+    return os.path.join(app.root_path, app.config["UPLOAD_FOLDER"])
+
+
+def is_media_name(name: str) -> bool:
+    """UPLOAD_FOLDER に置く名前（内容ハッシュ＋縮小版）か。"""
+    return _NAME_RE.match(name) is not None
+
+
+def media_url(name: str) -> str:
+    return MEDIA_PREFIX + name
+
+
+def _variant_name(digest: str, variant: str) -> str:
+    return f"{digest}-{variant}.webp"
+
+
+# ---------- 保存 ----------
+
+def save_upload(file_storage, ext: str) -> str:
+    """アップロードを内容ハッシュの名前で保存し、/media/ の URL を返す。
+
+    同じ内容のファイルが既にあれば保存せずにその URL を返す。縮小版の作成は予約するだけ。
+    """
+    folder = upload_folder()
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=folder, suffix=".part", delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: file_storage.stream.read(_CHUNK), b""):
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+    name = f"{digest.hexdigest()[: _HASH_BYTES * 2]}.{ext.lower()}"
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        os.unlink(tmp.name)  # 同じ画像がすでにある
+    else:
+        os.replace(tmp.name, path)
+    schedule_variants(name)
+    return media_url(name)
+
+
+def _store_existing(path: str) -> str:
+    """既存のファイル（旧形式の名前）を内容ハッシュの名前でコピーし、その名前を返す。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    ext = os.path.splitext(path)[1].lstrip(".").lower() or "bin"
+    name = f"{digest.hexdigest()[: _HASH_BYTES * 2]}.{ext}"
+    target = os.path.join(upload_folder(), name)
+    if not os.path.exists(target):
+        with open(path, "rb") as src, tempfile.NamedTemporaryFile(
+            dir=upload_folder(), suffix=".part", delete=False
+        ) as tmp:
+            for chunk in iter(lambda: src.read(_CHUNK), b""):
+                tmp.write(chunk)
+        os.replace(tmp.name, target)
+    return name
+
+
+# ---------- 縮小版 ----------
+
+def make_variants(name: str, folder: str) -> list[str]:
+    """元画像 name から VARIANTS を作り、作ったファイル名を返す（既にあるものは作らない）。"""
+    if Image is None:
+        return []
+    digest = _NAME_RE.match(name).group("hash")
+    made = []
+    with Image.open(os.path.join(folder, name)) as src:
+        src = ImageOps.exif_transpose(src)
+        src = src.convert("RGBA" if "A" in src.getbands() or "transparency" in src.info else "RGB")
+        for variant, (width, height, crop) in VARIANTS.items():
+            out_name = _variant_name(digest, variant)
+            out_path = os.path.join(folder, out_name)
+            if os.path.exists(out_path):
+                continue
+            if crop:
+                img = ImageOps.fit(src, (width, height), Image.Resampling.LANCZOS)
+            else:
+                img = src.copy()
+                img.thumbnail((width, height), Image.Resampling.LANCZOS)  # 拡大はしない
+            with tempfile.NamedTemporaryFile(dir=folder, suffix=".part", delete=False) as tmp:
+                img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp.name, out_path)
+            made.append(out_name)
+    return made
+
+
+def make_missing_variants(folder: str) -> int:
+    """folder の元画像のうち、縮小版が揃っていないものだけ make_variants する。作った数を返す。"""
+    if Image is None:
+        return 0
+    made = 0
+    for name in sorted(os.listdir(folder)):
+        m = _NAME_RE.match(name)
+        if m is None or m.group("variant"):
+            continue
+        wanted = (_variant_name(m.group("hash"), v) for v in VARIANTS)
+        if all(os.path.exists(os.path.join(folder, n)) for n in wanted):
+            continue
+        try:
+            made += len(make_variants(name, folder))
+        except Exception:
+            log.exception("failed to make variants for %s", name)
+    return made
+
+
+def _run_variants(name: str, folder: str) -> None:
+    try:
+        make_variants(name, folder)
+    except Exception:
+        log.exception("failed to make variants for %s", name)
+    finally:
+        with _executor_lock:
+            _pending.pop(name, None)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(current_app.config.get("UPLOAD_VARIANT_WORKERS", 2))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload-variants")
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def schedule_variants(name: str) -> Future | None:
+    """縮小版の作成をバックグラウンドに予約する（同じ画像の予約は1つにまとめる）。"""
+    if Image is None or not _NAME_RE.match(name):
+        return None
+    folder = upload_folder()
+    with _executor_lock:
+        if name not in _pending:
+            _pending[name] = _get_executor().submit(_run_variants, name, folder)
+        return _pending[name]
+
+
+# ---------- テンプレート・配信 ----------
+
+def variant_url(url: str | None, variant: str) -> str | None:
+    """/media/ の画像なら縮小版の URL を返す。テンプレートの |variant。
+
+    縮小版がまだ無くても縮小版の URL にする（配信側で元画像に代える）。Pillow が無い環境では
+    縮小版は作られないので元の URL のまま。
+    """
+    if Image is None or not url or not url.startswith(MEDIA_PREFIX) or variant not in VARIANTS:
+        return url
+    m = _NAME_RE.match(url[len(MEDIA_PREFIX) :])
+    if m is None or m.group("variant"):
+        return url
+    return media_url(_variant_name(m.group("hash"), variant))
+
+
+def _original_of(folder: str, digest: str) -> str | None:
+    """縮小版の元画像のファイル名（見つからなければ None）。"""
+    for ext in sorted(current_app.config.get("ALLOWED_EXTENSIONS", ())):
+        name = f"{digest}.{ext}"
+        if os.path.exists(os.path.join(folder, name)):
+            return name
+    return None
+
+
+@query_budget(0)
+def serve_media(name: str):
+    m = _NAME_RE.match(name)
+    if m is None:
+        abort(404)
+    folder = upload_folder()
+    if m.group("variant") and not os.path.exists(os.path.join(folder, name)):
+        # 縮小版がまだ無い：元画像を短いキャッシュで返し、作成を予約する
+        original = _original_of(folder, m.group("hash"))
+        if m.group("variant") not in VARIANTS or original is None:
+            abort(404)
+        schedule_variants(original)
+        response = send_from_directory(folder, original, max_age=FALLBACK_MAX_AGE)
+        response.cache_control.public = True
+        return response
+    response = send_from_directory(
+        folder, name, max_age=int(current_app.config.get("MEDIA_MAX_AGE", 31536000))
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app: Flask) -> None:
+    os.makedirs(upload_folder(app), exist_ok=True)
+    app.add_url_rule(MEDIA_PREFIX + "<name>", "media", serve_media)
+    app.add_template_filter(variant_url, "variant")
+
+
+# ---------- 既存画像の移行 ----------
+
+def backfill() -> dict[str, int]:
+    """quiz.image_url の画像を内容ハッシュの名前に移し、縮小版をこの場で作る。
+
+    旧形式（/static/uploads/...）の URL は /media/ に書き換える。元のファイルは消さない。
+    """
+    folder = upload_folder()
+    stats = {"quizzes": 0, "renamed": 0, "variants": 0, "missing": 0, "external": 0}
+    quizzes = Quiz.query.filter(Quiz.image_url.isnot(None)).order_by(Quiz.id).all()
+    for quiz in quizzes:
+        url = quiz.image_url
+        stats["quizzes"] += 1
+        if url.startswith(MEDIA_PREFIX):
+            name = url[len(MEDIA_PREFIX) :]
+            path = os.path.join(folder, name)
+        elif url.startswith("/static/"):
+            name = None
+            path = os.path.join(current_app.root_path, url.lstrip("/"))
+        else:
+            stats["external"] += 1  # 外部 URL などは対象外
+            continue
+        if not os.path.isfile(path):
+            stats["missing"] += 1
+            continue
+        if name is None or not _NAME_RE.match(name):
+            name = _store_existing(path)
+            quiz.image_url = media_url(name)
+            stats["renamed"] += 1
+        try:
+            stats["variants"] += len(make_variants(name, folder))
+        except Exception:
+            log.exception("failed to make variants for %s", name)
+    db.session.commit()
+    return stats